@@ -1,6 +1,13 @@
 import pygame
 import json
-
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+from functools import lru_cache
+
+import randomness
 from entities import *
 from utils import *
 
@@ -56,12 +63,130 @@ def get_objective_colors(objective):
     return inner_color, outline_color
 
 
+class TextCache:
+    """
+    Bounded LRU caches of rendered text surfaces, keyed by (font, text, color), and of wrapped text layouts, keyed
+    by (font, text, width), so that text is only rendered and measured when it first shows up on the screen.
+    """
+
+    def __init__(self, max_surfaces=4096, max_layouts=2048):
+        self.max_surfaces = max_surfaces
+        self.max_layouts = max_layouts
+        self.surfaces = OrderedDict()
+        self.layouts = OrderedDict()
+
+    @staticmethod
+    def get(cache, max_size, key, make):
+        """Return the cached value for the key, making and caching it on a miss, and evicting the oldest entry."""
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+        value = cache[key] = make()
+        if len(cache) > max_size:
+            cache.popitem(last=False)
+        return value
+
+    def render(self, font, text, antialias, color, background=None):
+        return self.get(self.surfaces, self.max_surfaces, (font, text, antialias, color, background),
+                        lambda: font.render(text, antialias, color, background))
+
+    def layout(self, key, make):
+        return self.get(self.layouts, self.max_layouts, key, make)
+
+
+class CachedFont:
+    """A pygame font whose rendered text surfaces come from a TextCache. The surfaces are shared: blit them only."""
+
+    def __init__(self, font, cache):
+        self.font = font
+        self.cache = cache
+
+    def render(self, text, antialias, color, background=None):
+        return self.cache.render(self.font, text, antialias, color, background)
+
+    def __getattr__(self, name):
+        return getattr(self.font, name)
+
+
+class MarkerLayout:
+    """
+    Positions of the entity markers within their areas on the map.
+
+    A marker's position is picked once, when its entity enters an area, and kept until it leaves it. Positions are
+    drawn from a generator seeded by the (entity, area) pair, so an entity lands in the same spot whenever it
+    enters the same area with the same company, and markers are spread out so they don't overlap.
+    """
+
+    def __init__(self, radius=7, margin=4, attempts=20):
+        """
+        Args:
+            radius (int): Radius of the markers, in pixels.
+            margin (int): Margin between the markers' centers and the area borders, in pixels.
+            attempts (int): Number of candidate positions tried for a marker before settling for the one furthest
+                from the other markers.
+        """
+        self.radius = radius
+        self.margin = margin
+        self.attempts = attempts
+        self.positions = {}  # Area ID -> {entity ID: (x, y)} of the entities in the area
+
+    def get_positions(self, area_id, rect, entities):
+        """
+        Args:
+            area_id (UUID): ID of the area.
+            rect (tuple): Screen rectangle (x, y, width, height) of the area.
+            entities (list): The entities currently in the area.
+
+        Returns:
+            list: The marker position (x, y) of each entity.
+        """
+        placed = self.positions.setdefault(area_id, {})
+
+        # Forget the entities that left the area
+        entity_ids = {entity.id for entity in entities}
+        for entity_id in [entity_id for entity_id in placed if entity_id not in entity_ids]:
+            del placed[entity_id]
+
+        for entity in entities:
+            if entity.id not in placed:
+                placed[entity.id] = self.place(entity.id, area_id, rect, list(placed.values()))
+
+        return [placed[entity.id] for entity in entities]
+
+    def place(self, entity_id, area_id, rect, others):
+        """Pick a position for a new marker in an area, away from the other markers there."""
+        x, y, width, height = rect
+        rng = randomness.substream('ui', entity_id.int ^ area_id.int)
+        min_distance = 2 * self.radius + 1
+
+        best, best_distance = None, -1.
+        for _ in range(self.attempts):
+            candidate = (rng.randint(int(x + self.margin), int(x + width - self.margin)),
+                         rng.randint(int(y + self.margin), int(y + height - self.margin)))
+            distance = min([math.dist(candidate, other) for other in others] or [float('inf')])
+            if distance >= min_distance:
+                return candidate
+            if distance > best_distance:
+                best, best_distance = candidate, distance
+
+        return best  # The area is too crowded for markers not to overlap
+
+
 class GUI:
-    def __init__(self, config_path: str, gc: GameController):
+    def __init__(self, config_path: str, gc: GameController, profile_path=None):
         pygame.init()
 
         self.gc = gc  # Game controller instance
 
+        # Turn and frame timings are written here at the end of the session
+        self.profile_path = profile_path
+        self.show_perf = False  # Toggled with F3: show timings instead of the area details
+
+        # Turns are processed on a worker thread, so that the window stays responsive during LLM calls
+        self.turn_thread = None
+        self.turn_error = None  # Exception raised by the last turn, re-raised on the GUI thread
+
         # Colors
         self.COLORS = {
             'background': '#1A1A1A',
@@ -108,6 +233,10 @@ class GUI:
 
         }
 
+        # Rendered text and wrapped lines are cached, so steady panels don't re-render their text every frame
+        self.text_cache = TextCache()
+        self.fonts = {name: CachedFont(font, self.text_cache) for name, font in self.fonts.items()}
+
         # Parse areas and calculate scaling
         self.scale_factor = min(
             (self.MAP_PANEL.width - 40) / self.config['mapWidth'],
@@ -117,8 +246,22 @@ class GUI:
         # Selected area for details panel
         self.selected_area = None
 
+        # Positions of the markers on the map
+        self.marker_layout = MarkerLayout()
+
+        # Pre-rendered areas, names and connections, see build_static_map
+        self.static_map = None
+        self.static_map_key_drawn = None
+
+        # Panels are only redrawn, and pushed to the display, when the state they show changed
+        self.panel_keys = {}
+        self.full_redraw = True
+
         # Chat messages and input
-        self.chat_messages = []
+        # Only the latest CHAT_HISTORY messages are kept for scrollback, the full log is in the mission log
+        self.chat_messages = deque(maxlen=CHAT_HISTORY)
+        self.chat_count = 0  # Messages ever added to the chat
+        self.chat_scroll = 0  # Messages scrolled back from the latest one
         self.chat_input = ""
 
         self.wrapped_input = ""
@@ -256,18 +399,21 @@ class GUI:
             render_skill("Observation", agent.skills['observation'], col2_x, skills_y)
             render_skill("Hacking", agent.skills['hacking'], col2_x, skills_y + 30)
 
-    def hex_to_rgb(self, hex_color: str) -> tuple[int, ...]:
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def hex_to_rgb(hex_color: str) -> tuple[int, ...]:
         hex_color = hex_color.lstrip('#')
         return tuple(int(hex_color[i:i + 2], 16) for i in (0, 2, 4))
 
-    def draw_panel(self, rect: pygame.Rect, title: str):
-        pygame.draw.rect(self.screen, self.hex_to_rgb(self.COLORS['panel_bg']), rect)
-        pygame.draw.rect(self.screen, self.hex_to_rgb(self.COLORS['border']), rect, 1)
+    def draw_panel(self, rect: pygame.Rect, title: str, surface=None):
+        surface = surface or self.screen
+        pygame.draw.rect(surface, self.hex_to_rgb(self.COLORS['panel_bg']), rect)
+        pygame.draw.rect(surface, self.hex_to_rgb(self.COLORS['border']), rect, 1)
         title_surface = self.fonts['title'].render(title, True, self.hex_to_rgb(self.COLORS['text']))
-        self.screen.blit(title_surface, (rect.x + 10, rect.y + 10))
+        surface.blit(title_surface, (rect.x + 10, rect.y + 10))
 
 
-    def draw_connection(self, connection):
+    def draw_connection(self, connection, surface):
         area1 = connection.area1
         area2 = connection.area2
         conn_type = connection.conn_type
@@ -298,10 +444,10 @@ class GUI:
             if bottom > top:  # If there is overlap
                 center_y = top + (bottom - top) / 2
                 if x1 < x2:  # area1 is to the left of area2
-                    pygame.draw.rect(self.screen, color,
+                    pygame.draw.rect(surface, color,
                                      (x2 - 2, center_y - 5, 4, 10))
                 else:  # area1 is to the right of area2
-                    pygame.draw.rect(self.screen, color,
+                    pygame.draw.rect(surface, color,
                                      (x1 - 2, center_y - 5, 4, 10))
 
         # Check for horizontal alignment (shared horizontal wall)
@@ -312,29 +458,40 @@ class GUI:
             if right > left:  # If there is overlap
                 center_x = left + (right - left) / 2
                 if y1 < y2:  # area1 is above area2
-                    pygame.draw.rect(self.screen, color,
+                    pygame.draw.rect(surface, color,
                                      (center_x - 5, y2 - 2, 10, 4))
                 else:  # area1 is below area2
-                    pygame.draw.rect(self.screen, color,
+                    pygame.draw.rect(surface, color,
                                      (center_x - 5, y1 - 2, 10, 4))
 
-    def draw_map(self):
+    def static_map_key(self):
+        """The state the static map layer depends on: exploration and lock state."""
+        return (tuple(area.get_explored() for area in self.gc.game_map.areas),
+                tuple((connection.is_locked1, connection.is_locked2) for connection in self.get_connections()))
 
-        self.draw_panel(self.MAP_PANEL, "Building Map")
+    def get_connections(self):
+        """All connections of the map, each once (areas on both sides of a connection share it)."""
+        connections = {}
+        for area in self.gc.game_map.areas:
+            for connection in area.connections:
+                connections[id(connection)] = connection
+        return list(connections.values())
 
-        # Dictionary to store each agent's position within their current area
-        agent_positions = {}
+    def build_static_map(self):
+        """Pre-render the map panel's background: areas, their names and the connections between them."""
+        surface = pygame.Surface(self.screen.get_size()).convert()
+        self.draw_panel(self.MAP_PANEL, "Building Map", surface)
 
-        for area in self.gc.get_entities(Area):
+        for area in self.gc.game_map.areas:
             x = self.MAP_PANEL.x + 20 + area.x * self.scale_factor
             y = self.MAP_PANEL.y + 20 + area.y * self.scale_factor
             width = area.width * self.scale_factor
             height = area.height * self.scale_factor
 
             # Draw the area rectangle
-            pygame.draw.rect(self.screen, self.hex_to_rgb(area.color),
+            pygame.draw.rect(surface, self.hex_to_rgb(area.color),
                              (x, y, width, height))
-            pygame.draw.rect(self.screen, self.hex_to_rgb(self.COLORS['border']),
+            pygame.draw.rect(surface, self.hex_to_rgb(self.COLORS['border']),
                              (x, y, width, height), 1)
 
             # Draw area name inside a text box
@@ -354,91 +511,65 @@ class GUI:
             for line in text_lines:
                 text_surface = font.render(line, True, (0, 0, 0))  # Black color
                 text_rect = text_surface.get_rect(center=(x + width / 2, y_offset + line_height / 2))
-                self.screen.blit(text_surface, text_rect)
+                surface.blit(text_surface, text_rect)
                 y_offset += line_height
 
-                # Check if the area contains any agents
-            agents_in_area = [agent for agent in self.gc.get_entities(Agent) if agent.area == area]
-            for agent in agents_in_area:
-                if agent.name not in agent_positions:
-                    # Generate a random position within the area for the agent
-
-                    previous_state = random.getstate()
-                    unique_seed = encode_uuids_to_integer(agent.id, area.id)
-                    random.seed(unique_seed)
+        for connection in self.get_connections():
+            self.draw_connection(connection, surface)
 
-                    dot_x = random.randint(int(x + margin), int(x + width - margin))
-                    dot_y = random.randint(int(y + margin), int(y + height - margin))
+        self.static_map = surface
 
-                    random.setstate(
-                        previous_state)  # Reset the random state to its previous state to avoid conflicts with other agents' positions'
-
-                    agent_positions[agent.name] = (dot_x, dot_y)
+    def draw_map(self):
+        """Draw the map: the static layer, rebuilt only when exploration or lock state changed, with the markers."""
+        key = self.static_map_key()
+        if self.static_map is None or key != self.static_map_key_drawn:
+            self.build_static_map()
+            self.static_map_key_drawn = key
+
+        self.screen.blit(self.static_map, self.MAP_PANEL, self.MAP_PANEL)
+        self.draw_markers()
+
+    def draw_markers(self):
+        """Draw the agents, hostiles and objectives on the map."""
+        for area in self.gc.game_map.areas:
+            x = self.MAP_PANEL.x + 20 + area.x * self.scale_factor
+            y = self.MAP_PANEL.y + 20 + area.y * self.scale_factor
+            width = area.width * self.scale_factor
+            height = area.height * self.scale_factor
 
+            agents_in_area = self.gc.get_entities(Agent, area)
+            hostiles_in_area = self.gc.get_entities(Hostile, area)
+            objectives_in_area = self.gc.get_entities(Objective, area)
 
-                else:
-                    # Use the previously stored position
-                    dot_x, dot_y = agent_positions[agent.name]
+            # Every entity in the area gets its place, shown or not, so that markers don't move as others appear
+            entities = agents_in_area + hostiles_in_area + objectives_in_area
+            positions = dict(zip([entity.id for entity in entities],
+                                 self.marker_layout.get_positions(area.id, (x, y, width, height), entities)))
 
+            markers = []
+            for agent in agents_in_area:
                 # Get colors based on agent's hidden status
-                inner_color, outline_color = get_agent_colors(agent)
-
-                # Draw the agent
-                pygame.draw.circle(self.screen, outline_color, (dot_x, dot_y), 7)  # outline (outer circle)
-                pygame.draw.circle(self.screen, inner_color, (dot_x, dot_y), 5)  # Inner circle
+                markers.append((agent, get_agent_colors(agent)))
 
-            # Check if the area contains any hostiles
-            hostiles_in_area = [hostile for hostile in self.gc.get_entities(Hostile) if hostile.area == area]
             for hostile in hostiles_in_area:
                 if agents_in_area or hostile.is_peeked or self.gc.hostiles_visible:
-                    previous_state = random.getstate()
-                    unique_seed = encode_uuids_to_integer(area.id, hostile.id)
-                    random.seed(unique_seed)
-
-                    red_dot_x = random.randint(int(x + margin), int(x + width - margin))
-                    red_dot_y = random.randint(int(y + margin), int(y + height - margin))
-
-                    random.setstate(
-                        previous_state)  # Reset the random state to its previous state to avoid conflicts with other agents' positions'
-
                     # Get colors based on hostile's alarm level
-                    inner_color, outline_color = get_hostile_colors(hostile)
-
-                    # Draw the hostile
-                    pygame.draw.circle(self.screen, outline_color, (red_dot_x, red_dot_y),
-                                       7)  # outline (outer circle)
-                    pygame.draw.circle(self.screen, inner_color, (red_dot_x, red_dot_y), 5)  # Inner circle
-
-            objectives_in_area = [objective for objective in self.gc.get_entities(Objective) if
-                                  objective.area == area]
+                    markers.append((hostile, get_hostile_colors(hostile)))
 
             for objective in objectives_in_area:
                 if objective.get_explored() > 0:
-                    previous_state = random.getstate()
-
-                    unique_seed = encode_uuids_to_integer(area.id, objective.id)
-                    random.seed(unique_seed)
-
-                    blue_dot_x = random.randint(int(x + margin), int(x + width - margin))
-                    blue_dot_y = random.randint(int(y + margin), int(y + height - margin))
-
-                    random.setstate(
-                        previous_state)  # Reset the random state to its previous state to avoid conflicts with other agents' positions'
+                    markers.append((objective, get_objective_colors(objective)))
 
-                    inner_color, outline_color = get_objective_colors(objective)
-
-                    # Draw the objective
-                    pygame.draw.circle(self.screen, outline_color, (blue_dot_x, blue_dot_y),
-                                       7)  # outline (outer circle)
-                    pygame.draw.circle(self.screen, inner_color,
-                                       (blue_dot_x, blue_dot_y), 5)  # Inner circle
-
-        for area in self.gc.get_entities(Area):
-            for connection in area.connections:
-                self.draw_connection(connection)
+            for entity, (inner_color, outline_color) in markers:
+                pygame.draw.circle(self.screen, outline_color, positions[entity.id], 7)  # outline (outer circle)
+                pygame.draw.circle(self.screen, inner_color, positions[entity.id], 5)  # Inner circle
 
     def wrap_input_text(self, text, font, max_width):
         """Wrap input text and handle cursor position"""
+        return self.text_cache.layout(('input', font, text, max_width),
+                                      lambda: self._wrap_input_text(text, font, max_width))
+
+    def _wrap_input_text(self, text, font, max_width):
         words = text.split(' ')
         lines = []
         current_line = ""
@@ -462,6 +593,10 @@ class GUI:
         return '\n'.join(lines)
 
     def wrap_text(self, text, font, max_width):
+        """Wrap text into lines that fit the width. The returned list is cached: don't modify it."""
+        return self.text_cache.layout((font, text, max_width), lambda: self._wrap_text(text, font, max_width))
+
+    def _wrap_text(self, text, font, max_width):
         words = text.split(' ')
         lines = []
         current_line = ""
@@ -479,7 +614,32 @@ class GUI:
 
         return lines
 
+    def draw_perf(self):
+        """Draw the rolling summary of turn and frame timings in the details panel."""
+        self.draw_panel(self.DETAILS_PANEL, "Performance (ms)")
+
+        font = self.fonts['small']
+        columns = [('phase', 0), ('n', 170), ('mean', 215), ('p50', 270), ('p95', 325), ('max', 380)]
+        y = self.DETAILS_PANEL.y + 60
+        for label, x in columns:
+            surface = font.render(label, True, self.hex_to_rgb(self.COLORS['subtext']))
+            self.screen.blit(surface, (self.DETAILS_PANEL.x + 10 + x, y))
+
+        for name, stats in self.gc.profiler.summary().items():
+            y += font.get_linesize()
+            if y > self.DETAILS_PANEL.bottom - font.get_linesize():
+                break
+            values = [name, str(stats['count'])] + [f"{stats[key]:.1f}" for key in
+                                                    ['mean_ms', 'p50_ms', 'p95_ms', 'max_ms']]
+            for value, (_, x) in zip(values, columns):
+                surface = font.render(value, True, self.hex_to_rgb(self.COLORS['text']))
+                self.screen.blit(surface, (self.DETAILS_PANEL.x + 10 + x, y))
+
     def draw_area_details(self):
+        if self.show_perf:
+            self.draw_perf()
+            return
+
         self.draw_panel(self.DETAILS_PANEL, "Details")
         if self.selected_area:
             area = next((a for a in self.gc.get_entities(Area) if a.name == self.selected_area), None)
@@ -499,11 +659,9 @@ class GUI:
                     y_offset += self.fonts['body'].get_linesize()
 
                 y_offset += 40
-                agents_in_area = [agent for agent in self.gc.get_entities(Agent) if agent.area == area]
-                hostiles_in_area = [hostile for hostile in self.gc.get_entities(Hostile) if
-                                    hostile.area == area]
-                objectives_in_area = [objective for objective in self.gc.get_entities(Objective) if
-                                      objective.area == area]
+                agents_in_area = self.gc.get_entities(Agent, area)
+                hostiles_in_area = self.gc.get_entities(Hostile, area)
+                objectives_in_area = self.gc.get_entities(Objective, area)
 
                 # Display agents
                 if agents_in_area:
@@ -561,21 +719,24 @@ class GUI:
         )
 
         # Adjust message display area to account for larger input box
-        messages_area_height = self.CHAT_PANEL.height - 70 - self.input_box_height
+        # Leaves a line free above the input box for the turn status
+        messages_area_height = self.CHAT_PANEL.height - 70 - self.input_box_height - self.fonts['small'].get_linesize()
 
         # Display messages with improved wrapping
         visible_messages = []
         current_height = 0
 
-        for message in reversed(self.chat_messages):
+        # Only the messages that fit are wrapped, from the latest one shown up
+        for message in islice(reversed(self.chat_messages), self.chat_scroll, None):
             wrapped_lines = self.wrap_text(message, self.fonts['small'], max_message_width)
             message_height = len(wrapped_lines) * self.fonts['small'].get_linesize()
 
             if current_height + message_height > messages_area_height:
                 break
 
-            visible_messages.insert(0, (wrapped_lines, message_height))
+            visible_messages.append((wrapped_lines, message_height))
             current_height += message_height
+        visible_messages.reverse()
 
         # Render visible messages
         current_y = y_offset
@@ -585,6 +746,17 @@ class GUI:
                 self.screen.blit(msg_surface, (self.CHAT_PANEL.x + 10, self.CHAT_PANEL.y + current_y))
                 current_y += self.fonts['small'].get_linesize()
 
+        # Show that a turn is being processed, or that the chat is scrolled back, right above the input box
+        status = None
+        if self.turn_in_progress():
+            dots = '.' * (1 + pygame.time.get_ticks() // 400 % 3)
+            status = f"Turn {self.gc.turn_counter + 1} in progress{dots}"
+        elif self.chat_scroll:
+            status = f"{self.chat_scroll} newer messages (PgDn)"
+        if status:
+            status_surface = self.fonts['small'].render(status, True, self.hex_to_rgb(self.COLORS['highlight']))
+            self.screen.blit(status_surface, (input_box.x, input_box.y - self.fonts['small'].get_linesize() - 2))
+
         # Draw input box with wrapped text
         pygame.draw.rect(self.screen, self.hex_to_rgb(self.COLORS['panel_bg']), input_box)
         pygame.draw.rect(self.screen, self.hex_to_rgb(self.COLORS['border']), input_box, 1)
@@ -617,47 +789,149 @@ class GUI:
 
     def handle_input(self, event):
         if event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_RETURN:  # Submit message
+            if event.key == pygame.K_F3:  # Toggle the timings display
+                self.show_perf = not self.show_perf
+
+            elif event.key == pygame.K_RETURN and self.chat_input.strip() == '/perf':  # Print the timings
+                for line in self.gc.profiler.format_summary():
+                    self.add_chat_message(line)
+                self.chat_input = ""
+
+            elif event.key == pygame.K_RETURN and self.chat_input.strip() == '/undo' and not self.turn_in_progress():
+                undone = self.gc.undo()
+                self.add_chat_message(f"Turn {self.gc.turn_counter + 1} undone." if undone else "Nothing to undo.")
+                self.chat_input = ""
+
+            elif event.key == pygame.K_RETURN and self.turn_in_progress():
+                pass  # Keep the message until the current turn is over
+
+            elif event.key == pygame.K_RETURN:  # Submit message
                 if self.chat_input.strip():
 
                     if self.gc.mode in ['auto', 'a']:
                         control_message = 'Control: ' + self.chat_input.strip()
-                        self.chat_messages.append(control_message)
+                        self.add_chat_message(control_message)
                         self.chat_input = ""
-                        self.gc.mission_log.append(control_message, push_to_queue=False)
-                self.gc.process_turn()
+                        self.gc.add_control_message(control_message, push_to_queue=False)
+                self.start_turn()
 
-                while len(self.gc.mission_log.print_queue) > 0:
-                    self.chat_messages.append(self.gc.mission_log.print_queue.popleft())
+            elif event.key in [pygame.K_PAGEUP, pygame.K_PAGEDOWN]:  # Scroll the chat
+                self.scroll_chat(5 if event.key == pygame.K_PAGEUP else -5)
 
             elif event.key == pygame.K_BACKSPACE:  # Delete character
                 self.chat_input = self.chat_input[:-1]
             else:
                 self.chat_input += event.unicode
 
+    def get_panels(self):
+        """
+        Returns:
+            list: (name, rect, draw function, key function) of every panel. A panel is redrawn when its key changes.
+        """
+        version = self.gc.state_version
+        return [
+            ('map', self.MAP_PANEL, self.draw_map, lambda: version),
+            ('details', self.DETAILS_PANEL, self.draw_area_details,
+             # The timings shown with F3 change all the time, so they are refreshed twice a second
+             lambda: (version, self.selected_area, self.show_perf and pygame.time.get_ticks() // 500)),
+            ('chat', self.CHAT_PANEL, self.draw_chat,
+             lambda: (self.chat_count, self.chat_scroll, self.chat_input,
+                      self.turn_in_progress() and (self.gc.turn_counter, pygame.time.get_ticks() // 400 % 3))),
+            ('agents', self.AGENTS_PANEL, self.draw_agents, lambda: version),
+        ]
+
+    def turn_in_progress(self):
+        return self.turn_thread is not None and self.turn_thread.is_alive()
+
+    def start_turn(self):
+        """Process the next turn on a worker thread."""
+        self.turn_thread = threading.Thread(target=self.process_turn, name='turn', daemon=True)
+        self.turn_thread.start()
+
+    def process_turn(self):
+        try:
+            self.gc.process_turn()
+        except Exception as e:
+            self.turn_error = e
+
+    def add_chat_message(self, message):
+        self.chat_messages.append(message)
+        self.chat_count += 1
+        if self.chat_scroll:
+            # Keep the messages being read in view
+            self.scroll_chat(1)
+
+    def scroll_chat(self, messages):
+        """Scroll the chat back (positive) or forward (negative) by a number of messages."""
+        self.chat_scroll = min(max(0, self.chat_scroll + messages), max(0, len(self.chat_messages) - 1))
+
+    def drain_print_queue(self):
+        """Move the messages the turn worker logged so far into the chat."""
+        # deque.append and popleft are atomic, so the worker can keep appending meanwhile
+        while self.gc.mission_log.print_queue:
+            self.add_chat_message(self.gc.mission_log.print_queue.popleft())
+
     def run(self):
         running = True
         clock = pygame.time.Clock()
 
-        while running:
-
-            for event in pygame.event.get():
-
-                if event.type == pygame.QUIT:
-                    running = False
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    if event.button == 1:
-                        self.handle_click(event.pos)
-                elif event.type in [pygame.KEYDOWN, pygame.KEYUP]:
-                    self.handle_input(event)
+        profiler = self.gc.profiler
 
-            self.screen.fill(self.hex_to_rgb(self.COLORS['background']))
-            self.draw_map()
-            self.draw_area_details()
-            self.draw_chat()
-            self.draw_agents()
-
-            pygame.display.flip()
+        while running:
+            frame_start = time.perf_counter()
+
+            with profiler.phase('frame/events'):
+                for event in pygame.event.get():
+
+                    if event.type == pygame.QUIT:
+                        running = False
+                    elif event.type == pygame.MOUSEBUTTONDOWN:
+                        if event.button == 1:
+                            self.handle_click(event.pos)
+                    elif event.type in [pygame.KEYDOWN, pygame.KEYUP]:
+                        self.handle_input(event)
+                    elif event.type == pygame.MOUSEWHEEL:
+                        if self.CHAT_PANEL.collidepoint(pygame.mouse.get_pos()):
+                            self.scroll_chat(event.y)
+                    elif event.type in [pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED]:
+                        self.full_redraw = True
+
+            if self.turn_error is not None:
+                error, self.turn_error = self.turn_error, None
+                raise error
+
+            self.drain_print_queue()
+
+            # The turn worker only holds the lock while it changes the state, not while waiting on the LLM
+            with self.gc.state_lock:
+                if self.full_redraw:
+                    self.screen.fill(self.hex_to_rgb(self.COLORS['background']))
+
+                dirty_rects = []
+                for name, rect, draw, key in self.get_panels():
+                    key = key()
+                    if self.full_redraw or self.panel_keys.get(name) != key:
+                        # Clipped, so that only the panel's own rect needs to be pushed to the display
+                        self.screen.set_clip(rect)
+                        with profiler.phase(f'frame/draw_{name}'):
+                            draw()
+                        self.screen.set_clip(None)
+                        self.panel_keys[name] = key
+                        dirty_rects.append(rect)
+
+            with profiler.phase('frame/flip'):
+                if self.full_redraw:
+                    pygame.display.flip()
+                elif dirty_rects:
+                    pygame.display.update(dirty_rects)
+            self.full_redraw = False
+
+            # Time spent on the frame, not counting the wait for the next tick
+            profiler.record('frame', time.perf_counter() - frame_start)
             clock.tick(60)
 
+        if self.profile_path:
+            profiler.dump(self.profile_path)
+        self.gc.close()
+
         pygame.quit()
@@ -0,0 +1,211 @@
+"""
+Record and replay of LLM decision queries ("cassettes"), to run auto mode offline.
+
+A CassetteRecorder wraps the decision query of a live session (see DecisionDispatcher) and records every prompt, its
+raw response and the round-trip latency. A CassettePlayer then stands in for the LLM: it serves the recorded
+response of each prompt, after its recorded latency (scaled, 0 for instant responses). Decision prompts are
+canonicalized, and the game's randomness is seeded from the seed stored in the cassette (see randomness.py), so a
+replayed session produces the same prompts as the recorded one, and thus the same game, without network access.
+
+Cassette file layout: an 8-byte magic, then records, each starting with a one-byte record type:
+    metadata: length (uint32), JSON object (e.g. the seed and mission of the session)
+    response: prompt key (8-byte hash), latency (float64), compressed prompt length and response length (uint32),
+        zlib-compressed prompt, UTF-8 response
+Records are appended as they happen. On load, only the headers are read, to index the responses by prompt key.
+
+Usage, to summarize a cassette:
+    python cassette.py logs_internal/session.cassette [--dump]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import statistics
+import struct
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MAGIC = b'MCCASST1'
+
+METADATA_RECORD = b'M'
+RESPONSE_RECORD = b'R'
+METADATA_HEADER = struct.Struct('<I')
+RESPONSE_HEADER = struct.Struct('<8sdII')
+
+
+def prompt_key(prompt):
+    return hashlib.blake2b(prompt.encode('utf-8'), digest_size=8).digest()
+
+
+class CassetteMiss(LookupError):
+    """Raised when replaying a prompt that is not in the cassette."""
+
+
+class CassetteRecorder:
+    """Wraps a decision query, recording every prompt, response and latency to a cassette file."""
+
+    def __init__(self, path, query, metadata=None):
+        """
+        Args:
+            path (str): The cassette file. Overwritten.
+            query (callable): The live query, taking a prompt and returning the raw response.
+            metadata (dict): Session information to store in the cassette, e.g. {'seed': ...}.
+        """
+        self.query = query
+        self.lock = threading.Lock()  # Queries run concurrently, on the dispatcher's threads
+        self.file = open(path, 'wb')
+        self.file.write(CASSETTE_MAGIC)
+        self.write_metadata(metadata or {})
+
+    def write_metadata(self, metadata):
+        data = json.dumps(metadata).encode('utf-8')
+        with self.lock:
+            self.file.write(METADATA_RECORD + METADATA_HEADER.pack(len(data)) + data)
+
+    def __call__(self, prompt):
+        start = time.perf_counter()
+        response = self.query(prompt)
+        latency = time.perf_counter() - start
+
+        compressed_prompt = zlib.compress(prompt.encode('utf-8'))
+        data = response.encode('utf-8')
+        with self.lock:
+            self.file.write(RESPONSE_RECORD + RESPONSE_HEADER.pack(prompt_key(prompt), latency,
+                                                                   len(compressed_prompt), len(data)))
+            self.file.write(compressed_prompt + data)
+        return response
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class CassettePlayer:
+    """
+    Serves recorded responses in place of the LLM.
+
+    A prompt recorded several times (e.g. retried after an invalid response) gets its responses in the recorded
+    order, starting over once they are used up. Prompts that were not recorded raise CassetteMiss.
+    """
+
+    def __init__(self, path, latency_scale=1.):
+        """
+        Args:
+            path (str): The cassette file.
+            latency_scale (float): Factor of the recorded latencies responses are served after (0 for instant
+                responses).
+        """
+        self.path = path
+        self.latency_scale = latency_scale
+        self.metadata = {}
+        self.index = {}  # Prompt key -> [(latency, response offset, response length)], in recorded order
+        self.positions = {}
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+        self.file = open(path, 'rb')
+        self.load_index()
+
+    def load_index(self):
+        f = self.file
+        if f.read(len(CASSETTE_MAGIC)) != CASSETTE_MAGIC:
+            raise ValueError(f"{self.path} is not a cassette file")
+        while True:
+            record_type = f.read(1)
+            if not record_type:
+                return
+            if record_type == METADATA_RECORD:
+                length, = METADATA_HEADER.unpack(f.read(METADATA_HEADER.size))
+                self.metadata.update(json.loads(f.read(length)))
+            elif record_type == RESPONSE_RECORD:
+                header = f.read(RESPONSE_HEADER.size)
+                if len(header) < RESPONSE_HEADER.size:
+                    logger.warning(f"Cassette {self.path} is truncated")
+                    return
+                key, latency, prompt_length, response_length = RESPONSE_HEADER.unpack(header)
+                offset = f.seek(prompt_length, 1)
+                self.index.setdefault(key, []).append((latency, offset, response_length))
+                f.seek(response_length, 1)
+            else:
+                raise ValueError(f"Unknown cassette record type {record_type!r} in {self.path}")
+
+    def __call__(self, prompt):
+        key = prompt_key(prompt)
+        with self.lock:
+            entries = self.index.get(key)
+            if not entries:
+                self.misses += 1
+                raise CassetteMiss("Prompt not found in the cassette")
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+            latency, offset, length = entries[position % len(entries)]
+            self.file.seek(offset)
+            response = self.file.read(length).decode('utf-8')
+            self.hits += 1
+
+        if self.latency_scale:
+            time.sleep(latency * self.latency_scale)
+        return response
+
+    def close(self):
+        self.file.close()
+
+
+def read_cassette(path):
+    """
+    Read back the records of a cassette.
+
+    Yields:
+        dict: Metadata records, with a metadata key, and responses, with prompt, response and latency keys.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(CASSETTE_MAGIC)) != CASSETTE_MAGIC:
+            raise ValueError(f"{path} is not a cassette file")
+        while True:
+            record_type = f.read(1)
+            if not record_type:
+                return
+            if record_type == METADATA_RECORD:
+                length, = METADATA_HEADER.unpack(f.read(METADATA_HEADER.size))
+                yield {'metadata': json.loads(f.read(length))}
+            elif record_type == RESPONSE_RECORD:
+                _, latency, prompt_length, response_length = RESPONSE_HEADER.unpack(f.read(RESPONSE_HEADER.size))
+                yield {
+                    'prompt': zlib.decompress(f.read(prompt_length)).decode('utf-8'),
+                    'response': f.read(response_length).decode('utf-8'),
+                    'latency': latency,
+                }
+            else:
+                raise ValueError(f"Unknown cassette record type {record_type!r} in {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a decision cassette")
+    parser.add_argument('path', help='Cassette file')
+    parser.add_argument('--dump', action='store_true', help='Print every record as JSON Lines instead')
+    args = parser.parse_args()
+
+    metadata = {}
+    latencies = []
+    prompts = set()
+    for record in read_cassette(args.path):
+        if args.dump:
+            print(json.dumps(record))
+        elif 'metadata' in record:
+            metadata.update(record['metadata'])
+        else:
+            latencies.append(record['latency'])
+            prompts.add(record['prompt'])
+
+    if not args.dump:
+        print(json.dumps(metadata))
+        print(f"{len(latencies)} responses to {len(prompts)} distinct prompts")
+        if len(latencies) > 1:
+            quantiles = statistics.quantiles(latencies, n=20)
+            print(f"Latency: mean {statistics.fmean(latencies):.3f}s, median {statistics.median(latencies):.3f}s, "
+                  f"p95 {quantiles[-1]:.3f}s, max {max(latencies):.3f}s")
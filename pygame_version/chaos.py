@@ -1,8 +1,12 @@
-from collections import defaultdict
+from rules import RuleSet
+
+# Rules with the default tables, for callers outside a mission. Missions use their world's rules.
+DEFAULT_RULES = RuleSet()
+
 
 def get_alarm_increase(action, skill_level):
     """
-    Calculate the alarm increase based on the action and the agent's skill level.
+    Calculate the alarm increase based on the action and the agent's skill level, with the default rules.
 
     Args:
         action (str): The action being performed.
@@ -11,31 +15,4 @@ def get_alarm_increase(action, skill_level):
     Returns:
         float: The alarm increase caused by the action.
     """
-
-    # Define the alarm level mapping
-    alarm_values = {
-        "wait": defaultdict(lambda: 0),
-        "look_around": defaultdict(lambda: 0),
-        "peek": {1.0: 0.1, 0.8: 0.2},
-        "investigate": defaultdict(lambda: .4), #{1: 0.1, 0.8: 0.3}, # temp val. just to make noise
-        "hide": {1.0: 0.05, 0.8: 0.1, .0: .5},
-        "take_out": {1.0: 0.15, 0.8: 0.25},
-        "shoot": defaultdict(lambda: 2),
-        "bypass": {1.0: 0.1, 0.8: 0.15},
-        "capture": {1.0: 0.4, 0.8: 0.6},
-        "sneak": {1.0: 0.05, 0.8: 0.2, .0: .1},
-        "charge": defaultdict(lambda: 2),
-        "exfiltrate": {1.0: 0.15, 0.8: 0.25, .0: .5},
-    }
-
-    # Ensure the action is valid
-    if action not in alarm_values:
-        raise ValueError(f"Unknown action: {action}")
-
-    # Ensure the skill level is valid
-    if skill_level not in [1.0, 0.8, .0]:
-        raise ValueError(f"Invalid skill level: {skill_level}. Must be 1.0 or 0.8.")
-
-    # Return the corresponding alarm increase
-    return alarm_values[action][skill_level]
-
+    return DEFAULT_RULES.get_alarm_increase(action, skill_level)
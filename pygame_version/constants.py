@@ -51,4 +51,83 @@ ACTION_TO_COUNTER_SKILL = {
     'hide': 'observation',
     'take_out': 'hand_to_hand',
     'shoot': 'cover',
-}
\ No newline at end of file
+}
+
+# Alarm increase caused by each action, per skill level of the agent in the action's skill (see ACTION_TO_SKILL).
+# A single number applies to every skill level.
+ALARM_INCREASES = {
+    'wait': 0,
+    'look_around': 0,
+    'peek': {1.0: 0.1, 0.8: 0.2},
+    'investigate': .4,  # {1: 0.1, 0.8: 0.3}, # temp val. just to make noise
+    'hide': {1.0: 0.05, 0.8: 0.1, .0: .5},
+    'take_out': {1.0: 0.15, 0.8: 0.25},
+    'shoot': 2,
+    'bypass': {1.0: 0.1, 0.8: 0.15},
+    'capture': {1.0: 0.4, 0.8: 0.6},
+    'sneak': {1.0: 0.05, 0.8: 0.2, .0: .1},
+    'charge': 2,
+    'exfiltrate': {1.0: 0.15, 0.8: 0.25, .0: .5},
+}
+
+# Skill levels the alarm increases are defined for
+SKILL_LEVELS = [1.0, 0.8, .0]
+
+# Decision dispatch (auto mode)
+DECISION_MAX_RETRIES = 5  # Attempts per agent before falling back to waiting
+DECISION_TURN_DEADLINE = 60.  # Seconds allowed for all agents to produce a valid decision
+DECISION_RETRY_BACKOFF = .5  # Seconds to wait before re-querying after a failed request
+DECISION_MAX_WORKERS = 16  # Concurrent LLM requests
+DECISION_REUSE_LIMIT = 3  # Turns in a row a decision is repeated while the situation is unchanged, without the LLM
+
+# Locality-scoped knowledge base (see KnowledgeBase.render_scoped)
+KB_SCOPE_HOPS = 2  # Connections away from an agent within which areas and entities are described in full
+KB_TOKEN_BUDGET = 1500  # Tokens the scoped explored-world description is trimmed to fit
+PROMPT_CHARS_PER_TOKEN = 4  # Characters per token, to estimate prompt sizes
+
+# Noise propagation (see noise.py)
+NOISE_HOPS = 1  # How many connections away noise is heard
+NOISE_HOP_DECAY = .5  # Extra attenuation per hop after the first
+NOISE_DURATION = 0  # Turns noise lingers in an area after it was made
+NOISE_LINGER_DECAY = .5  # Attenuation of lingering noise per turn
+
+# Timing instrumentation (see profiler.py)
+PROFILE_WINDOW = 200  # Recent samples per phase used for the rolling summary
+PROFILE_BUCKETS_MS = [.1, .25, .5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+# Mission log (see mission_log.py)
+MISSION_LOG_RETENTION = 1000  # Latest entries kept in memory, older ones are spilled to disk
+CHAT_HISTORY = 500  # Messages kept in the GUI's chat panel for scrollback
+
+# Decision prompt log (see prompt_log.py)
+PROMPT_LOG_SEGMENT_BYTES = 4 * 1024 * 1024  # Compressed size after which a segment is rotated
+PROMPT_LOG_SEGMENT_SECONDS = 3600  # Age after which a segment is rotated
+PROMPT_LOG_MAX_SEGMENTS = 50  # Latest segments kept on disk
+
+# Snapshots (see snapshot.py)
+UNDO_HISTORY = 20  # Turns that can be undone
+
+# Lookahead planner (see planner.py)
+PLANNER_TURN_BUDGET = 2.  # Seconds of search per turn, shared by the agents deciding
+PLANNER_WORKERS = 0  # Processes searching in parallel (0 to search in the game's process, see planner.py)
+PLANNER_HORIZON = 8  # Turns played out by each simulation
+PLANNER_EXPLORATION = .7  # UCB exploration constant
+PLANNER_REWARD_WEIGHTS = {  # Weights of the terms of the evaluation of a simulated outcome
+    'captured': 1.,  # Fraction of the objectives captured
+    'exfiltrated': 1.,  # Fraction of the team exfiltrated, once every objective is captured
+    'health': .5,  # Mean health of the team
+    'lost': 1.,  # Fraction of the team lost (subtracted)
+    'alarm': .3,  # Mean hostile alarm level (subtracted)
+    'progress': .3,  # Closeness of the deciding agent to its next target
+    'explored': .2,  # Fraction of the map explored
+}
+
+# Mock LLM server for load tests (see mock_llm.py and load_test.py)
+MOCK_LLM_PORT = 8765
+MOCK_LLM_PROFILES = {  # Provider behaviours, as settings of MockProfile
+    'ideal': {},
+    'typical': {'latency_median': 1.2, 'latency_sigma': .4, 'malformed_prob': .02, 'invalid_id_prob': .03},
+    'degraded': {'latency_median': 3., 'latency_sigma': .8, 'stall_prob': .05, 'stall_seconds': 20.,
+                 'rate_limit_rps': 5., 'rate_limit_burst': 10, 'error_prob': .05, 'malformed_prob': .1,
+                 'invalid_id_prob': .1},
+}
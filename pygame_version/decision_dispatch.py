@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_response_tools import query_lbgpt, response_parsing
+
+from constants import *
+
+logger = logging.getLogger(__name__)
+
+
+def query_single(prompt):
+    """Send a single prompt through lbgpt and return the raw response."""
+    return query_lbgpt('', [prompt])[0]
+
+
+class DecisionDispatcher:
+    """
+    Fires all agent decision prompts at once, validates each response as soon as it arrives and
+    re-queries only the agents whose response failed validation.
+
+    Each agent gets its own retry budget, and the whole turn is bounded by a deadline, so turn latency
+    is set by the slowest agent rather than by the number of retry rounds.
+    """
+
+    def __init__(self, query=query_single, max_retries=DECISION_MAX_RETRIES, turn_deadline=DECISION_TURN_DEADLINE,
+                 retry_backoff=DECISION_RETRY_BACKOFF, max_workers=DECISION_MAX_WORKERS, profiler=None):
+        """
+        Args:
+            query (callable): Blocking function taking a prompt string and returning the raw response string.
+            max_retries (int): Number of attempts per agent before giving up on that agent.
+            turn_deadline (float): Seconds allowed for the whole turn.
+            retry_backoff (float): Base delay in seconds before re-querying after a failed request.
+            max_workers (int): Maximum number of requests in flight at once.
+            profiler (TurnProfiler): If given, every request and response validation is timed on it.
+        """
+        self.query = query
+        self.max_retries = max_retries
+        self.turn_deadline = turn_deadline
+        self.retry_backoff = retry_backoff
+        self.profiler = profiler
+
+        # Running totals of requests and their outcomes: requests, request_errors, invalid_responses, decisions,
+        # exhausted (agents out of attempts) and deadline_missed (agents still pending at the turn deadline). In
+        # squad mode, also squad_requests, squad_decisions (agents decided by a squad response) and squad_fallbacks
+        # (agents it left without a valid decision, queried on their own)
+        self.stats = Counter()
+
+        # A dedicated executor, so that requests still in flight after the deadline don't block the turn
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='decision')
+
+    def dispatch(self, agents, prompts, aliases=None):
+        """
+        Query decisions for all agents concurrently.
+
+        Args:
+            agents (list): Agents to get decisions for.
+            prompts (list): Decision prompts, one per agent.
+            aliases (AliasTable): The alias table the prompts were built with, used to resolve arguments.
+
+        Returns:
+            dict: Maps each agent to its validated decision, in the order of `agents`. Agents that exhausted
+            their retry budget or missed the turn deadline are left out.
+        """
+        if not agents:
+            return {}
+        return asyncio.run(self._dispatch(agents, prompts, aliases))
+
+    def dispatch_squad(self, agents, prompt, make_prompt, aliases=None):
+        """
+        Query decisions for all agents with a single prompt, then query on their own the agents the response left
+        without a valid decision.
+
+        Args:
+            agents (list): Agents to get decisions for.
+            prompt (str): The squad decision prompt, asking for a dictionary mapping agent names to decisions.
+            make_prompt (callable): Returns the decision prompt of a single agent, for those queried on their own.
+            aliases (AliasTable): The alias table the prompts were built with, used to resolve arguments.
+
+        Returns:
+            dict: Maps each agent to its validated decision, in the order of `agents`. Agents that exhausted
+            their retry budget or missed the turn deadline are left out.
+        """
+        if not agents:
+            return {}
+        return asyncio.run(self._dispatch_squad(agents, prompt, make_prompt, aliases))
+
+    def timed_query(self, prompt):
+        """Run the query, timing the round trip."""
+        start = time.perf_counter()
+        try:
+            return self.query(prompt)
+        finally:
+            if self.profiler:
+                self.profiler.record('llm/request', time.perf_counter() - start)
+
+    async def _dispatch(self, agents, prompts, aliases, timeout=None):
+        tasks = {agent: asyncio.create_task(self._decide(agent, prompt, aliases))
+                 for agent, prompt in zip(agents, prompts)}
+
+        done, pending = await asyncio.wait(tasks.values(), timeout=self.turn_deadline if timeout is None else timeout)
+        for task in pending:
+            task.cancel()
+
+        agent2decision = {}
+        for agent, task in tasks.items():
+            if task in done and task.result() is not None:
+                agent2decision[agent] = task.result()
+            elif task in pending:
+                self.stats['deadline_missed'] += 1
+                logger.warning(f"Turn deadline reached before {agent.name} produced a valid decision.")
+
+        return agent2decision
+
+    async def _decide(self, agent, prompt, aliases):
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(self.max_retries):
+            self.stats['requests'] += 1
+            try:
+                response = await loop.run_in_executor(self.executor, self.timed_query, prompt)
+            except Exception as e:
+                self.stats['request_errors'] += 1
+                logger.warning(f"Decision request for {agent.name} failed (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(self.retry_backoff * (attempt + 1))
+                continue
+
+            start = time.perf_counter()
+            try:
+                decision = agent.parse_decision(response, aliases)
+                self.stats['decisions'] += 1
+                return decision
+            except Exception as e:
+                # Anything the response trips up in validation makes it invalid, it must not abort the turn
+                self.stats['invalid_responses'] += 1
+                logger.warning(f"Invalid decision for {agent.name} (attempt {attempt + 1}): {e}")
+            finally:
+                if self.profiler:
+                    self.profiler.record('llm/parse', time.perf_counter() - start)
+
+        self.stats['exhausted'] += 1
+        logger.warning(f"{agent.name} exhausted {self.max_retries} decision attempts.")
+        return None
+
+    async def _dispatch_squad(self, agents, prompt, make_prompt, aliases):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.turn_deadline
+
+        try:
+            agent2decision = await asyncio.wait_for(self._decide_squad(agents, prompt, aliases), self.turn_deadline)
+        except asyncio.TimeoutError:
+            logger.warning("Turn deadline reached before the squad produced a valid response.")
+            agent2decision = {}
+
+        rest = [agent for agent in agents if agent not in agent2decision]
+        if rest:
+            self.stats['squad_fallbacks'] += len(rest)
+            agent2decision.update(await self._dispatch(rest, [make_prompt(agent) for agent in rest], aliases,
+                                                       timeout=max(0., deadline - loop.time())))
+
+        return {agent: agent2decision[agent] for agent in agents if agent in agent2decision}
+
+    async def _decide_squad(self, agents, prompt, aliases):
+        """
+        Query the squad prompt until its response parses as a dictionary, and validate each agent's decision in it.
+        Returns the valid decisions, invalid ones are not retried here.
+        """
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(self.max_retries):
+            self.stats['requests'] += 1
+            self.stats['squad_requests'] += 1
+            try:
+                response = await loop.run_in_executor(self.executor, self.timed_query, prompt)
+            except Exception as e:
+                self.stats['request_errors'] += 1
+                logger.warning(f"Squad decision request failed (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(self.retry_backoff * (attempt + 1))
+                continue
+
+            start = time.perf_counter()
+            try:
+                try:
+                    decisions = response_parsing(response)
+                except Exception as e:
+                    raise ValueError(f"Could not parse response: {e}")
+                if not isinstance(decisions, dict):
+                    raise ValueError(f"Response is not a dictionary of decisions: {decisions}")
+            except ValueError as e:
+                self.stats['invalid_responses'] += 1
+                logger.warning(f"Invalid squad decision (attempt {attempt + 1}): {e}")
+                continue
+            finally:
+                if self.profiler:
+                    self.profiler.record('llm/parse', time.perf_counter() - start)
+
+            agent2decision = {}
+            for agent in agents:
+                try:
+                    if agent.name not in decisions:
+                        raise ValueError("No decision in the squad response")
+                    agent2decision[agent] = agent.validate_decision(decisions[agent.name], aliases)
+                    self.stats['decisions'] += 1
+                    self.stats['squad_decisions'] += 1
+                except Exception as e:
+                    # The agent is queried on its own instead
+                    logger.warning(f"Invalid squad decision for {agent.name}: {e}")
+            return agent2decision
+
+        logger.warning(f"The squad exhausted {self.max_retries} decision attempts.")
+        return {}
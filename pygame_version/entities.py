@@ -1,20 +1,29 @@
 from bidict import bidict
 from pprint import pprint
-import random
 import json
 
 from ai_response_tools import *
 from chaos import *
 from utils import *
-
-from collections import deque
+from decision_dispatch import DecisionDispatcher, query_single
+from gameworld import AliasTable
+from noise import NoiseField
+from profiler import TurnProfiler
+from mission_log import MissionLog
+from prompt_log import PromptLog
+from snapshot import Snapshotter
+import randomness
+import tracing
+
+from collections import Counter, deque
+from contextlib import contextmanager
+import threading
 import uuid
 from uuid import UUID
 from typing import List
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(message)s")
+# Debug logging of the hot paths is guarded by tracing.debug (see tracing.py)
 logger = logging.getLogger(__name__)
 
 # Note: right now, when an agent moves into a room, entities they detect are auto added to the minimap,
@@ -55,16 +64,9 @@ global has_reached_th
 # - some agents want to do more, so if you tell them to stand down they might go in anyway
 # - Add Hostile subclasses: guard, technician, janitor, etc.
 
-def get_corresponding_value(val, threshold_map):
-    # Sort thresholds in ascending order
-    sorted_thresholds = sorted(threshold_map.keys())
-
-    # Find the largest threshold <= value1
-    for threshold in reversed(sorted_thresholds):
-        if val >= threshold:
-            return threshold_map[threshold]
-
-    raise ValueError(f"Value {val} is not within the threshold range.")
+def entity_ref(entity_id, aliases=None):
+    """Return the token that refers to an entity in prompts: its alias if an alias table is given, else its ID."""
+    return aliases.alias(entity_id) if aliases is not None else entity_id
 
 
 class ConnectivityException(Exception):
@@ -72,8 +74,14 @@ class ConnectivityException(Exception):
 
 
 class Entity:
-    def __init__(self, name, area, description, explored=0, world=None, spot_difficulty=0, investigate_difficulty=0):
-        self.id = uuid.uuid4()  # Assign a unique ID to each entity
+    # Attributes that change during a game, captured by snapshots (see snapshot.py)
+    STATE_FIELDS = ('area', '_explored', 'is_peeked', 'name')
+
+    def __init__(self, name, area, description, explored=0, world=None, spot_difficulty=0, investigate_difficulty=0,
+                 entity_id=None):
+        # Assign a unique ID to each entity. Entities created from a mission config get a stable ID derived
+        # from their config keys, so that prompts mentioning them are identical across runs.
+        self.id = entity_id if entity_id is not None else uuid.uuid4()
         self.name = name  # Name or identifier
         self.area = area  # Current area
         self.description = description
@@ -114,6 +122,7 @@ class Entity:
             # Update the exploration level in the world dictionary
             if self.world:
                 self.world.update_exploration(self.id, level)
+                self.world.notify('explored', self)
 
     def __str__(self):
         return f"{self.name}: {self.description}"
@@ -123,11 +132,13 @@ class Entity:
 
 
 class Character(Entity):
+    STATE_FIELDS = Entity.STATE_FIELDS + ('health', 'stress_level', 'is_hidden', 'skills')
+
     def __init__(self, name, area, health=1., resilience=.5, stealth=0., firearms=0., cover=0., hand_to_hand=0.,
                  hacking=0.,
                  observation=0.,
-                 acrobatics=0., inventory=None, description='', behavior='', explored=2, world=None):
-        super().__init__(name, area, description, explored=explored, world=world)
+                 acrobatics=0., inventory=None, description='', behavior='', explored=2, world=None, entity_id=None):
+        super().__init__(name, area, description, explored=explored, world=world, entity_id=entity_id)
 
         if inventory is None:
             inventory = []
@@ -169,32 +180,18 @@ class Character(Entity):
             capture
         """
 
-        logger.debug(f"=== ACTION CHECK: {action_type} ===")
-        logger.debug(f"Actor: {self.name}")
-
-        if isinstance(target, Connection):
-            target_name = "Connection with " + target.get_other_area(self.area).name
-        else:
-            target_name = target.name if target else 'None'
-
-        logger.debug(f"Target: {target_name}")
-        logger.debug(f"Initial modifier: {modifier}")
-
-        skill1 = ACTION_TO_SKILL.get(action_type, None)
-        logger.debug(f"Primary skill: {skill1} = {self.skills[skill1] if skill1 else 'None'}")
+        rules = self.world.rules
+        skill1 = rules.action_to_skill.get(action_type, None)
 
         # Special modifiers
         if action_type == 'peek':
             modifier += PEEK_MOD
-            logger.debug(f"Added peek modifier: {PEEK_MOD}")
         elif action_type == 'investigate':
             modifier += INV_MOD
-            logger.debug(f"Added investigate modifier: {INV_MOD}")
 
         # Calculate difficulty
         if action_type == 'wait':
             difficulty = 0.
-            logger.debug("Wait action - no difficulty check")
         elif action_type in ['look_around', 'peek', 'investigate']:
             if isinstance(target, Connection):
                 if action_type == 'look_around':
@@ -203,36 +200,28 @@ class Character(Entity):
                     difficulty = target.get_peek_difficulty(self.area)
                 else:
                     difficulty = target.get_investigate_difficulty(self.area)
-                logger.debug(f"Connection difficulty: {difficulty}")
             else:
                 difficulty = target.spot_difficulty
-                logger.debug(f"Spot difficulty: {difficulty}")
 
         elif isinstance(target, Character):
             assert action_type in ['hide', 'take_out', 'shoot']
-            skill2 = ACTION_TO_COUNTER_SKILL.get(action_type, None)
+            skill2 = rules.action_to_counter_skill.get(action_type, None)
             difficulty = target.skills[skill2]
-            logger.debug(f"Target counter skill: {skill2} = {difficulty}")
 
             if action_type == 'hide':
                 modifier += self.area.hiding_modifier
-                logger.debug(f"Added area hiding modifier: {self.area.hiding_modifier}")
             elif action_type == 'shoot':
                 # Cover modifier is inverse to shooting
                 # So if it is positive, it is harder to shoot, and vice versa
                 modifier -= self.area.cover_modifier
-                logger.debug(f"Added area cover modifier: {self.area.cover_modifier}")
 
         elif action_type == 'bypass':
             difficulty = 0
-            logger.debug("Bypass action - no difficulty")
 
         elif action_type == 'capture':
             assert isinstance(target, Objective)
             skill1 = target.required_skill
             difficulty = target.difficulty
-            logger.debug(f"Objective difficulty: {difficulty}")
-            logger.debug(f"Required skill: {skill1} = {self.skills[skill1]}")
 
         else:
             raise ValueError(f"Invalid target/action type. Target type: {type(target)}, Action type: {action_type}")
@@ -241,26 +230,34 @@ class Character(Entity):
         raw_prob = self.skills[skill1] - difficulty + modifier
         success_prob = max(0.0, min(1.0, raw_prob))
 
-        logger.debug(f"Probability calculation:")
-        logger.debug(f"  Skill ({self.skills[skill1]:.2f}) - Difficulty ({difficulty:.2f}) + Modifier ({modifier:.2f})")
-        logger.debug(f"  Raw probability: {raw_prob:.2f}")
-        logger.debug(f"  Clamped probability: {success_prob:.2f}")
-
-        roll = random.random()
+        roll = randomness.checks.random()
         success = roll < success_prob
-        logger.debug(f"Roll: {roll:.3f} vs Probability: {success_prob:.3f}")
-        logger.debug(f"Result: {'SUCCESS' if success else 'FAILURE'}")
-        logger.debug(f"=== ACTION CHECK END ===")
+
+        if tracing.debug or tracing.tracer is not None:
+            if isinstance(target, Connection):
+                target_name = "Connection with " + target.get_other_area(self.area).name
+            else:
+                target_name = target.name if target else 'None'
+
+            if tracing.debug:
+                logger.debug(f"Action check: {action_type} | Actor: {self.name} | Target: {target_name}\n"
+                             f"  Skill {skill1} ({self.skills[skill1]:.2f}) - Difficulty ({difficulty:.2f}) + "
+                             f"Modifier ({modifier:.2f}) = {raw_prob:.2f}, clamped to {success_prob:.2f}\n"
+                             f"  Roll: {roll:.3f} -> {'SUCCESS' if success else 'FAILURE'}")
+            if tracing.tracer is not None:
+                tracing.tracer.action_check(action_type, self.name, target_name, skill1, difficulty, modifier,
+                                            success_prob, roll, success)
 
         return success
 
 
 class Agent(Character):
 
-    def status_description(self):
+    def status_description(self, aliases=None):
         """
         Generate a prompt for an AI model to summarize the agent's status and observations.
         Observations are based on entities in the same area.
+        If an alias table is given, entities are referred to by their aliases instead of their UUIDs.
         """
         objects_description = "\n".join(
             [f"{entity.name}: {entity.description}" for entity in self.area.entities]
@@ -274,7 +271,7 @@ class Agent(Character):
             f"Your health is {self.health / self.max_health:.2f}/1, and your observation skill is {self.skills['observation']:.2f}/1.\n\n"
             f"You are currently in the following area: {self.area.name} : {self.area.description}.\n"
             f"It contains the following objects: {objects_description}.\n"
-            f"It is connected to the following areas: {', '.join([f'{area.name} (ID: {area.id})' for area in self.area.get_connected_areas()])}\n"
+            f"It is connected to the following areas: {', '.join([f'{area.name} (ID: {entity_ref(area.id, aliases)})' for area in self.area.get_connected_areas()])}\n"
 
         ).format(
             health=self.health,
@@ -333,27 +330,83 @@ class Agent(Character):
 
         return action_args
 
-    def make_decision_prompt(self):
+    def parse_decision(self, response, aliases=None):
+        """
+        Parse a raw decision response and validate it against the actions currently available to the agent.
+
+        Args:
+            response (str): The raw response, expected to hold a dictionary with 'action', 'arguments'
+                and 'reasoning' fields.
+            aliases (AliasTable): If given, arguments are resolved as aliases (full UUIDs are still accepted).
+
+        Returns:
+            dict: The validated decision, with its arguments converted to UUIDs.
+
+        Raises:
+            ValueError: If the response can't be parsed, or names an action or argument that is not available.
+        """
+        try:
+            decision = response_parsing(response)
+        except Exception as e:
+            raise ValueError(f"Could not parse response: {e}")
+
+        return self.validate_decision(decision, aliases)
+
+    def validate_decision(self, decision, aliases=None):
+        """
+        Validate a parsed decision against the actions currently available to the agent.
+
+        Args:
+            decision (dict): The decision, with 'action', 'arguments' and 'reasoning' fields.
+            aliases (AliasTable): If given, arguments are resolved as aliases (full UUIDs are still accepted).
+
+        Returns:
+            dict: The validated decision, with its arguments converted to UUIDs.
+
+        Raises:
+            ValueError: If the decision names an action or argument that is not available.
+        """
+        if not isinstance(decision, dict) or 'action' not in decision:
+            raise ValueError(f"Response is not a decision dictionary: {decision}")
+
+        action_argument_dict = self.generate_action_arguments()
+        action = decision['action']
+        if not isinstance(action, str) or action not in action_argument_dict:
+            raise ValueError(f"Invalid action: {action}. Valid actions: {list(action_argument_dict.keys())}")
+
+        arguments = decision.get('arguments') or []
+        if not isinstance(arguments, list):
+            raise ValueError(f"Arguments are not a list: {arguments}")
+        if aliases is not None:
+            args = [aliases.resolve(arg) for arg in arguments]
+        else:
+            args = [safe_uuid_conversion(str(arg)) for arg in arguments]
+        if None in args:
+            raise ValueError(f"Invalid ID in arguments: {arguments}")
+
+        valid_args = [aarg['id'] for aarg in action_argument_dict[action]]
+        if not all(arg in valid_args for arg in args):
+            raise ValueError(f"Invalid arguments: {args}. Valid arguments: {valid_args}")
+        if valid_args and len(args) != 1:
+            raise ValueError(f"Action {action} requires exactly one of these arguments: {valid_args}")
+
+        return {
+            'action': action,
+            'arguments': args,
+            'reasoning': decision.get('reasoning', '')
+        }
+
+    def make_decision_prompt(self, aliases=None):
         """
         Generates a detailed prompt for an AI model to decide on the next move for the agent, given the current situation.
         The prompt includes an overview of the agent's current environment, capabilities, and a list of available actions.
+        If an alias table is given, arguments are listed by their short aliases instead of their UUIDs.
         """
-        status_desc = self.status_description()
-        action_arguments = self.generate_action_arguments()
+        status_desc = self.status_description(aliases)
 
         available_actions_desc = (
             "Here are the actions you can take, along with their descriptions and required argument:\n"
-        )
-
-        # Describe each action with its EXACT required arguments
-        # Modify this part in make_decision_prompt():
-        for action, arguments in action_arguments.items():
-            if arguments:
-                # Show both ID and name but make it very clear which is the ID to use
-                argument_details = ", ".join([f"ID {arg['id']} (of entity: {arg['name']})" for arg in arguments])
-                available_actions_desc += f"- {action}: Must use one of these exact IDs - {argument_details}\n"
-            else:
-                available_actions_desc += f"- {action}: No argument required\n"
+        ) + self.describe_actions(aliases)
 
         instruction = (
             "Decide on your next move based on the current status, Mission Control's commands, and available actions.\n"
@@ -385,6 +438,39 @@ class Agent(Character):
 
         return prompt
 
+    def describe_actions(self, aliases=None):
+        """List the available actions, one per line, with the exact IDs of their possible arguments."""
+        actions_desc = ""
+        for action, arguments in self.generate_action_arguments().items():
+            if arguments:
+                # Show both ID and name but make it very clear which is the ID to use
+                argument_details = ", ".join(
+                    [f"ID {entity_ref(arg['id'], aliases)} (of entity: {arg['name']})" for arg in arguments])
+                actions_desc += f"- {action}: Must use one of these exact IDs - {argument_details}\n"
+            else:
+                actions_desc += f"- {action}: No argument required\n"
+        return actions_desc
+
+    def make_squad_section(self, aliases=None):
+        """
+        Describe the agent's own situation and options, for a squad decision prompt (see
+        GameController.make_squad_prompt). The mission intel is left out, as it is shared by the squad.
+        """
+        objects = ", ".join(entity.name for entity in self.area.entities if entity is not self)
+        connected = ", ".join(f"{area.name} (ID: {entity_ref(area.id, aliases)})"
+                              for area in self.area.get_connected_areas())
+        return (
+            f"AGENT {self.name}:\n"
+            f"{self.behavior}\n"
+            f"Health: {self.health / self.max_health:.2f}/1, observation skill: {self.skills['observation']:.2f}/1"
+            f"{', hidden' if self.is_hidden else ''}.\n"
+            f"Area: {self.area.name} : {self.area.description}.\n"
+            f"Objects here: {objects or 'none'}.\n"
+            f"Connected areas: {connected}\n"
+            "Actions:\n"
+            f"{self.describe_actions(aliases)}"
+        )
+
     def make_manual_decision_prompt(self):
         """
         Generates a detailed prompt for an AI model to decide on the next move for the agent, given the current situation.
@@ -485,17 +571,20 @@ class Agent(Character):
 class Hostile(Character):
     """Hostile inherits the same capabilities as Agent."""
 
+    STATE_FIELDS = Character.STATE_FIELDS + ('alarm_level', 'alarm_increased_this_turn', 'current_patrol_index',
+                                             'is_patrolling')
+
     def __init__(self, name, patrol_route,
                  health=0.6, observation=0, max_observation=.4,
                  hand_to_hand=0, max_hand_to_hand=.4,
                  firearms=0, cover=0,
                  resilience=.5, stealth=0, hacking=0, acrobatics=0, inventory=None, description='', explored=0,
-                 world=None):
+                 world=None, entity_id=None):
         area = patrol_route[0]
 
         super().__init__(name, area, health, resilience, stealth, firearms, cover, hand_to_hand, hacking, observation,
                          acrobatics,
-                         inventory, description, explored, world=world)
+                         inventory, description, explored, world=world, entity_id=entity_id)
 
         self.alarm_level = 0.0
         self.init_observation = observation
@@ -513,8 +602,9 @@ class Hostile(Character):
 
     def update_alarm_level(self, delta):
 
-        logger.debug(f"Updating alarm level for {self.name}: {self.alarm_level} + {delta}")
-        logger.debug(f"Pre-update skills: {self.skills}")
+        if tracing.debug:
+            logger.debug(f"Updating alarm level for {self.name}: {self.alarm_level} + {delta}")
+            logger.debug(f"Pre-update skills: {self.skills}")
 
         if self.alarm_level == 1:
             return  # Don't update alarm level in fight mode
@@ -523,13 +613,14 @@ class Hostile(Character):
             self.alarm_increased_this_turn = True
 
         # clamp between 0 and 1
-        self.alarm_level = min(max(0, self.alarm_level + delta), 1)
+        self.alarm_level = min(max(0., self.alarm_level + delta), 1.)
 
-        logger.debug(f"New alarm level: {self.alarm_level}")
-        logger.debug(f"Post-update skills: {self.skills}")
+        if tracing.debug:
+            logger.debug(f"New alarm level: {self.alarm_level}")
+            logger.debug(f"Post-update skills: {self.skills}")
 
     def update_skills(self):
-        obs_inc = get_corresponding_value(self.alarm_level, OBS_THRESHS)
+        obs_inc = self.world.rules.get_observation_bonus(self.alarm_level)
         self.skills['observation'] = self.init_observation + obs_inc
         self.skills['hand_to_hand'] = self.init_hand_to_hand + obs_inc
 
@@ -545,9 +636,11 @@ class Hostile(Character):
 
 # Objective base class
 class Objective(Entity):
+    STATE_FIELDS = Entity.STATE_FIELDS + ('is_captured',)
+
     def __init__(self, name, area, description, difficulty, required_skill, explored=1,
-                 world=None):
-        super().__init__(name, area, description, explored=explored, world=world)
+                 world=None, entity_id=None):
+        super().__init__(name, area, description, explored=explored, world=world, entity_id=entity_id)
         self.difficulty = max(0, min(difficulty, 1))
         self.is_captured = False
         self.required_skill = required_skill
@@ -555,6 +648,8 @@ class Objective(Entity):
     def capture(self):
         self.is_captured = True
         self.name = f"{self.name} (Captured)"
+        if self.world:
+            self.world.notify('captured', self)
 
 
 class SimpleObjective(Objective):
@@ -563,6 +658,8 @@ class SimpleObjective(Objective):
 
     def capture(self):
         self.is_captured = True
+        if self.world:
+            self.world.notify('captured', self)
         return True
 
 
@@ -644,16 +741,17 @@ class Connection:
                  is_locked2=False,
                  noise_factor=.5, conn_type='door'):
 
-        logger.debug(f"=== CREATING CONNECTION between {area1.name} and {area2.name} ===")
-        logger.debug(f"Type: {conn_type}")
-        logger.debug(f"Description 1->2: {description1}")
-        logger.debug(f"Description 2->1: {description2}")
-        logger.debug(f"Sight only: {sight_only}")
-        logger.debug(f"Spot difficulties: 1->2={spot_difficulty1}, 2->1={spot_difficulty2}")
-        logger.debug(f"Investigation difficulties: 1->2={investigate_difficulty1}, 2->1={investigate_difficulty2}")
-        logger.debug(f"Access difficulties: 1->2={access_difficulty1}, 2->1={access_difficulty2}")
-        logger.debug(f"Locks: 1->2={is_locked1}, 2->1={is_locked2}")
-        logger.debug(f"Noise factor: {noise_factor}")
+        if tracing.debug:
+            logger.debug(f"=== CREATING CONNECTION between {area1.name} and {area2.name} ===")
+            logger.debug(f"Type: {conn_type}")
+            logger.debug(f"Description 1->2: {description1}")
+            logger.debug(f"Description 2->1: {description2}")
+            logger.debug(f"Sight only: {sight_only}")
+            logger.debug(f"Spot difficulties: 1->2={spot_difficulty1}, 2->1={spot_difficulty2}")
+            logger.debug(f"Investigation difficulties: 1->2={investigate_difficulty1}, 2->1={investigate_difficulty2}")
+            logger.debug(f"Access difficulties: 1->2={access_difficulty1}, 2->1={access_difficulty2}")
+            logger.debug(f"Locks: 1->2={is_locked1}, 2->1={is_locked2}")
+            logger.debug(f"Noise factor: {noise_factor}")
 
         self.area1 = area1
         self.area2 = area2
@@ -736,21 +834,25 @@ class Connection:
 
 
 class Area(Entity):
+    STATE_FIELDS = Entity.STATE_FIELDS + ('noise_level', 'noise_duration', 'chase_pointer')
+
     def __init__(self, name, description, x, y, width, height, color, image=None,
                  hiding_modifier=0, cover_modifier=0,
-                 noise_baseline=0, explored=0, world=None, is_extraction_point=False):
+                 noise_baseline=0, explored=0, world=None, is_extraction_point=False, entity_id=None):
 
-        logger.debug(f"=== CREATING AREA: {name} ===")
-        logger.debug(f"Description: {description}")
-        logger.debug(f"Position: x={x}, y={y}, width={width}, height={height}")
-        logger.debug(f"Modifiers: hiding={hiding_modifier}, cover={cover_modifier}")
-        logger.debug(f"Noise baseline: {noise_baseline}")
-        logger.debug(f"Initial exploration: {explored}")
-        logger.debug(f"Is extraction point: {is_extraction_point}")
+        if tracing.debug:
+            logger.debug(f"=== CREATING AREA: {name} ===")
+            logger.debug(f"Description: {description}")
+            logger.debug(f"Position: x={x}, y={y}, width={width}, height={height}")
+            logger.debug(f"Modifiers: hiding={hiding_modifier}, cover={cover_modifier}")
+            logger.debug(f"Noise baseline: {noise_baseline}")
+            logger.debug(f"Initial exploration: {explored}")
+            logger.debug(f"Is extraction point: {is_extraction_point}")
 
         # Update description to include hiding bonus and cover bonus
 
-        super().__init__(name, area=None, description=description, explored=explored, world=world)
+        super().__init__(name, area=None, description=description, explored=explored, world=world,
+                         entity_id=entity_id)
         self.hiding_modifier = hiding_modifier
         self.cover_modifier = cover_modifier
         self.noise_baseline = noise_baseline
@@ -794,10 +896,11 @@ class Area(Entity):
                      noise_factor=.75):
         """Connect this area to another area with specific connection attributes."""
 
-        logger.debug(f"=== CONNECTING AREAS with open connection ===")
-        logger.debug(f"From: {self.name} To: {other_area.name}")
-        logger.debug(f"Noise factor: {noise_factor}")
-        logger.debug(f"Spot difficulties: {spot_difficulty1}, {spot_difficulty2}")
+        if tracing.debug:
+            logger.debug(f"=== CONNECTING AREAS with open connection ===")
+            logger.debug(f"From: {self.name} To: {other_area.name}")
+            logger.debug(f"Noise factor: {noise_factor}")
+            logger.debug(f"Spot difficulties: {spot_difficulty1}, {spot_difficulty2}")
 
         # Check if a connection already exists to prevent duplicate connections
         if not any(conn.area1 == other_area or conn.area2 == other_area for conn in self.connections):
@@ -817,10 +920,11 @@ class Area(Entity):
                      noise_factor=.5):
         """Connect this area to another area with specific connection attributes."""
 
-        logger.debug(f"=== CONNECTING AREAS with door ===")
-        logger.debug(f"From: {self.name} To: {other_area.name}")
-        logger.debug(f"Noise factor: {noise_factor}")
-        logger.debug(f"Spot difficulties: {spot_difficulty1}, {spot_difficulty2}")
+        if tracing.debug:
+            logger.debug(f"=== CONNECTING AREAS with door ===")
+            logger.debug(f"From: {self.name} To: {other_area.name}")
+            logger.debug(f"Noise factor: {noise_factor}")
+            logger.debug(f"Spot difficulties: {spot_difficulty1}, {spot_difficulty2}")
 
         # Check if a connection already exists to prevent duplicate connections
         if not any(conn.area1 == other_area or conn.area2 == other_area for conn in self.connections):
@@ -839,10 +943,11 @@ class Area(Entity):
                        is_locked2=False,
                        noise_factor=.5):
 
-        logger.debug(f"=== CONNECTING AREAS with window ===")
-        logger.debug(f"From: {self.name} To: {other_area.name}")
-        logger.debug(f"Noise factor: {noise_factor}")
-        logger.debug(f"Spot difficulties: {spot_difficulty1}, {spot_difficulty2}")
+        if tracing.debug:
+            logger.debug(f"=== CONNECTING AREAS with window ===")
+            logger.debug(f"From: {self.name} To: {other_area.name}")
+            logger.debug(f"Noise factor: {noise_factor}")
+            logger.debug(f"Spot difficulties: {spot_difficulty1}, {spot_difficulty2}")
 
         """Connect this area to another area with specific connection attributes."""
         # Check if a connection already exists to prevent duplicate connections
@@ -910,56 +1015,433 @@ class Area(Entity):
         return f"{self.name}:\n{self.description}\nEntities: {', '.join(str(entity) for entity in self.entities)}\nConnected areas: {connected_areas_str}"
 
 
-class MissionLog(List):
+class KnowledgeBase:
+    """
+    Incrementally maintained description of the explored world, as used in decision prompts.
+
+    Each area and entity has its own rendered block. Exploration, movement, capture and removal events mark the
+    affected blocks dirty, and only those are re-rendered, so the cost of a turn's knowledge base scales with the
+    number of changes rather than with the size of the map.
+    """
+
+    # Section titles and their headers, in prompt order
+    SECTIONS = (
+        ('Areas', 'Areas:'),
+        ('Agents', '\nAgents:'),
+        ('Hostiles', '\nHostiles:'),
+        ('Objectives', '\nObjectives:'),
+    )
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.print_queue = deque()
-        self.last_command = None
+    def __init__(self, world, aliases, mission_log, log_length=100):
+        self.world = world
+        self.aliases = aliases
+        self.mission_log = mission_log
+        self.log_length = log_length
+
+        self.ordinals = {}  # entity ID -> registration order, to keep sections in registry order
+        self.sections = {title: {} for title, _ in self.SECTIONS}  # title -> {entity ID: rendered block}
+        self.dirty = set()
+        self.rendered_world = None
+        self.rendered_log = None
+        self.log_key = None
+
+        for entity in world.entity_registry.values():
+            self.on_added(entity)
+        world.add_observer(self)
+
+    def get_section(self, entity):
+        if isinstance(entity, Area):
+            return 'Areas'
+        elif isinstance(entity, Agent):
+            return 'Agents'
+        elif isinstance(entity, Hostile):
+            return 'Hostiles'
+        elif isinstance(entity, Objective):
+            return 'Objectives'
+        raise NotImplementedError(f"Unsupported entity type: {type(entity).__name__}")
+
+    # World events
+
+    def on_added(self, entity):
+        self.ordinals[entity.id] = len(self.ordinals)
+        self.dirty.add(entity)
+
+    def on_removed(self, entity):
+        self.sections[self.get_section(entity)].pop(entity.id, None)
+        self.dirty.discard(entity)
+        self.rendered_world = None
+
+    def on_explored(self, entity):
+        self.dirty.add(entity)
+        if isinstance(entity, Area):
+            # Neighbours list explored areas among their connections,
+            # and entities in the area only show their location once it is explored
+            self.dirty.update(entity.get_connected_areas())
+            self.dirty.update(entity.entities)
+
+    def on_moved(self, entity):
+        self.dirty.add(entity)
+
+    def on_captured(self, entity):
+        self.dirty.add(entity)
+
+    def invalidate(self):
+        """Mark every block dirty, e.g. after the world state was restored wholesale."""
+        self.dirty.update(self.world.entity_registry.values())
+        self.rendered_world = None
+        self.log_key = None
+
+    # Rendering
+
+    def render_block(self, entity):
+        """Render the description of a single area or entity, or return None if it is not known to the agents."""
+        if entity.get_explored() <= 0:
+            return None
+
+        if isinstance(entity, Area):
+            description_str = f"  - ID: {self.aliases.alias(entity.id)}\n    Name: {entity.name}\n    Description: {entity.description}"
+            connections = [connection.get_other_area(entity).name for connection in entity.connections
+                           if connection.get_other_area(entity).get_explored()]
+            if connections:
+                description_str += f"\n    Connections: {', '.join(connections)}"
+            return description_str
+
+        description_str = f"  - ID: {self.aliases.alias(entity.id)}\n    Name: {entity.name}\n    Description: {entity.description}"
+        if entity.area and entity.area.get_explored() and entity.get_explored() > 1:
+            description_str += f"\n    Location: {entity.area.name} (ID: {self.aliases.alias(entity.area.id)})"
+        return description_str
+
+    def update(self):
+        """Re-render dirty blocks."""
+        for entity in self.dirty:
+            if entity.id not in self.world.entity_registry:
+                continue
+            section = self.sections[self.get_section(entity)]
+            block = self.render_block(entity)
+            if block is None:
+                section.pop(entity.id, None)
+            else:
+                section[entity.id] = block
+
+        if self.dirty:
+            self.rendered_world = None
+            self.dirty.clear()
+
+    def render_world(self):
+        """Render the explored-world section."""
+        self.update()
+
+        if self.rendered_world is None:
+            descriptions = []
+            for title, header in self.SECTIONS:
+                blocks = self.sections[title]
+                if blocks:
+                    descriptions.append(header)
+                    descriptions.extend(blocks[entity_id] for entity_id in sorted(blocks, key=self.ordinals.get))
+            self.rendered_world = '\n'.join(descriptions)
+
+        return self.rendered_world
+
+    def render_log(self):
+        """Render the mission log section, including the latest Mission Control command."""
+        log_key = (len(self.mission_log), self.mission_log.last_command)
+        if log_key != self.log_key:
+            self.log_key = log_key
+            self.rendered_log = '\n\n-----------------\n\nMission Log:\n' + '\n'.join(
+                self.mission_log.tail(self.log_length)) + '\n\n-----------------'
+
+            if self.mission_log.last_command is not None:
+                self.rendered_log += f"Keep especially this instruction in mind when making your decision:\n\n Control: {self.mission_log.last_command}\n\n-----------------"
+
+        return self.rendered_log
+
+    def render(self):
+        """Render the full knowledge base."""
+        return self.render_world() + self.render_log()
+
+    def render_scoped(self, game_map, origins, hops=KB_SCOPE_HOPS, token_budget=KB_TOKEN_BUDGET,
+                      viewpoint='your current position'):
+        """
+        Render the knowledge base scoped to the surroundings of some areas, e.g. where an agent is, so that its size
+        stays bounded however large the explored map grows.
+
+        Areas within `hops` connections of the origins, and the entities known to be in them, are described in full.
+        The rest of the explored world is summarized: the other areas by name and distance, and the other
+        objectives, hostiles, agents and extraction points by location and distance. If the explored-world part is
+        over the token budget, the summary is cut to a shrinking radius, then the neighbourhood is narrowed. The
+        objectives and extraction points are always listed. The mission log is bounded by its own length.
+
+        Args:
+            game_map (GameMap): The map, for neighbourhoods and distances.
+            origins (list): The areas the scope is centred on.
+            hops (int): Connections away from the origins within which the world is described in full.
+            token_budget (int): Tokens the explored-world part is trimmed to fit.
+            viewpoint (str): What the summarized distances are from, as told in the prompt.
+        """
+        self.update()
+
+        distances = {}  # Area -> steps from the nearest origin, within hops
+        for origin in origins:
+            for area, distance in game_map.get_neighbourhood(origin, hops).items():
+                distances[area] = min(distance, distances.get(area, distance))
+
+        def steps(area):
+            known = [game_map.get_distance(origin, area) for origin in origins]
+            known = [distance for distance in known if distance is not None]
+            return min(known) if known else None
+
+        # Known areas, and entities at their known location only (None if unknown), with their distances
+        areas = sorted(((area, steps(area)) for area in game_map.areas if area.id in self.sections['Areas']),
+                       key=lambda item: (item[1] is None, item[1] or 0, self.ordinals[item[0].id]))
+        located = []
+        for entity_id in sorted(self.ordinals, key=self.ordinals.get):
+            entity = self.world.entity_registry.get(entity_id)
+            if entity is None or isinstance(entity, Area) or entity_id not in self.sections[self.get_section(entity)]:
+                continue
+            area = entity.area if entity.area and entity.area.get_explored() and entity.get_explored() > 1 else None
+            located.append((entity, area, steps(area) if area is not None else None))
+
+        # Over budget, the summary is first cut down to the ring around the neighbourhood, then the neighbourhood is
+        # narrowed along with its ring, and last the summary is left with the objectives and extraction points
+        radii = sorted({distance for _, distance in areas if distance is not None and distance > hops + 1},
+                       reverse=True)
+        trims = [(hops, None)] + [(hops, radius) for radius in radii] + \
+                [(scope, scope + 1) for scope in range(hops, -1, -1)] + [(0, -1)]
+        for scope, radius in trims:
+            near = {area for area, distance in distances.items() if distance <= scope}
+            rendered = self.compose_scoped(near, areas, located, viewpoint, radius)
+            if estimate_tokens(rendered) <= token_budget:
+                break
 
-    def append(self, item, print_it=True, push_to_queue=True, is_command=False):
+        return rendered + self.render_log()
 
-        item = item.replace(' (Captured)', '')
+    def compose_scoped(self, near, areas, located, viewpoint, radius=None):
+        """
+        Assemble a scoped explored-world description (see render_scoped): the blocks of the areas in `near` and of
+        the entities located in them, and a summary of the rest, within `radius` steps if given.
+        """
+        alias = self.aliases.alias
 
-        if print_it:
-            print(item)
-        if push_to_queue:
-            self.print_queue.append(item)
-        if is_command:
-            self.last_command = item
+        def where(area, distance):
+            if area is None:
+                return "location unknown"
+            if distance is None:
+                return f"{area.name} (ID: {alias(area.id)}), no known route"
+            return f"{area.name} (ID: {alias(area.id)}), {distance} step{'s' if distance != 1 else ''} away"
 
-        super().append(item)
+        def in_radius(distance):
+            return radius is None or (distance is not None and distance <= radius)
 
+        descriptions = []
+        for title, header in self.SECTIONS:
+            blocks = self.sections[title]
+            if title == 'Areas':
+                ids = [area.id for area, _ in areas if area in near]
+            else:
+                ids = [entity.id for entity, area, _ in located if area in near and self.get_section(entity) == title]
+            if ids:
+                descriptions.append(header)
+                descriptions.extend(blocks[entity_id] for entity_id in ids)
+
+        summary = []
+        remote_areas = [(area, distance) for area, distance in areas if area not in near]
+        listed_areas = [where(area, distance) for area, distance in remote_areas if in_radius(distance)]
+        if listed_areas:
+            summary.append("  Areas: " + "; ".join(listed_areas))
+        extraction_points = [where(area, distance) for area, distance in remote_areas if area.is_extraction_point]
+        if extraction_points:
+            summary.append("  Extraction points: " + "; ".join(extraction_points))
+        for title, _ in self.SECTIONS[1:]:
+            lines = [f"  - {entity.name} (ID: {alias(entity.id)}): {where(area, distance)}"
+                     for entity, area, distance in located
+                     if area not in near and self.get_section(entity) == title and
+                     (title == 'Objectives' or in_radius(distance))]
+            if lines:
+                summary.append(f"  {title}:")
+                summary.extend(lines)
+        if summary:
+            descriptions.append(f"\nElsewhere (summary, distances from {viewpoint}):")
+            descriptions.extend(summary)
+
+        return '\n'.join(descriptions)
+
+
+class DecisionShortcuts:
+    """
+    Decides locally, in auto mode, for the agents whose decision does not need the LLM:
+
+    - forced moves: an agent with a single available action (e.g. only waiting) takes it;
+    - unchanged situations: an agent whose situation fingerprint (see fingerprint) is the same as when the LLM last
+      decided for it repeats that decision, up to `reuse_limit` turns in a row, after which the LLM is asked again.
+
+    Counts the LLM calls avoided, in total (`stats`) and in the latest turn (`last_turn`).
+    """
+
+    def __init__(self, reuse_limit=DECISION_REUSE_LIMIT):
+        """
+        Args:
+            reuse_limit (int): Turns in a row a decision can be repeated without the LLM (0 to never repeat).
+        """
+        self.reuse_limit = reuse_limit
+        self.previous = {}  # Agent -> (fingerprint, decision, turns repeated) of its latest LLM decision
+        self.fingerprints = {}  # Agent -> fingerprint, for the agents the LLM is asked about this turn
+        self.stats = Counter()  # forced, reused and queried decisions
+        self.last_turn = Counter()
+
+    def fingerprint(self, gc, agent, options):
+        """
+        Summarize what an agent's decision depends on: its position, cover and health, the actions available to
+        it, the hostiles in and around its area, the progress on the objectives, and the Mission Control messages.
+        """
+        nearby = [agent.area] + agent.area.get_connected_areas()
+        hostiles = tuple(entity for area in nearby for entity in area.entities if isinstance(entity, Hostile))
+        captured = sum(objective.is_captured for objective in gc.get_entities(Objective))
+        return agent.area, agent.is_hidden, agent.health, tuple(options), hostiles, captured, gc.control_messages
+
+    def resolve(self, gc, agents):
+        """
+        Decide for the agents that can be decided for locally.
+
+        Returns:
+            dict: Maps those agents to their decisions. The others are left to the LLM, and their decisions are to
+            be passed to remember().
+        """
+        self.last_turn = Counter()
+        self.fingerprints = {}
+        agent2decision = {}
+
+        for agent in agents:
+            options = [(action, argument['id'] if argument is not None else None)
+                       for action, arguments in agent.generate_action_arguments().items()
+                       for argument in (arguments or [None])]
+            if len(options) == 1:
+                (action, argument), = options
+                agent2decision[agent] = {'action': action, 'arguments': [argument] if argument is not None else [],
+                                         'reasoning': 'The only available action'}
+                self.last_turn['forced'] += 1
+                continue
+
+            fingerprint = self.fingerprint(gc, agent, options)
+            previous = self.previous.get(agent)
+            if previous is not None and previous[0] == fingerprint and previous[2] < self.reuse_limit:
+                _, decision, repeated = previous
+                self.previous[agent] = (fingerprint, decision, repeated + 1)
+                agent2decision[agent] = dict(decision, reasoning=f"Situation unchanged. {decision.get('reasoning', '')}")
+                self.last_turn['reused'] += 1
+                continue
+
+            self.fingerprints[agent] = fingerprint
+            self.last_turn['queried'] += 1
+
+        self.stats.update(self.last_turn)
+        return agent2decision
+
+    def remember(self, agent2decision):
+        """Record the LLM's decisions of this turn, to repeat while their agents' situations are unchanged."""
+        for agent, decision in agent2decision.items():
+            if agent in self.fingerprints:
+                self.previous[agent] = (self.fingerprints[agent], decision, 0)
+
+    @property
+    def avoided_last_turn(self):
+        return self.last_turn['forced'] + self.last_turn['reused']
 
 
 class GameController:
-    def __init__(self, world, game_map, mode='auto', agents_hidden=False, hostiles_visible=False):
+    def __init__(self, world, game_map, mode='auto', agents_hidden=False, hostiles_visible=False, policy=None,
+                 prompt_log_path='logs_internal/decision_prompts', mission_log_path='logs_internal/mission_log.bin',
+                 undo_history=UNDO_HISTORY, fallback_policy=None, decision_query=query_single,
+                 decision_reuse_limit=DECISION_REUSE_LIMIT, squad_mode=False,
+                 kb_scope_hops=None, kb_token_budget=KB_TOKEN_BUDGET):
+        """
+        Args:
+            world: The World holding all entities
+            game_map: The GameMap of the mission's areas
+            mode: Decision making mode (auto, semi-auto, manual, test or policy)
+            agents_hidden: Set agents to always be hidden
+            hostiles_visible: Set hostiles to always be visible
+            policy: Decision policy used in policy mode (see policies.py)
+            prompt_log_path: Directory decision prompts are logged to (see prompt_log.py), or None to disable
+                prompt logging
+            mission_log_path: File older mission log entries are spilled to, or None to drop them
+            undo_history: Number of latest turns that can be undone (see undo)
+            fallback_policy: Policy deciding for the agents the LLM gave no valid decision for in auto mode (e.g.
+                when it is slow or unavailable), instead of having them wait
+            decision_query: Function sending a decision prompt to the LLM and returning its raw response in auto
+                mode, e.g. a cassette recorder or player (see cassette.py)
+            decision_reuse_limit: Turns in a row an agent repeats its decision without the LLM while its situation
+                is unchanged, in auto mode (see DecisionShortcuts)
+            squad_mode: Decide for all agents with a single LLM prompt in auto mode, holding the mission intel once
+                (see make_squad_prompt), instead of one prompt per agent
+            kb_scope_hops: Connections away from an agent within which its knowledge base describes the world in
+                full, the rest being summarized (see KnowledgeBase.render_scoped), or None for the full knowledge base
+            kb_token_budget: Tokens the scoped explored-world description is trimmed to fit
+        """
 
         mode_map = {
             'a': 'auto',
             'sa': 'semi-auto',
             'm': 'manual',
-            't': 'test'
+            't': 'test',
+            'p': 'policy'
         }
         mode = mode_map.get(mode, mode)
 
-        assert mode in ['auto', 'semi-auto', 'manual', 'test']
+        assert mode in ['auto', 'semi-auto', 'manual', 'test', 'policy']
+        assert mode != 'policy' or policy is not None, "Policy mode requires a policy."
 
         self.world = world
         self.game_map = game_map
         self.mode = mode
         self.agents_hidden = agents_hidden
         self.hostiles_visible = hostiles_visible
+        self.policy = policy
+        self.fallback_policy = fallback_policy
+        self.squad_mode = squad_mode
+        self.kb_scope_hops = kb_scope_hops
+        self.kb_token_budget = kb_token_budget
 
         self.turn_count = 0
-        self.mission_log = MissionLog()
-        open('logs_internal/decision_prompts.txt', 'w').close()
+        self.mission_log = MissionLog(spill_path=mission_log_path)
+        self.prompt_log = PromptLog(prompt_log_path) if prompt_log_path else None
+
+        # Agents that left the field through an extraction point
+        self.exfiltrated = []
 
         self.turn_counter = 0
 
+        # Held while the game state changes, so that other threads (e.g. the GUI's) can read it consistently
+        self.state_lock = threading.RLock()
+        self.state_version = 0  # Incremented every time the state changed under the lock, e.g. to redraw views
+
+        # Timings of the phases of every turn (and of the GUI frame loop)
+        self.profiler = TurnProfiler()
+
+        self.dispatcher = DecisionDispatcher(query=decision_query, profiler=self.profiler)
+
+        # Decisions taken without the LLM when they are forced, or when an agent's situation is unchanged
+        self.shortcuts = DecisionShortcuts(reuse_limit=decision_reuse_limit)
+
+        # Number of Mission Control messages so far, a new one calls for new decisions
+        self.control_messages = 0
+
+        # Short tokens used in place of UUIDs in decision prompts, refreshed every turn
+        self.aliases = AliasTable()
+
+        # Shared description of the explored world, updated from world events
+        self.knowledge = KnowledgeBase(self.world, self.aliases, self.mission_log)
+
+        # Noise propagation between areas, applied to hostile alarm levels in batches
+        self.noise = NoiseField(self.game_map.areas, hops=NOISE_HOPS, hop_decay=NOISE_HOP_DECAY,
+                                duration=NOISE_DURATION, linger_decay=NOISE_LINGER_DECAY)
+
+        # Snapshots of the game state, and those taken at the start of the latest turns, to undo them
+        self.snapshotter = Snapshotter(self)
+        self.history = deque(maxlen=undo_history)
+
         # Populate Areas with Entities
         for entity in self.get_entities(Character) + self.get_entities(Objective):
-            entity.area.entities.append(entity)
+            self.world.place_entity(entity, entity.area)
 
         for agent in self.get_entities(Agent):
             for connection in agent.area.connections:
@@ -974,6 +1456,53 @@ class GameController:
                 else:
                     entity.set_explored(1)
 
+    def snapshot(self):
+        """Return a snapshot of the game state (see snapshot.py), to restore it later."""
+        with self.state_lock:
+            return self.snapshotter.take()
+
+    def restore(self, snapshot):
+        """Put the game back in the state of a snapshot. A snapshot can be restored any number of times."""
+        with self.state_lock:
+            self.snapshotter.restore(snapshot)
+            self.state_version += 1
+
+    @contextmanager
+    def what_if(self):
+        """
+        Play out a hypothetical in the body of the context, e.g. a turn with some decisions, and put the game back
+        in its prior state on exit.
+        """
+        snapshot = self.snapshot()
+        try:
+            yield
+        finally:
+            self.restore(snapshot)
+
+    def undo(self):
+        """
+        Undo the latest turn. Messages already printed or shown in the GUI's chat stay.
+
+        Returns:
+            bool: Whether there was a turn to undo.
+        """
+        if not self.history:
+            return False
+        self.restore(self.history.pop())
+        return True
+
+    def add_control_message(self, message, print_it=True, push_to_queue=True):
+        """Log a message from Mission Control to the agents, taken into account in their next decisions."""
+        with self.state_lock:
+            self.mission_log.append(message, print_it=print_it, push_to_queue=push_to_queue)
+            self.control_messages += 1
+
+    def close(self):
+        """Write out the pending log entries and prompts, and close the log files."""
+        self.mission_log.close()
+        if self.prompt_log is not None:
+            self.prompt_log.close()
+
     def game_loop(self):
 
         for entity_id, entity in self.world.entity_registry.items():
@@ -993,21 +1522,55 @@ class GameController:
                 self.game_map.draw_partial_graph()
             elif inp in ['/fm', '/fullmap']:
                 self.game_map.draw_graph()
+            elif inp in ['/perf']:
+                print('\n'.join(self.profiler.format_summary()))
+            elif inp in ['/u', '/undo']:
+                print(f"Turn {self.turn_counter + 1} undone." if self.undo() else "Nothing to undo.")
             else:
                 # Add this line:
                 if inp:
-                    self.mission_log.append(f"Mission Control: {inp}", print_it=False)
+                    self.add_control_message(f"Mission Control: {inp}", print_it=False)
                 cont = self.process_turn()
 
         print("\nMission Ended")
+        self.close()
 
     def process_turn(self):
-        """Process a turn."""
+        """
+        Process a turn.
+
+        The game state is locked (state_lock) only while the turn is set up and resolved. Decision making only
+        reads the state and can wait seconds on the LLM, so it runs unlocked, and a GUI on another thread can keep
+        drawing the state meanwhile.
+
+        Returns:
+            bool: Whether the mission goes on (False once no agent is left).
+        """
+        with self.profiler.phase('turn'):
+            with self.state_lock:
+                if self.history.maxlen:
+                    self.history.append(self.snapshot())
+                agents = self.start_turn()
+                self.state_version += 1
+            if not agents:
+                return False
+
+            agent2decision = self.decide(agents)
+
+            with self.state_lock:
+                self.resolve_turn(agent2decision)
+                self.state_version += 1
+            return True
+
+    def start_turn(self):
+        """Reset the per-turn statuses, and return the agents still in the field."""
+        if tracing.tracer is not None:
+            tracing.tracer.turn = self.turn_counter
+
         # Initialize character statuses
         agents = [agent for agent in self.get_entities(Agent) if agent.health > 0]
 
         for agent in agents:
-            agent.knowledge_base = self.describe_knowledge_base(agent)
             if self.agents_hidden:
                 agent.is_hidden = True
 
@@ -1016,71 +1579,68 @@ class GameController:
             hostile.alarm_increased_this_turn = False
             hostile.is_peeked = False
 
-        if not agents:
-            return False
-
-        decide_prompts = [agent.make_decision_prompt() for agent in agents]
-
-        for agent, decide_prompt in zip(agents, decide_prompts):
-            with open('logs_internal/decision_prompts.txt', 'a') as f:
-                f.write(
-                    f"{agent.name}:\n--------------------------\n\n {decide_prompt}\n\n==========================\n\n")
+        return agents
 
+    def decide(self, agents):
+        """Get every agent's decision for this turn, according to the decision making mode."""
         agent2decision = {}
         if self.mode == 'auto':
             # Production mode decision making:
             # Uncomment this line for the actual AI system to make decisions
             # This requires defining the AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT environment variables
 
-            remaining_to_execute = decide_prompts.copy()
-            agents_to_execute = agents.copy()
-            i = 0
-
-            while remaining_to_execute:
-
-                if i >= 5:
-                    raise Exception('Not supposed to fail evaluating all prompt outputs 5 times in a row')
-
-                decisions = query_lbgpt('', remaining_to_execute)
-
-                # Validate
-                for i, decision in enumerate(decisions):
-
-                    try:
+            # Forced moves and unchanged situations are decided without the LLM
+            with self.profiler.phase('turn/shortcuts'):
+                shortcut_decisions = self.shortcuts.resolve(self, agents)
+                queried_agents = [agent for agent in agents if agent not in shortcut_decisions]
+            if shortcut_decisions:
+                logger.info(f"Turn {self.turn_counter}: {self.shortcuts.avoided_last_turn} of {len(agents)} LLM "
+                            f"calls avoided ({dict(self.shortcuts.last_turn)})")
+
+            with self.profiler.phase('turn/knowledge_base'):
+                self.aliases.refresh(self.world)
+
+                for agent in queried_agents:
+                    agent.knowledge_base = self.describe_knowledge_base(agent)
+
+            if self.squad_mode and len(queried_agents) > 1:
+                # One prompt for the whole squad, agents it leaves without a valid decision get their own prompt
+                with self.profiler.phase('turn/prompts'):
+                    squad_prompt = canonicalize_prompt(self.make_squad_prompt(queried_agents))
+                self.log_prompt('Squad', squad_prompt)
+
+                def make_prompt(agent):
+                    decide_prompt = canonicalize_prompt(agent.make_decision_prompt(self.aliases))
+                    self.log_prompt(agent.name, decide_prompt)
+                    return decide_prompt
+
+                with self.profiler.phase('turn/decisions'):
+                    agent2decision = self.dispatcher.dispatch_squad(queried_agents, squad_prompt, make_prompt,
+                                                                    self.aliases)
+            else:
+                # Canonicalized, so that identical situations produce byte-identical prompts and hit the prompt cache
+                with self.profiler.phase('turn/prompts'):
+                    decide_prompts = [canonicalize_prompt(agent.make_decision_prompt(self.aliases))
+                                      for agent in queried_agents]
 
-                        agent = agents_to_execute[i]
-                        evaled_decision = response_parsing(decision)
-                        action_argument_dict = agent.generate_action_arguments()
-                        action = evaled_decision['action']
+                for agent, decide_prompt in zip(queried_agents, decide_prompts):
+                    self.log_prompt(agent.name, decide_prompt)
 
-                        for arg in evaled_decision['arguments']:
-                            print('>>>', arg, type(arg))
+                # All prompts are sent at once, and only agents whose response fails validation are re-queried
+                with self.profiler.phase('turn/decisions'):
+                    agent2decision = self.dispatcher.dispatch(queried_agents, decide_prompts, self.aliases)
+            self.shortcuts.remember(agent2decision)
+            agent2decision.update(shortcut_decisions)
 
-                        try:
-                            args = [UUID(arg) for arg in evaled_decision['arguments']]
-                        except ValueError:
-                            print(f"Invalid UUID format for agent {agent.name}, retrying...")
-                            continue
-
-                        assert action in action_argument_dict, f"Invalid action: {action}. Valid actions: {list(action_argument_dict.keys())}"
-                        valid_args = [aarg['id'] for aarg in action_argument_dict.get(action, [])]
-                        assert all(
-                            arg in valid_args for arg in
-                            args), f"Invalid arguments: {args}. Valid arguments: {valid_args}"
-
-                        agent2decision[agent] = evaled_decision
-
-                    except AssertionError as e:
-                        print(f"Error processing decision {i}: {str(e)}")
-
-                remaining_to_execute = [
-                    remaining_to_execute[j] for j in range(len(remaining_to_execute)) if
-                    agents_to_execute[j] not in agent2decision
-                ]
-                agents_to_execute = [
-                    agent for agent in agents_to_execute if agent not in agent2decision
-                ]
-                i += 1
+            for agent in agents:
+                if agent not in agent2decision and self.fallback_policy is not None:
+                    print(f"No valid decision for {agent.name} this turn, using the fallback policy.")
+                    with self.profiler.phase('turn/fallback'):
+                        agent2decision[agent] = self.fallback_policy.decide(self, agent)
+                elif agent not in agent2decision:
+                    print(f"No valid decision for {agent.name} this turn, waiting instead.")
+                    agent2decision[agent] = {'action': 'wait', 'arguments': [], 'reasoning': 'No valid decision'}
+            agent2decision = {agent: agent2decision[agent] for agent in agents}
 
         elif self.mode == 'manual':
 
@@ -1089,7 +1649,8 @@ class GameController:
                 action_arguments = agent.generate_action_arguments()
                 prompt = agent.make_manual_decision_prompt()
 
-                # Display it to the user so they can make a choice for this agent
+                # Display it to the user so they can make a choice for this agent, after the pending log entries
+                self.mission_log.flush()
                 print(prompt)
 
                 arguments = []
@@ -1134,6 +1695,13 @@ class GameController:
                 decision = {'action': action, 'arguments': arguments}
                 agent2decision[agent] = decision
 
+        elif self.mode == 'policy':
+            # Local decision making, e.g. for headless batch simulation (see policies.py)
+
+            with self.profiler.phase('turn/decisions'):
+                for agent in agents:
+                    agent2decision[agent] = self.policy.decide(self, agent)
+
         elif self.mode == 'test':
             # Test mode decision making:
             # This is an example of how to hardcode a decision logic for testing
@@ -1158,122 +1726,131 @@ class GameController:
             }
             for agent, decision in agent2decision.items()
         }
-        logger.debug(f"Decisions: {json.dumps(decisions_dict, indent=2)}")
+        if tracing.debug:
+            logger.debug(f"Decisions: {json.dumps(decisions_dict, indent=2)}")
 
-        for i, (agent, decision) in enumerate(agent2decision.items()):
-            agent = agents[i]
-            area = agent.area
+        return agent2decision
+
+    def resolve_turn(self, agent2decision):
+        """Resolve the agents' decisions, then the hostiles' actions."""
+        with self.profiler.phase('turn/agents'):
+            # The noise of all agent actions is applied at once, after they are all resolved.
+            # This is safe because agent actions don't depend on hostile alarm levels until the hostiles' turn.
+            with self.noise.deferred():
+                self.noise.emit_lingering()
+                for agent, decision in agent2decision.items():
+                    self.resolve_decision(agent, decision)
+            self.noise.flush(self.get_entities(Hostile))
 
-            # print('Reasoning:', decision['reasoning'])
-            # print('Arguments:', [arg for arg in decision['arguments']])
+        with self.profiler.phase('turn/hostiles'):
+            # Hostile actions
+            for hostile in self.get_entities(Hostile):
 
-            # Get the action and args from the decision
-            action = decision['action']
+                area = hostile.area
 
-            # This step makes sure that the arguments are still in the game.
-            # For example if 2 agents shoot 1 target, and it goes down after one shot,
-            # then when the second agent's decision to shoot is queued, the target will no longer exist
-            if all(UUID(str(arg)) in self.world.entity_registry for arg in decision['arguments']):
+                # If there are agents in the area with not is_hidden:
+                potential_targets = [agent for agent in self.get_entities(Agent, area) if not agent.is_hidden]
+                if potential_targets:
 
-                args = [self.world.entity_registry[UUID(str(arg))] for arg in decision['arguments']]
-                func = getattr(self, action)  # Pick function based on action
-                func(agent, *args)  # Apply the function to the args
+                    target = randomness.combat.choice(potential_targets)
 
-            # Calculate the base alarm increase
-            skill = ACTION_TO_SKILL[action]
-            base_alarm_increase = get_alarm_increase(action, agent.skills[skill])
+                    self.shoot(hostile, target)
 
-            # Peeking alarm depends on connection type
-            # TODO: generalize this and wrap in an appropriate function
-            if action == 'peek':
-                conn = agent.area.get_connection_info(args[0])
-                if conn.conn_type == 'door':
-                    base_alarm_increase += PEEK_ALARM_PENALTY
+                    # Update alarms for the current area
+                    self.update_alarm_levels(area, 2)
 
-            logging.debug(f"Action: {action} | Base alarm increase: {base_alarm_increase}")
+                else:
 
-            # Update alarms for the current area
-            self.update_alarm_levels(area, base_alarm_increase)
+                    self.move_hostile(hostile)
 
-            # If the agent moved to a new area, update alarms there as well
-            if area != agent.area:
-                self.update_alarm_levels(agent.area, base_alarm_increase)
+                    if not hostile.alarm_increased_this_turn:
+                        hostile.update_alarm_level(RELAX_DEC)
 
-        # Hostile actions
-        for hostile in self.get_entities(Hostile):
+                hostile.update_skills()
+
+        if tracing.debug:
+            with self.profiler.phase('turn/debug_log'):
+                # For each agent, print location and is_hidden:
+                for agent in self.get_entities(Agent):
+                    logger.debug(f"{agent.name} is at {agent.area.name} and is_hidden: {agent.is_hidden}")
+                for hostile in self.get_entities(Hostile):
+                    logger.debug(
+                        f"{hostile.name}: at {hostile.area.name}, alarm level: {hostile.alarm_level:.3f} obs: {hostile.skills['observation']:.3f}, h2h: {hostile.skills['hand_to_hand']:.3f}, alarm_increased_this_turn: {hostile.alarm_increased_this_turn}, health: {hostile.health:.2f}")
 
-            area = hostile.area
+        # Reset area values
+        self.noise.end_turn()
+        for area in self.get_entities(Area):
+            area.chase_pointer = None
 
-            # If there are agents in the area with not is_hidden:
-            potential_targets = [agent for agent in self.get_entities(Agent, area) if not agent.is_hidden]
-            if potential_targets:
+        self.turn_counter += 1
 
-                target = random.choice(potential_targets)
+    def resolve_decision(self, agent, decision):
+        """Apply an agent's decision, and emit the noise it makes."""
+        area = agent.area
 
-                self.shoot(hostile, target)
+        # print('Reasoning:', decision['reasoning'])
+        # print('Arguments:', [arg for arg in decision['arguments']])
 
-                # Update alarms for the current area
-                self.update_alarm_levels(area, 2)
+        # Get the action and args from the decision
+        action = decision['action']
 
-            else:
+        # This step makes sure that the arguments are still in the game.
+        # For example if 2 agents shoot 1 target, and it goes down after one shot,
+        # then when the second agent's decision to shoot is queued, the target will no longer exist
+        if all(UUID(str(arg)) in self.world.entity_registry for arg in decision['arguments']):
 
-                self.move_hostile(hostile)
+            args = [self.world.entity_registry[UUID(str(arg))] for arg in decision['arguments']]
+            func = getattr(self, action)  # Pick function based on action
+            func(agent, *args)  # Apply the function to the args
 
-                if not hostile.alarm_increased_this_turn:
-                    hostile.update_alarm_level(RELAX_DEC)
+        # Calculate the base alarm increase
+        rules = self.world.rules
+        skill = rules.action_to_skill[action]
+        base_alarm_increase = rules.get_alarm_increase(action, agent.skills[skill])
 
-            hostile.update_skills()
+        # Peeking alarm depends on connection type
+        # TODO: generalize this and wrap in an appropriate function
+        if action == 'peek':
+            conn = agent.area.get_connection_info(args[0])
+            if conn.conn_type == 'door':
+                base_alarm_increase += rules.peek_alarm_penalty
 
-        # For each agent, print location and is_hidden:
-        for agent in self.get_entities(Agent):
-            logger.debug(f"{agent.name} is at {agent.area.name} and is_hidden: {agent.is_hidden}")
-        for hostile in self.get_entities(Hostile):
-            logger.debug(
-                f"{hostile.name}: at {hostile.area.name}, alarm level: {hostile.alarm_level:.3f} obs: {hostile.skills['observation']:.3f}, h2h: {hostile.skills['hand_to_hand']:.3f}, alarm_increased_this_turn: {hostile.alarm_increased_this_turn}, health: {hostile.health:.2f}")
+        if tracing.debug:
+            logger.debug(f"Action: {action} | Base alarm increase: {base_alarm_increase}")
 
-        # Reset area values
-        for area in self.get_entities(Area):
-            area.noise_level = area.noise_baseline
-            area.chase_pointer = None
+        # Update alarms for the current area
+        self.update_alarm_levels(area, base_alarm_increase)
 
-        self.turn_counter += 1
-        return True
+        # If the agent moved to a new area, update alarms there as well
+        if area != agent.area:
+            self.update_alarm_levels(agent.area, base_alarm_increase)
 
     def update_alarm_levels(self, area, base_alarm_increase):
         """
         Update the alarm levels for hostiles in the given area and its connected areas
         based on the base alarm increase and noise propagation factors.
-        """
 
-        area.noise_level += base_alarm_increase
-        # logger.debug(f"Changed noise level for area: {area.name} to {area.noise_level:.2f}")
-
-        # Update alarms for hostiles in the given area
-        for hostile in self.get_entities(Hostile, area):
-            hostile.update_alarm_level(base_alarm_increase)
-
-        # Propagate alarms to connected areas
-        for connection in area.connections:
-            other_area = connection.get_other_area(area)
-
-            propagation = base_alarm_increase * connection.noise_factor
-            other_area.noise_level += propagation
-            # logger.debug(f"Changed noise level for area: {other_area.name} to {other_area.noise_level:.2f}")
-            for hostile in self.get_entities(Hostile, other_area):
-                hostile.update_alarm_level(propagation)
+        While the noise field is deferred (during the agents' turn), the noise is only queued, and applied
+        with the rest of the batch.
+        """
+        self.noise.emit(area, base_alarm_increase)
+        if not self.noise.is_deferred:
+            self.noise.flush(self.get_entities(Hostile))
 
     def move_hostile(self, hostile):
         """
         Move the hostile along their patrol route, allowing for alarm interruptions and resuming patrols correctly.
         """
-        logger.debug(
-            f"Hostile: {hostile.name} | Current Area: {hostile.area.name} | Alarm Level: {hostile.alarm_level:.2f}")
+        if tracing.debug:
+            logger.debug(
+                f"Hostile: {hostile.name} | Current Area: {hostile.area.name} | Alarm Level: {hostile.alarm_level:.2f}")
 
         route = hostile.patrol_route
         n = len(route)
 
         if n <= 1:
-            logger.debug("Patrol route is too short or undefined. Staying in the current area.")
+            if tracing.debug:
+                logger.debug("Patrol route is too short or undefined. Staying in the current area.")
             return
 
         # TODO: test this
@@ -1294,16 +1871,18 @@ class GameController:
             # If there's no noise anywhere, move randomly
             if areas_with_noise[0][1] == 0:
                 connected_areas = hostile.area.get_connected_areas()
-                target_area = random.choice(connected_areas)
-                logger.debug(f"No noise detected. Moving randomly to {target_area.name}")
+                target_area = randomness.patrols.choice(connected_areas)
+                if tracing.debug:
+                    logger.debug(f"No noise detected. Moving randomly to {target_area.name}")
             else:
                 target_area = areas_with_noise[0][0]
-                logger.debug(f"Moving to the area with the highest noise: {target_area.name}")
+                if tracing.debug:
+                    logger.debug(f"Moving to the area with the highest noise: {target_area.name}")
 
         else:
             hostile.is_patrolling = True
 
-            if random.random() < GUARD_STAY_PROB:
+            if randomness.patrols.random() < GUARD_STAY_PROB:
                 return
 
             # Determine the next area in the patrol route
@@ -1312,32 +1891,31 @@ class GameController:
                 hostile.advance_patrol_index()
 
             target_area = route[hostile.current_patrol_index]
-            logger.debug(f"Resuming patrol: Next target area is {target_area.name}")
+            if tracing.debug:
+                logger.debug(f"Resuming patrol: Next target area is {target_area.name}")
 
         # Determine the next step toward the target area
         if target_area in hostile.area.get_connected_areas():
             next_area = target_area
-            logger.debug(f"Target area is adjacent: Moving to {next_area.name}")
+            if tracing.debug:
+                logger.debug(f"Target area is adjacent: Moving to {next_area.name}")
         else:
-            try:
-                shortest_path = self.game_map.get_shortest_path(hostile.area, target_area)
-                logger.debug(f"Shortest path: {[area.name for area in shortest_path]}")
-                next_area = shortest_path[min(1, len(shortest_path) - 1)]  # The first step toward the target area
+            # The first step toward the target area, from the map's precomputed routing table
+            next_area = self.game_map.get_next_step(hostile.area, target_area)
+            if next_area is None:
+                if tracing.debug:
+                    logger.debug("No path exists to the target area. Staying in the current area.")
+                return
 
+            if tracing.debug:
                 logger.debug(f"Target area is not adjacent: Taking step toward {next_area.name} via shortest path")
-            except nx.NetworkXNoPath:
-                logger.debug("No path exists to the target area. Staying in the current area.")
-                return
 
         # Move the hostile to the next area
         self.change_area(hostile, next_area)
 
     def get_entities(self, class_, area=None):
-
-        if area is None:
-            return [entity for entity in self.world.entity_registry.values() if isinstance(entity, class_)]
-        else:
-            return [entity for entity in area.entities if isinstance(entity, class_)]
+        """Return all entities of a class, optionally only those in the given area, from the world's indexes."""
+        return self.world.get_entities(class_, area)
 
     def change_area(self, entity, new_area):
         old_area = entity.area
@@ -1345,14 +1923,14 @@ class GameController:
         if old_area == new_area:
             return False
 
-        logger.debug(f"Moving Entity: {entity.name} | From: {old_area.name} | To: {entity.name}")
+        if tracing.debug:
+            logger.debug(f"Moving Entity: {entity.name} | From: {old_area.name} | To: {new_area.name}")
 
         assert new_area in [conn.get_other_area(old_area) for conn in
                             old_area.connections], "Entity is not connected to the new area."
 
-        old_area.entities.remove(entity)
-        new_area.entities.append(entity)
-        entity.area = new_area
+        self.world.move_entity(entity, new_area)
+        self.world.notify('moved', entity)
 
         if self.get_entities(Hostile, old_area) and \
                 hasattr(entity, 'is_hidden') and \
@@ -1388,8 +1966,9 @@ class GameController:
             access_difficulty = area.get_passage_access_difficulty(target_area)
 
             if access_difficulty:
-                base_alarm_increase = get_alarm_increase("bypass", agent.skills["acrobatics"])
-                logging.debug(f"Bypass alarm increase: {base_alarm_increase:.2f}")
+                base_alarm_increase = self.world.rules.get_alarm_increase("bypass", agent.skills["acrobatics"])
+                if tracing.debug:
+                    logger.debug(f"Bypass alarm increase: {base_alarm_increase:.2f}")
 
                 # Update alarms for the current area
                 self.update_alarm_levels(area, base_alarm_increase)
@@ -1496,16 +2075,17 @@ class GameController:
 
         Debug info shows all key values and state changes during the shooting process.
         """
-        logger.debug(f"=== SHOOTING SEQUENCE START ===")
-        logger.debug(f"Shooter: {shooter.name} ({type(shooter).__name__})")
-        logger.debug(f"Target: {target.name} ({type(target).__name__})")
-        logger.debug(f"Initial states:")
-        logger.debug(f"  Shooter health: {shooter.health:.2f}")
-        logger.debug(f"  Shooter firearms skill: {shooter.skills['firearms']:.2f}")
-        logger.debug(f"  Shooter hidden: {shooter.is_hidden}")
-        logger.debug(f"  Target health: {target.health:.2f}")
-        logger.debug(f"  Target cover skill: {target.skills['cover']:.2f}")
-        logger.debug(f"  Area cover modifier: {shooter.area.cover_modifier:.2f}")
+        if tracing.debug:
+            logger.debug(f"=== SHOOTING SEQUENCE START ===")
+            logger.debug(f"Shooter: {shooter.name} ({type(shooter).__name__})")
+            logger.debug(f"Target: {target.name} ({type(target).__name__})")
+            logger.debug(f"Initial states:")
+            logger.debug(f"  Shooter health: {shooter.health:.2f}")
+            logger.debug(f"  Shooter firearms skill: {shooter.skills['firearms']:.2f}")
+            logger.debug(f"  Shooter hidden: {shooter.is_hidden}")
+            logger.debug(f"  Target health: {target.health:.2f}")
+            logger.debug(f"  Target cover skill: {target.skills['cover']:.2f}")
+            logger.debug(f"  Area cover modifier: {shooter.area.cover_modifier:.2f}")
 
         # Validate shooter and target are in same area
         assert shooter.area is target.area, (
@@ -1515,36 +2095,42 @@ class GameController:
 
         # Shooting reveals position
         shooter.is_hidden = False
-        logger.debug(f"Shooter revealed position: hidden = {shooter.is_hidden}")
+        if tracing.debug:
+            logger.debug(f"Shooter revealed position: hidden = {shooter.is_hidden}")
 
         area = shooter.area
 
         # Determine if shot hits
         hit = shooter.take_action('shoot', target)
-        logger.debug(f"Shot hit check result: {hit}")
+        if tracing.debug:
+            logger.debug(f"Shot hit check result: {hit}")
 
         # Calculate damage
         if hit:
             # Roll shooter effectiveness
-            shooter_res = random.gauss(
+            shooter_res = randomness.combat.gauss(
                 shooter.skills['firearms'],
                 SKILL_SIGMA
             )
-            logger.debug(f"Shooter effectiveness roll: {shooter_res:.3f}")
+            if tracing.debug:
+                logger.debug(f"Shooter effectiveness roll: {shooter_res:.3f}")
 
             # Roll target defense
             total_cover = target.skills['cover'] + area.cover_modifier
-            target_res = random.gauss(total_cover, SKILL_SIGMA)
-            logger.debug(f"Target defense roll: {target_res:.3f}")
-            logger.debug(f"  From: cover skill ({target.skills['cover']:.2f}) + "
-                         f"area modifier ({area.cover_modifier:.2f})")
+            target_res = randomness.combat.gauss(total_cover, SKILL_SIGMA)
+            if tracing.debug:
+                logger.debug(f"Target defense roll: {target_res:.3f}")
+                logger.debug(f"  From: cover skill ({target.skills['cover']:.2f}) + "
+                             f"area modifier ({area.cover_modifier:.2f})")
 
             # Calculate final damage
             damage = max(0., min(.1, shooter_res - target_res))
-            logger.debug(f"Calculated damage: {damage:.3f}")
+            if tracing.debug:
+                logger.debug(f"Calculated damage: {damage:.3f}")
         else:
             damage = 0
-            logger.debug("Shot missed - no damage")
+            if tracing.debug:
+                logger.debug("Shot missed - no damage")
 
         # Log the shooting event
         if isinstance(shooter, Agent):
@@ -1558,19 +2144,23 @@ class GameController:
         # Apply damage and check for death
         old_health = target.health
         target.health -= damage
-        logger.debug(f"Target health: {old_health:.2f} -> {target.health:.2f}")
+        if tracing.debug:
+            logger.debug(f"Target health: {old_health:.2f} -> {target.health:.2f}")
 
         if target.health <= 0:
-            logger.debug(f"Target {target.name} killed")
+            if tracing.debug:
+                logger.debug(f"Target {target.name} killed")
             if isinstance(shooter, Agent):
                 self.mission_log.append(f"{shooter.name}: Target down!")
             elif isinstance(target, Agent):
                 self.mission_log.append(f"Mission Control: Agent Down!")
             self.world.remove_entity(target)
-            logger.debug("=== SHOOTING SEQUENCE END (TARGET KILLED) ===")
+            if tracing.debug:
+                logger.debug("=== SHOOTING SEQUENCE END (TARGET KILLED) ===")
             return 2
 
-        logger.debug(f"=== SHOOTING SEQUENCE END (DAMAGE: {damage:.3f}) ===")
+        if tracing.debug:
+            logger.debug(f"=== SHOOTING SEQUENCE END (DAMAGE: {damage:.3f}) ===")
         return damage > 0
 
     def silent_shoot(self, shooter, target):
@@ -1606,128 +2196,79 @@ class GameController:
 
     def charge(self, agent, area):
         """
-        No hostiles found: returns None
+        No hostiles found, or the move failed: returns None
         """
-        self.move(agent, area)
+        if not self.move(agent, area):
+            return None
         hostiles = [entity for entity in area.entities if isinstance(entity, Hostile)]
         if hostiles:
-            shoot_result = self.shoot(agent, random.choice(hostiles))
+            shoot_result = self.shoot(agent, randomness.combat.choice(hostiles))
             return shoot_result
 
     def exfiltrate(self, agent):
         self.world.remove_entity(agent)
+        self.exfiltrated.append(agent)
         self.mission_log.append(f"{agent.name}: Exfiltrated!")
 
-    def describe_knowledge_base(self, agent):
+    def make_squad_prompt(self, agents):
+        """
+        Generate a single prompt for an AI model to decide on the next move of several agents at once: the mission
+        intel, shared by the squad, followed by every agent's own situation and available actions. The decisions are
+        expected as a JSON dictionary mapping agent names to decisions (see DecisionDispatcher.dispatch_squad).
+        """
+        sections = "\n".join(agent.make_squad_section(self.aliases) for agent in agents)
+        names = ", ".join(agent.name for agent in agents)
+
+        instruction = (
+            "Decide on the next move of every agent listed above, based on the mission intel, Mission Control's "
+            "commands, and each agent's own situation and available actions.\n"
+            "You should strongly prioritize following the latest mission control commands, interpreting them to the best of your ability.\n"
+            "Each agent MUST pick an action and an argument EXACTLY as listed in its own section. "
+            "An agent can only take the actions listed for it, "
+            "it is physically impossible for it to do anything else in the game world.\n"
+            "Return your decisions as a valid JSON dictionary object mapping the name of each agent, exactly as "
+            f"written after AGENT ({names}), to its decision.\n"
+            "Your response should only include this JSON dictionary, nothing else.\n"
+            "Each decision is a dictionary with three fields: 'action', 'arguments', and 'reasoning'.\n"
+            "- The 'action' field should contain the name of the action the agent takes.\n"
+            "- The 'arguments' field should be a singleton list of the ID of the selected argument, chosen from the arguments listed for the agent. "
+            "If no arguments are needed, return an empty list.\n"
+            "- The 'reasoning' field should provide a brief explanation of why the agent takes this action.\n"
+            "For actions requiring an argument, you must use one of the IDs listed for the agent - no other IDs will work."
+        )
+
+        return (
+            "Mission intel:\n\n" + self.describe_knowledge_base(*agents) + "\n\n"
+            "You are Mission Control's field coordinator, deciding the moves of a squad of agents in the field.\n"
+            "The squad's task is to find and capture all objectives in the field, avoid detection by hostiles or neutralize them if necessary, and once all objectives have been captured, make it safely to the extraction point and exfiltrate.\n"
+            "The agents' health and observation skills are factors in what details they can accurately notice.\n\n"
+            "SQUAD:\n\n"
+            f"{sections}\n"
+            "================\n"
+            "INSTRUCTIONS:\n"
+            f"{instruction}"
+        )
+
+    def log_prompt(self, name, prompt):
+        """Log a decision prompt of this turn. Only queued here, the prompt log writes it on its own thread."""
+        if self.prompt_log is not None:
+            with self.profiler.phase('turn/prompt_log'):
+                self.prompt_log.write(self.turn_counter, name, prompt)
+
+    def describe_knowledge_base(self, *agents):
         """
         Create a verbal description of all explored entities, their locations if known,
-        and connections between areas if known. It returns a list of descriptive statements in a structured format.
+        and connections between areas if known, followed by the mission log.
 
-        Suggested Structure:
-        - Areas
-        - Agents
-        - Hostiles
-        - Objectives
-        - Hiding Places
+        The explored-world section is the same for every agent; it is maintained incrementally by
+        self.knowledge and rendered at most once per change. With kb_scope_hops set, it is instead scoped to
+        the surroundings of the given agents, with the rest of the explored world summarized
+        (see KnowledgeBase.render_scoped).
 
         The generated descriptions are intended for prompt use.
         """
-        descriptions = []
-
-        # Separate sections for each type of entity
-        area_descriptions = []
-        agent_descriptions = []
-        hostile_descriptions = []
-        objective_descriptions = []
-
-        # Iterate over all areas to generate descriptions
-        for area in self.game_map.areas:
-            if area.get_explored() > 0:
-                area_description = {
-                    "ID": area.id,
-                    "Name": area.name,
-                    "Description": area.description,
-                    "Connections": []
-                }
-                # Add connected areas that have been explored
-                for connection in area.connections:
-                    if connection.get_other_area(area).get_explored():
-                        connection_description = {
-                            "Name": connection.get_other_area(area).name,
-                            "ID": connection.get_other_area(area).id,
-                            "Details": connection.get_description(area) or ""
-                        }
-                        area_description["Connections"].append(connection_description)
-                area_descriptions.append(area_description)
-
-        # Iterate over all entities to generate descriptions for non-area entities
-        all_entities = list(self.world.entity_registry.values())
-        for entity in all_entities:
-            if not isinstance(entity, Area) and entity.get_explored() > 0:
-                entity_data = {
-                    "ID": entity.id,
-                    "Name": entity.name,
-                    "Description": entity.description,
-                    "Location": {
-                        "Name": entity.area.name,
-                        "ID": entity.area.id
-                    } if entity.area and entity.area.get_explored() and entity.get_explored() > 1 else None
-                }
-                # Categorize the entity into appropriate sections
-                if isinstance(entity, Agent):
-                    agent_descriptions.append(entity_data)
-                elif isinstance(entity, Hostile):
-                    hostile_descriptions.append(entity_data)
-                elif isinstance(entity, Objective):
-                    objective_descriptions.append(entity_data)
-                else:
-                    raise NotImplementedError(f"Unsupported entity type: {type(entity).__name__}")
-
-        # Assemble all parts into structured format
-        if area_descriptions:
-            descriptions.append("Areas:")
-            for area in area_descriptions:
-
-                area_id = area["ID"]
-                area_name = area["Name"]
-                area_desc = area["Description"]
-                connections = area["Connections"]
-
-                description_str = f"  - ID: {area_id}\n    Name: {area_name}\n    Description: {area_desc}"
-                if connections:
-                    description_str += f"\n    Connections: {', '.join([conn['Name'] for conn in connections])}"
-
-                descriptions.append(description_str)
-
-        if agent_descriptions:
-            descriptions.append("\nAgents:")
-            for agent in agent_descriptions:
-                description_str = f"  - ID: {agent['ID']}\n    Name: {agent['Name']}\n    Description: {agent['Description']}\n    Location: {agent['Location']['Name']} (ID: {agent['Location']['ID']})" if \
-                    agent[
-                        'Location'] else f"  - ID: {agent['ID']}\n    Name: {agent['Name']}\n    Description: {agent['Description']}"
-                descriptions.append(description_str)
-
-        if hostile_descriptions:
-            descriptions.append("\nHostiles:")
-            for hostile in hostile_descriptions:
-                description_str = f"  - ID: {hostile['ID']}\n    Name: {hostile['Name']}\n    Description: {hostile['Description']}\n    Location: {hostile['Location']['Name']} (ID: {hostile['Location']['ID']})" if \
-                    hostile[
-                        'Location'] else f"  - ID: {hostile['ID']}\n    Name: {hostile['Name']}\n    Description: {hostile['Description']}"
-                descriptions.append(description_str)
-
-        if objective_descriptions:
-            descriptions.append("\nObjectives:")
-            for objective in objective_descriptions:
-                description_str = f"  - ID: {objective['ID']}\n    Name: {objective['Name']}\n    Description: {objective['Description']}\n    Location: {objective['Location']['Name']} (ID: {objective['Location']['ID']})" if \
-                    objective[
-                        'Location'] else f"  - ID: {objective['ID']}\n    Name: {objective['Name']}\n    Description: {objective['Description']}"
-                descriptions.append(description_str)
-
-        # Append mission log
-        description = '\n'.join(descriptions) + '\n\n-----------------\n\nMission Log:\n' + '\n'.join(
-            self.mission_log[-100:]) + '\n\n-----------------'
-
-        if self.mission_log.last_command is not None:
-            description += f"Keep especially this instruction in mind when making your decision:\n\n Control: {self.mission_log.last_command}\n\n-----------------"
-
-        return description
+        if self.kb_scope_hops is None or not agents:
+            return self.knowledge.render()
+        viewpoint = 'your current position' if len(agents) == 1 else 'the nearest agent of the squad'
+        return self.knowledge.render_scoped(self.game_map, [agent.area for agent in agents], self.kb_scope_hops,
+                                            self.kb_token_budget, viewpoint)
@@ -1,8 +1,13 @@
 
 import uuid
 import hashlib
+from array import array
+from collections import defaultdict, deque
 
 import networkx as nx
+from bidict import bidict
+
+from rules import RuleSet
 
 
 # TODO:
@@ -32,12 +37,21 @@ def encode_uuids_to_integer(*uuids: uuid.UUID) -> int:
     return smaller_int
 
 class World:
-    def __init__(self, default_connection='A door'):
+    def __init__(self, default_connection='A door', rules=None):
         # Maps entity_id (UUID) to exploration level
         self.exploration_levels = {}
         # Maps entity_id (UUID) to entity objects for easy lookup
         self.entity_registry = {}
+        # Typed indexes kept in sync with the registry and area membership, for lookups in O(result size):
+        # class -> {entity_id: entity}, for every class in the entity's MRO
+        self.class_index = {}
+        # area_id -> class -> {entity_id: entity}, for entities placed in an area
+        self.area_index = {}
         self.default_connection = default_connection
+        # Balance tables used to resolve actions (see rules.py)
+        self.rules = rules if rules is not None else RuleSet()
+        # Objects notified of world events (see notify)
+        self.observers = []
 
     def describe_connection(self, connection_description):
         """A function to describe a connection between areas if they are empty."""
@@ -45,10 +59,56 @@ class World:
             return self.default_connection
         return connection_description
 
+    def add_observer(self, observer):
+        """Register an object to be notified of world events."""
+        self.observers.append(observer)
+
+    def notify(self, event, entity):
+        """
+        Notify observers of an event concerning an entity, by calling their `on_<event>` method if they have one.
+
+        Events: added, removed, explored, moved, captured.
+        """
+        for observer in self.observers:
+            handler = getattr(observer, f'on_{event}', None)
+            if handler is not None:
+                handler(entity)
+
     def add_entity(self, entity):
         """Add an entity to the world."""
         self.exploration_levels[entity.id] = entity.get_explored()
         self.entity_registry[entity.id] = entity
+        for class_ in type(entity).__mro__[:-1]:
+            self.class_index.setdefault(class_, {})[entity.id] = entity
+        self.notify('added', entity)
+
+    def place_entity(self, entity, area):
+        """Put an entity into an area's entity list, keeping the area index in sync."""
+        area.entities.append(entity)
+        entity.area = area
+        area_classes = self.area_index.setdefault(area.id, {})
+        for class_ in type(entity).__mro__[:-1]:
+            area_classes.setdefault(class_, {})[entity.id] = entity
+
+    def unplace_entity(self, entity):
+        """Take an entity out of its area's entity list, keeping the area index in sync."""
+        area = entity.area
+        if area and entity in area.entities:
+            area.entities.remove(entity)
+            area_classes = self.area_index.get(area.id, {})
+            for class_ in type(entity).__mro__[:-1]:
+                area_classes.get(class_, {}).pop(entity.id, None)
+
+    def move_entity(self, entity, new_area):
+        """Move an entity from its current area to another."""
+        self.unplace_entity(entity)
+        self.place_entity(entity, new_area)
+
+    def get_entities(self, class_, area=None):
+        """Return all entities of a class (including subclasses), optionally only those in the given area."""
+        if area is None:
+            return list(self.class_index.get(class_, {}).values())
+        return list(self.area_index.get(area.id, {}).get(class_, {}).values())
 
     def entity_registry_string(self):
         out = ''
@@ -59,12 +119,14 @@ class World:
     def remove_entity(self, entity):
         """Safely remove an entity from the world and all areas."""
         # First remove from area to prevent any references
-        if entity.area and entity in entity.area.entities:
-            entity.area.entities.remove(entity)
+        self.unplace_entity(entity)
 
         # Then remove from registries
         self.exploration_levels.pop(entity.id, None)  # Using pop with None default to avoid KeyError
         self.entity_registry.pop(entity.id, None)  # Using pop with None default to avoid KeyError
+        for class_ in type(entity).__mro__[:-1]:
+            self.class_index.get(class_, {}).pop(entity.id, None)
+        self.notify('removed', entity)
 
     def update_exploration(self, entity_id, level):
         """Update the exploration level of an entity."""
@@ -83,7 +145,70 @@ class World:
         return {entity_id: self.entity_registry[entity_id] for entity_id, exploration_level in
                 self.exploration_levels.items() if exploration_level > level}
 
+class AliasTable:
+    """
+    Maps entities to short tokens (e.g. A12, H3) that stand in for their UUIDs in prompts.
+
+    The table is refreshed once per turn. An entity keeps its alias for as long as it stays in the world, and
+    aliases of removed entities are never reused, so a token means the same entity throughout a mission.
+    """
+
+    # Alias prefix per entity class name. Unlisted classes use the default prefix.
+    PREFIXES = {
+        'Area': 'A',
+        'Agent': 'G',
+        'Hostile': 'H',
+        'Objective': 'O',
+        'Obstacle': 'B',
+    }
+    DEFAULT_PREFIX = 'E'
+
+    def __init__(self):
+        self.id_to_alias = bidict()
+        self.counters = defaultdict(int)
+
+    def get_prefix(self, entity):
+        for class_ in type(entity).__mro__:
+            if class_.__name__ in self.PREFIXES:
+                return self.PREFIXES[class_.__name__]
+        return self.DEFAULT_PREFIX
+
+    def refresh(self, world):
+        """Drop aliases of entities that left the world, and assign aliases to new ones in registry order."""
+        for entity_id in [entity_id for entity_id in self.id_to_alias if entity_id not in world.entity_registry]:
+            del self.id_to_alias[entity_id]
+
+        for entity_id, entity in world.entity_registry.items():
+            if entity_id not in self.id_to_alias:
+                prefix = self.get_prefix(entity)
+                self.counters[prefix] += 1
+                self.id_to_alias[entity_id] = f"{prefix}{self.counters[prefix]}"
+
+    def alias(self, entity_id):
+        """Return the alias of an entity ID, or the ID itself if it has no alias."""
+        return self.id_to_alias.get(entity_id, entity_id)
+
+    def resolve(self, token):
+        """
+        Return the entity ID a token stands for, or None if the token is unknown.
+        Full UUIDs of aliased entities are accepted as well.
+        """
+        token = str(token).strip().upper()
+        entity_id = self.id_to_alias.inverse.get(token)
+        if entity_id is None:
+            try:
+                entity_id = uuid.UUID(token)
+            except ValueError:
+                return None
+            if entity_id not in self.id_to_alias:
+                return None
+        return entity_id
+
+
 class GameMap:
+    # Marks unreachable areas in the routing tables
+    NO_ROUTE = -1
+
     def __init__(self, areas):
         self.areas = areas  # List of all Area objects
         self.id_to_area = {area.id: area for area in areas}  # Map IDs to area objects
@@ -98,41 +223,100 @@ class GameMap:
                 graph.add_edge(area.id, connected_area.id)  # Use IDs for edges
 
         self.graph = graph
+        self.build_routes()
+
+    def build_routes(self):
+        """
+        Precompute all-pairs routing tables with a BFS from every area, so that path queries on the turn's hot path
+        don't touch networkx. The tables are built once with the map: the map's connections never change during a
+        mission (locks do not change routes), so they need no updating.
+
+        Areas are numbered by their position in self.areas. For each target area t, next_hops[t][a] is the number of
+        the first area on a shortest path from a to t, and distances[t][a] its length in steps
+        (NO_ROUTE if t can't be reached from a).
+        """
+        self.area_numbers = {area.id: i for i, area in enumerate(self.areas)}
+        self.adjacency = [[self.area_numbers[neighbour_id] for neighbour_id in self.graph.neighbors(area.id)]
+                          for area in self.areas]
+        self.next_hops = [None] * len(self.areas)
+        self.distances = [None] * len(self.areas)
+        for target in range(len(self.areas)):
+            self.build_route(target)
+
+    def build_route(self, target):
+        """BFS from a target area, filling its rows of the routing tables."""
+        next_hop = array('i', [self.NO_ROUTE]) * len(self.areas)
+        distance = array('i', [self.NO_ROUTE]) * len(self.areas)
+        next_hop[target] = target
+        distance[target] = 0
+
+        queue = deque([target])
+        while queue:
+            current = queue.popleft()
+            for neighbour in self.adjacency[current]:
+                if distance[neighbour] == self.NO_ROUTE:
+                    distance[neighbour] = distance[current] + 1
+                    # One step from the neighbour toward the target leads back to the current area
+                    next_hop[neighbour] = current
+                    queue.append(neighbour)
+
+        self.next_hops[target] = next_hop
+        self.distances[target] = distance
+
+    def get_next_step(self, start_area, target_area):
+        """
+        Return the first area on a shortest path from start_area toward target_area (target_area itself if adjacent,
+        start_area if they are the same), or None if there is no path.
+        """
+        try:
+            step = self.next_hops[self.area_numbers[target_area.id]][self.area_numbers[start_area.id]]
+        except KeyError:
+            return None  # One or both of the areas are not on the map
+        return self.areas[step] if step != self.NO_ROUTE else None
+
+    def get_distance(self, start_area, target_area):
+        """Return the number of steps on a shortest path between two areas, or None if there is no path."""
+        try:
+            distance = self.distances[self.area_numbers[target_area.id]][self.area_numbers[start_area.id]]
+        except KeyError:
+            return None
+        return distance if distance != self.NO_ROUTE else None
 
     def get_shortest_path(self, start_area, target_area, return_names=False):
         """
-        Get the shortest path (as a list of area IDs or names) between two areas in the map.
+        Get the shortest path (as a list of areas or area names) between two areas in the map.
 
         Args:
-            start_area_id (UUID): The ID of the starting area.
-            target_area_id (UUID): The ID of the target area.
-            return_names (bool): Whether to return area names instead of IDs.
+            start_area (Area): The starting area.
+            target_area (Area): The target area.
+            return_names (bool): Whether to return area names instead of areas.
 
         Returns:
-            list: A list of area IDs or names representing the shortest path.
+            list: The areas (or names) along the shortest path, including both ends, or None if there is no path.
         """
+        if self.get_distance(start_area, target_area) is None:
+            return None  # No path exists between the areas, or one of them is not on the map
 
-        start_area_id = start_area.id
-        target_area_id = target_area.id
-
-        try:
-            # Find the shortest path using NetworkX
-            shortest_path_ids = nx.shortest_path(self.graph, source=start_area_id, target=target_area_id)
+        shortest_path = [start_area]
+        while shortest_path[-1] is not target_area:
+            shortest_path.append(self.get_next_step(shortest_path[-1], target_area))
 
-            if return_names:
-                # Convert IDs to names
-                return [self.id_to_area[area_id] for area_id in shortest_path_ids]
+        if return_names:
+            return [area.name for area in shortest_path]
+        return shortest_path
 
-            shortest_path = [self.id_to_area[area_id] for area_id in shortest_path_ids]
+    def get_neighbourhood(self, area, hops):
+        """
+        Return the areas at most `hops` connections away from an area, the area included.
 
-            return shortest_path
-        except nx.NetworkXNoPath:
-            return None  # No path exists between the areas
-        except KeyError:
-            return None  # One or both of the IDs are not in the graph
+        Returns:
+            dict: Maps each area of the neighbourhood to its distance in steps.
+        """
+        lengths = nx.single_source_shortest_path_length(self.graph, area.id, cutoff=hops)
+        return {self.id_to_area[area_id]: distance for area_id, distance in lengths.items()}
 
     def get_area_by_id(self, area_id):
         """
         Retrieve the area object corresponding to the given ID.
         """
-        return self.id_to_area.get(area_id, None)
\ No newline at end of file
+        return self.id_to_area.get(area_id, None)
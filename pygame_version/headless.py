@@ -0,0 +1,266 @@
+"""
+Headless simulation engine: runs missions without pygame, driven by a local decision policy, and collects
+outcome statistics over many runs in parallel.
+
+Missions can also run in auto mode, on LLM decisions recorded to a cassette (see cassette.py) and replayed offline,
+e.g. to measure turn throughput without network access.
+
+Examples:
+    python headless.py mission_configs/mission_config.json -n 1000 -p heuristic --set GUARD_STAY_PROB=0.7
+    python headless.py -n 1 --record logs_internal/session.cassette
+    python headless.py -n 1 --replay logs_internal/session.cassette --replay-latency 0
+"""
+
+import argparse
+import json
+import os
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+
+import constants
+import entities
+import mission
+import noise
+import randomness
+import rules
+from cassette import CassettePlayer, CassetteRecorder
+from decision_dispatch import query_single
+from entities import Agent, Hostile, Objective
+from mission import load_mission
+from policies import make_policy
+
+
+# Balance constants the simulation reads when a mission is loaded or played, so that overriding them takes effect.
+# Other constants are bound as default arguments when their module is imported (e.g. DECISION_*, PLANNER_*,
+# KB_*, DEFAULT_SPOT_DIFFICULTY), overriding them would silently do nothing.
+OVERRIDABLE_CONSTANTS = (
+    'GUARD_STAY_PROB', 'AREA_MOD_PROB', 'PEEK_MOD', 'INV_MOD', 'SKILL_SIGMA', 'RELAX_DEC',
+    'PEEK_ALARM_PENALTY', 'OBS_THRESHS', 'ACTION_TO_SKILL', 'ACTION_TO_COUNTER_SKILL', 'ALARM_INCREASES',
+    'SKILL_LEVELS', 'NOISE_HOPS', 'NOISE_HOP_DECAY', 'NOISE_DURATION', 'NOISE_LINGER_DECAY',
+)
+
+
+def apply_overrides(overrides):
+    """
+    Override balance constants (e.g. GUARD_STAY_PROB, SKILL_SIGMA) for missions run in this process.
+
+    Args:
+        overrides (dict): Maps constant names, among OVERRIDABLE_CONSTANTS, to their new values.
+
+    Raises:
+        ValueError: If a name is not a constant, or is one that cannot be overridden. Planner settings are set
+            through the policy's arguments instead (e.g. -a horizon=4).
+    """
+    for name, value in overrides.items():
+        if not hasattr(constants, name):
+            raise ValueError(f"Unknown constant: {name}")
+        if name not in OVERRIDABLE_CONSTANTS:
+            raise ValueError(f"{name} cannot be overridden in headless runs. Overridable constants: "
+                             f"{', '.join(OVERRIDABLE_CONSTANTS)}")
+        # The simulation modules star-import the constants, so they hold their own references
+        for module in (constants, entities, mission, noise, rules):
+            setattr(module, name, value)
+
+
+def run_mission(config_path, policy='heuristic', policy_args=(), max_turns=200, seed=None, overrides=None,
+                record_path=None, replay_path=None, replay_latency=0., squad=False, kb_hops=None):
+    """
+    Run a single mission to completion, or until max_turns.
+
+    Args:
+        config_path (str): Path to the mission configuration JSON file.
+        policy (str): Name of the decision policy (see policies.POLICIES).
+        policy_args (tuple): Arguments for the policy, e.g. the path of a script or recording.
+        max_turns (int): Turn limit.
+        seed (int): Root seed of the random streams (see randomness.py), for reproducible runs. None for a fresh
+            one, reported in the results.
+        overrides (dict): Balance constant overrides (see apply_overrides).
+        record_path (str): Run in auto mode instead of on the policy, recording the LLM's decisions to this cassette.
+        replay_path (str): Run in auto mode instead of on the policy, on the decisions recorded in this cassette,
+            with its seed.
+        replay_latency (float): Factor of the recorded latencies replayed decisions are served after.
+        squad (bool): When recording, decide for all agents with a single prompt (see GameController.squad_mode).
+            Replays use the cassette's mode.
+        kb_hops (int): When recording, scope the agents' knowledge base to this many connections around them (see
+            GameController.kb_scope_hops). Replays use the cassette's scope.
+
+    Returns:
+        dict: Outcome statistics of the run.
+    """
+    if overrides:
+        apply_overrides(overrides)
+
+    decision_query = None
+    if replay_path:
+        decision_query = CassettePlayer(replay_path, latency_scale=replay_latency)
+        seed = decision_query.metadata.get('seed', seed)
+    randomness.seed(seed)
+    seed = randomness.root_seed
+    if record_path:
+        decision_query = CassetteRecorder(record_path, query_single, metadata={
+            'seed': seed, 'config_path': config_path, 'decision_reuse_limit': constants.DECISION_REUSE_LIMIT,
+            'squad_mode': squad, 'kb_scope_hops': kb_hops, 'kb_token_budget': constants.KB_TOKEN_BUDGET})
+
+    if decision_query is None:
+        gc = load_mission(config_path, mode='policy', policy=make_policy(policy, *policy_args), prompt_log_path=None,
+                          mission_log_path=None, undo_history=0)
+    else:
+        metadata = decision_query.metadata if replay_path else {'squad_mode': squad, 'kb_scope_hops': kb_hops}
+        gc = load_mission(config_path, mode='auto', agents_hidden=metadata.get('agents_hidden', False),
+                          hostiles_visible=metadata.get('hostiles_visible', False), decision_query=decision_query,
+                          decision_reuse_limit=metadata.get('decision_reuse_limit', constants.DECISION_REUSE_LIMIT),
+                          squad_mode=metadata.get('squad_mode', False), kb_scope_hops=metadata.get('kb_scope_hops'),
+                          kb_token_budget=metadata.get('kb_token_budget', constants.KB_TOKEN_BUDGET),
+                          prompt_log_path=None, mission_log_path=None, undo_history=0)
+        if replay_path:
+            # A prompt missing from the cassette stays missing, there is no point in waiting to retry it
+            gc.dispatcher.retry_backoff = 0.
+    gc.mission_log.echo = False
+
+    agents = gc.get_entities(Agent)
+    objectives = gc.get_entities(Objective)
+    alarm_peak = 0.
+
+    while gc.turn_counter < max_turns and gc.process_turn():
+        alarm_peak = max([alarm_peak] + [hostile.alarm_level for hostile in gc.get_entities(Hostile)])
+
+    n_captured = sum(objective.is_captured for objective in objectives)
+    n_exfiltrated = len(gc.exfiltrated)
+    n_lost = len([agent for agent in agents if agent.health <= 0])
+
+    if n_captured == len(objectives) and n_exfiltrated and n_exfiltrated + n_lost == len(agents):
+        outcome = 'success'
+    elif gc.turn_counter >= max_turns:
+        outcome = 'timeout'
+    else:
+        outcome = 'failure'
+
+    results = {
+        'seed': seed,
+        'outcome': outcome,
+        'turns': gc.turn_counter,
+        'objectives_captured': n_captured,
+        'objectives_total': len(objectives),
+        'agents_lost': n_lost,
+        'agents_exfiltrated': n_exfiltrated,
+        'agents_total': len(agents),
+        'alarm_peak': alarm_peak,
+    }
+    if replay_path:
+        results.update(cassette_hits=decision_query.hits, cassette_misses=decision_query.misses)
+    if decision_query is not None:
+        decision_query.close()
+
+    return results
+
+
+def _run_mission_args(args):
+    return run_mission(*args)
+
+
+def run_batch(config_path, policy='heuristic', policy_args=(), n_runs=100, max_turns=200, seed=0, overrides=None,
+              workers=None, replay_path=None, replay_latency=0.):
+    """
+    Run many missions in parallel across processes.
+
+    Args:
+        n_runs (int): Number of missions. Run i is seeded with seed + i.
+        workers (int): Number of worker processes (default: one per CPU).
+        Other arguments are as in run_mission.
+
+    Returns:
+        list: Outcome statistics of every run, in seed order.
+    """
+    jobs = [(config_path, policy, tuple(policy_args), max_turns, seed + i, overrides, None, replay_path, replay_latency)
+            for i in range(n_runs)]
+    chunksize = max(1, n_runs // (4 * (workers or os.cpu_count())))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_run_mission_args, jobs, chunksize=chunksize))
+
+
+def summarize(results):
+    """Aggregate outcome statistics over a batch of runs."""
+    n = len(results)
+
+    def mean(key):
+        return statistics.fmean(result[key] for result in results)
+
+    return {
+        'runs': n,
+        'success_rate': sum(result['outcome'] == 'success' for result in results) / n,
+        'timeout_rate': sum(result['outcome'] == 'timeout' for result in results) / n,
+        'mean_turns': mean('turns'),
+        'mean_objectives_captured': mean('objectives_captured'),
+        'mean_agents_lost': mean('agents_lost'),
+        'mean_agents_exfiltrated': mean('agents_exfiltrated'),
+        'mean_alarm_peak': mean('alarm_peak'),
+    }
+
+
+def parse_override(text):
+    name, _, value = text.partition('=')
+    return name.strip(), json.loads(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run missions headless and collect outcome statistics.")
+    parser.add_argument(
+        "config_path", type=str, nargs="?", default="mission_configs/mission_config.json",
+        help="Path to the mission configuration JSON file (default: mission_configs/mission_config.json)."
+    )
+    parser.add_argument("-n", "--runs", type=int, default=100, help="Number of missions to run (default: 100).")
+    parser.add_argument(
+        "-p", "--policy", type=str, default='heuristic',
+        help="Decision policy (Options: [random, scripted, heuristic, recorded, mcts]), (default: heuristic)."
+    )
+    parser.add_argument(
+        "-a", "--policy-arg", action="append", default=[],
+        help="Argument for the policy, e.g. the script or recording file, or NAME=VALUE settings of mcts "
+             "(e.g. -a time_budget=0.5 -a workers=4). Can be repeated."
+    )
+    parser.add_argument("-t", "--max-turns", type=int, default=200, help="Turn limit per mission (default: 200).")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Seed of the first run (default: 0).")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument(
+        "--set", action="append", default=[], type=parse_override, metavar="NAME=VALUE",
+        help="Override a balance constant, e.g. --set GUARD_STAY_PROB=0.7 (see OVERRIDABLE_CONSTANTS). Can be "
+             "repeated."
+    )
+    parser.add_argument("-o", "--output", type=str, default=None, help="Write per-run results to this JSON file.")
+    parser.add_argument(
+        "--record", type=str, default=None, metavar="CASSETTE",
+        help="Run a single mission in auto mode, on the LLM, and record its decisions to this cassette file."
+    )
+    parser.add_argument(
+        "--replay", type=str, default=None, metavar="CASSETTE",
+        help="Run the missions in auto mode, on the decisions recorded in this cassette file, with its seed."
+    )
+    parser.add_argument(
+        "--replay-latency", type=float, default=0.,
+        help="Factor of the recorded latencies replayed decisions are served after (default: 0, instant)."
+    )
+    parser.add_argument(
+        "--squad", action="store_true",
+        help="With --record, decide for all agents with a single LLM prompt per turn."
+    )
+    parser.add_argument(
+        "--kb-hops", type=int, default=None,
+        help="With --record, describe the world in full only within this many connections of each agent."
+    )
+
+    args = parser.parse_args()
+
+    if args.record:
+        results = [run_mission(args.config_path, max_turns=args.max_turns, seed=args.seed, overrides=dict(args.set),
+                               record_path=args.record, squad=args.squad,
+                               kb_hops=args.kb_hops)]
+    else:
+        results = run_batch(args.config_path, policy=args.policy, policy_args=args.policy_arg, n_runs=args.runs,
+                            max_turns=args.max_turns, seed=args.seed, overrides=dict(args.set), workers=args.workers,
+                            replay_path=args.replay, replay_latency=args.replay_latency)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    print(json.dumps(summarize(results), indent=2))
@@ -0,0 +1,182 @@
+"""
+Load test of the decision pipeline: missions with N agents each, M of them running concurrently in auto mode, with
+their decisions served by a mock chat-completions server (see mock_llm.py) or any other server given by URL.
+
+Reports turn, decision and request latencies over all missions, the dispatcher's request outcomes (errors, invalid
+responses, agents left without a decision) and the mock server's own counts (prompt tokens included), to see how the
+pipeline degrades under a given provider behaviour, and how squad mode scales with the number of agents.
+
+Example:
+    python load_test.py -m 8 -n 6 -t 10 --profile degraded
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import randomness
+import tracing
+from constants import KB_TOKEN_BUDGET
+from mission import load_mission
+from mock_llm import MockLLMServer, MockProfile, make_chat_query, parse_setting
+
+# Timed phases reported, as named by the game's profiler
+PHASES = ['turn', 'turn/decisions', 'llm/request', 'llm/parse']
+
+
+def make_config(config_path, n_agents, directory):
+    """
+    Write a copy of a mission config with n_agents agents to a directory, cycling through the config's agents.
+
+    Returns:
+        str: The path of the new config.
+    """
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+
+    agents = config['agents']
+    config['agents'] = [dict(agents[i % len(agents)], name=agents[i % len(agents)]['name'] +
+                             (f" {i // len(agents) + 1}" if i >= len(agents) else ''))
+                        for i in range(n_agents)]
+
+    path = os.path.join(directory, os.path.basename(config_path))
+    with open(path, 'w') as f:
+        json.dump(config, f)
+    return path
+
+
+def run_load_mission(config_path, url, max_turns, seed, turn_deadline=None, squad=False, kb_hops=None,
+                     kb_budget=KB_TOKEN_BUDGET):
+    """
+    Run one mission in auto mode against a chat-completions server.
+
+    Returns:
+        dict: The mission's turns and wall time, the dispatcher's stats, the decisions taken without the LLM, and
+        the recent samples of every phase in PHASES, in milliseconds.
+    """
+    randomness.seed(seed)
+    gc = load_mission(config_path, mode='auto', decision_query=make_chat_query(url), prompt_log_path=None,
+                      mission_log_path=None, undo_history=0, squad_mode=squad,
+                      kb_scope_hops=kb_hops, kb_token_budget=kb_budget)
+    gc.mission_log.echo = False
+    if turn_deadline is not None:
+        gc.dispatcher.turn_deadline = turn_deadline
+
+    start = time.perf_counter()
+    # The game prints a line for every agent left without a decision
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        while gc.turn_counter < max_turns and gc.process_turn():
+            pass
+
+    return {
+        'seed': seed,
+        'turns': gc.turn_counter,
+        'seconds': time.perf_counter() - start,
+        'dispatcher': dict(gc.dispatcher.stats),
+        'shortcuts': dict(gc.shortcuts.stats),
+        'samples': {phase: list(gc.profiler.recent.get(phase, [])) for phase in PHASES},
+    }
+
+
+def _run_load_mission_args(args):
+    return run_load_mission(*args)
+
+
+def run_load_test(config_path, n_agents, n_missions, max_turns, url, seed=0, turn_deadline=None, squad=False,
+                  kb_hops=None, kb_budget=KB_TOKEN_BUDGET):
+    """Run n_missions missions with n_agents agents each, all at once, in separate processes."""
+    with tempfile.TemporaryDirectory() as directory:
+        mission_config = make_config(config_path, n_agents, directory)
+        jobs = [(mission_config, url, max_turns, seed + i, turn_deadline, squad, kb_hops, kb_budget)
+                for i in range(n_missions)]
+        with ProcessPoolExecutor(max_workers=n_missions) as executor:
+            return list(executor.map(_run_load_mission_args, jobs))
+
+
+def describe_samples(samples):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return {
+        'count': len(samples),
+        'mean_ms': statistics.fmean(samples),
+        'p50_ms': samples[len(samples) // 2],
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * .95))],
+        'max_ms': samples[-1],
+    }
+
+
+def summarize(results, server_stats=None):
+    """Aggregate the results of the missions of a load test."""
+    dispatcher = Counter()
+    shortcuts = Counter()
+    for result in results:
+        dispatcher.update(result['dispatcher'])
+        shortcuts.update(result['shortcuts'])
+    turns = sum(result['turns'] for result in results)
+    wall = max(result['seconds'] for result in results)
+
+    summary = {
+        'missions': len(results),
+        'turns': turns,
+        'turns_per_second': turns / wall if wall else None,
+        'phases': {phase: describe_samples([sample for result in results for sample in result['samples'][phase]])
+                   for phase in PHASES},
+        'dispatcher': dict(dispatcher),
+        # Share of agent decisions that ended in a valid decision, rather than a wait
+        'decision_rate': dispatcher['decisions'] / max(1, dispatcher['decisions'] + dispatcher['exhausted'] +
+                                                       dispatcher['deadline_missed']),
+        'shortcuts': dict(shortcuts),
+    }
+    if server_stats is not None:
+        summary['server'] = dict(server_stats)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the decision pipeline against a mock LLM server.")
+    parser.add_argument(
+        "config_path", type=str, nargs="?", default="mission_configs/mission_config.json",
+        help="Path to the mission configuration JSON file (default: mission_configs/mission_config.json)."
+    )
+    parser.add_argument("-n", "--agents", type=int, default=4, help="Agents per mission (default: 4).")
+    parser.add_argument("-m", "--missions", type=int, default=4, help="Concurrent missions (default: 4).")
+    parser.add_argument("-t", "--max-turns", type=int, default=10, help="Turns per mission (default: 10).")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Seed of the first mission (default: 0).")
+    parser.add_argument("--profile", default='typical', help="Mock server profile (see MOCK_LLM_PROFILES).")
+    parser.add_argument(
+        "--set", action="append", default=[], type=parse_setting, metavar="NAME=VALUE",
+        help="Override a mock profile setting, e.g. --set rate_limit_rps=20. Can be repeated."
+    )
+    parser.add_argument("--url", default=None, help="Use the server at this URL instead of starting a mock server.")
+    parser.add_argument("--turn-deadline", type=float, default=None, help="Override the decision turn deadline.")
+    parser.add_argument("--squad", action="store_true", help="Decide for all agents of a mission with one prompt.")
+    parser.add_argument("--kb-hops", type=int, default=None, help="Scope the agents' knowledge base to this many hops.")
+    parser.add_argument("--kb-budget", type=int, default=KB_TOKEN_BUDGET,
+                        help="Token budget of a scoped knowledge base.")
+    parser.add_argument("--log-level", type=str, default="ERROR", help="Logging level (default: ERROR).")
+    args = parser.parse_args()
+
+    tracing.configure_logging(args.log_level)
+
+    server = None
+    url = args.url
+    if url is None:
+        server = MockLLMServer(MockProfile.from_name(args.profile, **dict(args.set)), port=0, seed=args.seed).start()
+        url = server.url
+
+    try:
+        results = run_load_test(args.config_path, args.agents, args.missions, args.max_turns, url, seed=args.seed,
+                                turn_deadline=args.turn_deadline, squad=args.squad,
+                                kb_hops=args.kb_hops, kb_budget=args.kb_budget)
+    finally:
+        if server is not None:
+            server.stop()
+
+    print(json.dumps(summarize(results, server.stats if server else None), indent=2))
@@ -0,0 +1,185 @@
+import atexit
+import queue
+import struct
+import sys
+import threading
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
+
+from constants import *
+
+# Spill file records: a little-endian uint32 byte length, then the UTF-8 encoded entry
+RECORD_HEADER = struct.Struct('<I')
+
+
+class StdoutSink:
+    """
+    Prints lines on a background thread, so that writing to a slow terminal never blocks the game.
+
+    Lines are printed in the order they were written. Pending lines are flushed at interpreter exit.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+        self.lines = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name='stdout-sink', daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def write(self, line):
+        self.lines.put(line)
+
+    def flush(self):
+        """Block until every line written so far was printed."""
+        self.lines.join()
+
+    def run(self):
+        while True:
+            line = self.lines.get()
+            try:
+                print(line, file=self.stream or sys.stdout)
+            finally:
+                self.lines.task_done()
+
+
+class MissionLog:
+    """
+    The mission log: a sequence of log entries, of which only the latest `retention` are kept in memory.
+
+    Older entries are spilled to an append-only file of length-prefixed records if a spill path is given, and
+    dropped otherwise. Indexing and slicing work over the whole log (spilled entries are read back from the
+    file), and len() is the total number of entries ever logged.
+
+    Entries are echoed to stdout through a background StdoutSink, and queued in `print_queue` for the GUI.
+    """
+
+    def __init__(self, retention=MISSION_LOG_RETENTION, spill_path=None, echo=True, sink=None):
+        """
+        Args:
+            retention (int): Number of latest entries kept in memory.
+            spill_path (str): File older entries are spilled to, or None to drop them. Truncated on creation.
+            echo (bool): Whether entries are printed to stdout at all (off for headless runs).
+            sink (StdoutSink): Sink the entries are printed through (default: a new one, created on first use).
+        """
+        self.entries = deque(maxlen=retention)
+        self.count = 0  # Total number of entries, spilled or dropped ones included
+        self.print_queue = deque()
+        self.last_command = None
+        self.echo = echo
+        self.sink = sink
+        self.mute_depth = 0  # Nesting depth of muted() contexts in progress
+
+        self.spill_path = spill_path
+        self.spill_file = open(spill_path, 'w+b') if spill_path else None
+        self.spill_offsets = array('q')  # Offset of each spilled entry's record in the spill file
+
+    def append(self, item, print_it=True, push_to_queue=True, is_command=False):
+
+        item = item.replace(' (Captured)', '')
+
+        if print_it and self.echo and not self.mute_depth:
+            if self.sink is None:
+                self.sink = StdoutSink()
+            self.sink.write(item)
+        if push_to_queue and not self.mute_depth:
+            self.print_queue.append(item)
+        if is_command:
+            self.last_command = item
+
+        if len(self.entries) == self.entries.maxlen:
+            self.spill(self.entries[0])
+        self.entries.append(item)
+        self.count += 1
+
+    def spill(self, item):
+        """Write an entry about to leave memory to the spill file."""
+        if self.spill_file is None:
+            return
+        data = item.encode('utf-8')
+        self.spill_file.seek(0, 2)
+        self.spill_offsets.append(self.spill_file.tell())
+        self.spill_file.write(RECORD_HEADER.pack(len(data)) + data)
+
+    def read_spilled(self, index):
+        """Read back the entry with the given (absolute) index from the spill file."""
+        self.spill_file.flush()
+        self.spill_file.seek(self.spill_offsets[index])
+        length, = RECORD_HEADER.unpack(self.spill_file.read(RECORD_HEADER.size))
+        return self.spill_file.read(length).decode('utf-8')
+
+    def get(self, index):
+        """Return the entry with the given absolute index (0 is the first entry ever logged)."""
+        first_in_memory = self.count - len(self.entries)
+        if index >= first_in_memory:
+            return self.entries[index - first_in_memory]
+        if self.spill_file is not None and index < len(self.spill_offsets):
+            return self.read_spilled(index)
+        raise IndexError(f"Mission log entry {index} is no longer retained")
+
+    def tail(self, n):
+        """Return the latest n entries (at most the ones in memory), oldest first."""
+        return list(islice(reversed(self.entries), n))[::-1]
+
+    def truncate(self, count):
+        """
+        Drop the entries logged after the first `count`, e.g. when the game state is rolled back. Entries that were
+        spilled to disk meanwhile are read back into memory.
+        """
+        if count >= self.count:
+            return
+        for _ in range(min(self.count - count, len(self.entries))):
+            self.entries.pop()
+        self.count = count
+
+        if self.spill_file is not None:
+            first_in_memory = count - len(self.entries)
+            del self.spill_offsets[min(count, len(self.spill_offsets)):]
+            reload = min(first_in_memory, len(self.spill_offsets), self.entries.maxlen - len(self.entries))
+            for index in range(first_in_memory - 1, first_in_memory - reload - 1, -1):
+                self.entries.appendleft(self.read_spilled(index))
+            if reload:
+                # The reloaded entries are spilled again once they leave memory
+                self.spill_file.truncate(self.spill_offsets[first_in_memory - reload])
+                del self.spill_offsets[first_in_memory - reload:]
+
+    @contextmanager
+    def muted(self):
+        """
+        Neither print the entries logged in the body of the context nor queue them for the GUI, e.g. while a
+        planner plays out hypothetical turns. The entries are still logged.
+
+        The print queue itself is left in place, as the GUI drains it without taking the state lock.
+        """
+        self.mute_depth += 1
+        try:
+            yield
+        finally:
+            self.mute_depth -= 1
+
+    def flush(self):
+        """Block until every entry logged so far was printed, and written to the spill file."""
+        if self.sink is not None:
+            self.sink.flush()
+        if self.spill_file is not None:
+            self.spill_file.flush()
+
+    def close(self):
+        self.flush()
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.get(i) for i in range(self.count)[key]]
+        return self.get(range(self.count)[key])
+
+    def __iter__(self):
+        """Iterate over every entry still available, in memory or spilled."""
+        first = self.count - len(self.entries) - (len(self.spill_offsets) if self.spill_file else 0)
+        return (self.get(i) for i in range(first, self.count))
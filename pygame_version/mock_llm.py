@@ -0,0 +1,293 @@
+"""
+A local stand-in for the LLM: an HTTP server speaking the chat-completions protocol, for load tests of the decision
+pipeline without touching the real service (see load_test.py).
+
+The server answers decision prompts with decisions picked at random among the actions listed in the prompt, and
+squad prompts (see GameController.make_squad_prompt) with a dictionary of such decisions, one per agent. A
+MockProfile sets how it behaves like a real provider: latency (log-normal, with occasional stalls), rate limiting
+(429 responses beyond a request rate, or at random), server errors, malformed JSON and invalid argument IDs. Preset
+profiles are defined in MOCK_LLM_PROFILES.
+
+Both OpenAI-style (/v1/chat/completions) and Azure-style (/openai/deployments/<model>/chat/completions) paths are
+served, so the OpenAI clients can be pointed at it as well as make_chat_query.
+
+Usage, to run a server:
+    python mock_llm.py --profile typical --port 8765 --set malformed_prob=0.2
+"""
+
+import argparse
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from constants import *
+
+logger = logging.getLogger(__name__)
+
+ACTION_LINE = re.compile(r"^- (\w+): (.*)$", re.M)
+ARGUMENT_ID = re.compile(r"ID (\S+) \(of entity")
+SQUAD_AGENT = re.compile(r"^AGENT (.+):$", re.M)
+
+
+class MockProfile:
+    """How the mock server behaves. Every probability applies per request."""
+
+    def __init__(self, latency_median=0., latency_sigma=0., stall_prob=0., stall_seconds=0., rate_limit_rps=None,
+                 rate_limit_burst=1, rate_limit_prob=0., error_prob=0., malformed_prob=0., invalid_id_prob=0.):
+        """
+        Args:
+            latency_median (float): Median response time, in seconds.
+            latency_sigma (float): Shape of the log-normal response time distribution (0 for a constant latency).
+            stall_prob (float): Probability of a request stalling for stall_seconds on top of its latency.
+            stall_seconds (float): Duration of stalls.
+            rate_limit_rps (float): Sustained requests per second allowed before answering 429, or None for no limit.
+            rate_limit_burst (int): Requests allowed in a burst above the sustained rate.
+            rate_limit_prob (float): Probability of a 429 response regardless of the rate.
+            error_prob (float): Probability of a 500 response.
+            malformed_prob (float): Probability of a response whose content is not valid JSON.
+            invalid_id_prob (float): Probability of a decision whose argument is not one of the listed IDs.
+        """
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.stall_prob = stall_prob
+        self.stall_seconds = stall_seconds
+        self.rate_limit_rps = rate_limit_rps
+        self.rate_limit_burst = rate_limit_burst
+        self.rate_limit_prob = rate_limit_prob
+        self.error_prob = error_prob
+        self.malformed_prob = malformed_prob
+        self.invalid_id_prob = invalid_id_prob
+
+    @classmethod
+    def from_name(cls, name, **overrides):
+        """Build a preset profile of MOCK_LLM_PROFILES, with some settings overridden."""
+        if name not in MOCK_LLM_PROFILES:
+            raise ValueError(f"Unknown mock LLM profile: {name}. Options: {list(MOCK_LLM_PROFILES)}")
+        return cls(**dict(MOCK_LLM_PROFILES[name], **overrides))
+
+
+def list_actions(prompt):
+    """Return the actions listed in a decision prompt, as (action, [argument ID, ...]) pairs."""
+    instructions = prompt.rpartition('INSTRUCTIONS:')[2]
+    return [(action, ARGUMENT_ID.findall(details)) for action, details in ACTION_LINE.findall(instructions)]
+
+
+def generate_decision(prompt, rng, invalid_id=False):
+    """Pick a random decision among the actions of a decision prompt, with an invalid argument if asked to."""
+    actions = list_actions(prompt) or [('wait', [])]
+    action, arguments = rng.choice(actions)
+    if invalid_id:
+        arguments = [f"x{rng.randrange(10 ** 6)}"]
+    return {'action': action, 'arguments': [rng.choice(arguments)] if arguments else [],
+            'reasoning': 'Mock decision'}
+
+
+def generate_squad_decision(prompt, rng, invalid_id=False):
+    """
+    Pick a random decision for every agent of a squad prompt, with an invalid argument for one of them if asked to.
+    Returns None if the prompt is not a squad prompt.
+    """
+    squad = prompt.rpartition('INSTRUCTIONS:')[0].partition('SQUAD:')[2]
+    names = SQUAD_AGENT.findall(squad)
+    if not names:
+        return None
+
+    sections = SQUAD_AGENT.split(squad)[2::2]
+    invalid_agent = rng.randrange(len(names)) if invalid_id else None
+    return {name: generate_decision('INSTRUCTIONS:' + section, rng, i == invalid_agent)
+            for i, (name, section) in enumerate(zip(names, sections))}
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """The mock chat-completions server. Every request is served on its own thread."""
+
+    daemon_threads = True
+
+    def __init__(self, profile=None, port=MOCK_LLM_PORT, host='127.0.0.1', seed=None):
+        """
+        Args:
+            profile (MockProfile): How the server behaves (default: the ideal provider).
+            port (int): Port to listen on, 0 for any free port.
+            host (str): Address to listen on.
+            seed (int): Seed of the server's random choices.
+        """
+        super().__init__((host, port), MockLLMHandler)
+        self.profile = profile or MockProfile()
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()  # Guards rng, stats and the rate limiter
+        self.stats = Counter()  # Requests served, by outcome
+        self.thread = None
+
+        # Token bucket of the rate limit
+        self.tokens = self.profile.rate_limit_burst
+        self.tokens_updated = time.monotonic()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve on a background thread."""
+        self.thread = threading.Thread(target=self.serve_forever, name='mock-llm', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def take_token(self):
+        """Spend a token of the rate limit. Returns False if the request is over the limit."""
+        rps = self.profile.rate_limit_rps
+        if rps is None:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.profile.rate_limit_burst, self.tokens + (now - self.tokens_updated) * rps)
+        self.tokens_updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def plan_response(self, prompt):
+        """
+        Decide how to answer a prompt, according to the profile.
+
+        Returns:
+            tuple: The HTTP status, the content of the reply (None for errors) and the latency, in seconds.
+        """
+        profile = self.profile
+        with self.lock:
+            rng = self.rng
+            self.stats['requests'] += 1
+            self.stats['prompt_tokens'] += len(prompt) // 4
+
+            latency = profile.latency_median * math.exp(profile.latency_sigma * rng.gauss(0., 1.))
+            if rng.random() < profile.stall_prob:
+                latency += profile.stall_seconds
+                self.stats['stalled'] += 1
+
+            if not self.take_token() or rng.random() < profile.rate_limit_prob:
+                self.stats['rate_limited'] += 1
+                return 429, None, 0.
+            if rng.random() < profile.error_prob:
+                self.stats['errors'] += 1
+                return 500, None, latency
+
+            invalid_id = rng.random() < profile.invalid_id_prob
+            decision = generate_squad_decision(prompt, rng, invalid_id)
+            if decision is None:
+                decision = generate_decision(prompt, rng, invalid_id)
+            content = json.dumps(decision)
+            if invalid_id:
+                self.stats['invalid_ids'] += 1
+            if rng.random() < profile.malformed_prob:
+                content = content[:rng.randrange(1, len(content) - 1)]
+                self.stats['malformed'] += 1
+            self.stats['ok'] += 1
+            return 200, content, latency
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if not self.path.split('?')[0].endswith('/chat/completions'):
+            self.send_json(404, {'error': {'code': '404', 'message': 'Resource not found'}})
+            return
+
+        messages = body.get('messages') or [{}]
+        prompt = messages[-1].get('content') or ''
+        if not isinstance(prompt, str):
+            prompt = ' '.join(part.get('text', '') for part in prompt)
+
+        status, content, latency = self.server.plan_response(prompt)
+        time.sleep(latency)
+
+        if status == 429:
+            self.send_json(429, {'error': {'code': '429', 'message': 'Rate limit exceeded. Retry after 1 second.'}},
+                           {'Retry-After': '1'})
+        elif status != 200:
+            self.send_json(status, {'error': {'code': str(status), 'message': 'The server had an error.'}})
+        else:
+            self.send_json(200, {
+                'id': f'chatcmpl-mock-{threading.get_ident()}-{time.monotonic_ns()}',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'mock'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(content) // 4,
+                          'total_tokens': (len(prompt) + len(content)) // 4},
+            })
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def make_chat_query(url, model='gpt-4o', timeout=DECISION_TURN_DEADLINE):
+    """
+    Return a decision query (see DecisionDispatcher) sending prompts to a chat-completions endpoint, e.g. a mock
+    server. HTTP errors, rate limiting included, are raised as urllib.error.HTTPError.
+
+    Args:
+        url (str): Base URL of the server, e.g. http://127.0.0.1:8765.
+        model (str): Model name sent with the requests.
+        timeout (float): Seconds to wait for a response.
+    """
+    endpoint = url.rstrip('/') + '/v1/chat/completions'
+
+    def query(prompt):
+        data = json.dumps({'model': model, 'messages': [{'role': 'user', 'content': prompt}], 'max_tokens': 300,
+                           'temperature': 0.}).encode('utf-8')
+        request = urllib.request.Request(endpoint, data=data, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.load(response)['choices'][0]['message']['content'].strip()
+
+    return query
+
+
+def parse_setting(text):
+    name, _, value = text.partition('=')
+    return name.strip(), json.loads(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a mock chat-completions server.")
+    parser.add_argument("--profile", default='typical', help=f"Provider profile (Options: {list(MOCK_LLM_PROFILES)}).")
+    parser.add_argument("--port", type=int, default=MOCK_LLM_PORT, help=f"Port (default: {MOCK_LLM_PORT}).")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the server's random choices.")
+    parser.add_argument(
+        "--set", action="append", default=[], type=parse_setting, metavar="NAME=VALUE",
+        help="Override a profile setting, e.g. --set latency_median=2. Can be repeated."
+    )
+    args = parser.parse_args()
+
+    server = MockLLMServer(MockProfile.from_name(args.profile, **dict(args.set)), port=args.port, seed=args.seed)
+    print(f"Mock LLM ({args.profile}) listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats))
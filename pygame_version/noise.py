@@ -0,0 +1,164 @@
+import logging
+from contextlib import contextmanager
+
+import numpy as np
+
+from constants import *
+
+logger = logging.getLogger(__name__)
+
+
+class NoiseField:
+    """
+    Propagates noise between areas through a precomputed sparse propagation matrix, and applies it to hostile
+    alarm levels in batches.
+
+    Noise emitted in an area reaches every area within `hops` connections, attenuated by the noise factors of the
+    connections along the loudest path and by `hop_decay` for every hop after the first. The matrix is stored in
+    CSR form (one row of receivers per source area), so flushing a batch of noise only touches the rows of the
+    areas that made noise, whatever the size of the map.
+
+    Noise can also linger: an area that made noise keeps re-emitting it for `duration` more turns, decayed by
+    `linger_decay` every turn. The remaining turns are tracked in Area.noise_duration.
+    """
+
+    def __init__(self, areas, hops=NOISE_HOPS, hop_decay=NOISE_HOP_DECAY, duration=NOISE_DURATION,
+                 linger_decay=NOISE_LINGER_DECAY):
+        """
+        Args:
+            areas (list): All areas of the map.
+            hops (int): How many connections away noise is heard.
+            hop_decay (float): Extra attenuation per hop after the first.
+            duration (int): Turns noise lingers in an area after it was made.
+            linger_decay (float): Attenuation of lingering noise per turn.
+        """
+        self.areas = areas
+        self.area_numbers = {area.id: i for i, area in enumerate(areas)}
+        self.hops = hops
+        self.hop_decay = hop_decay
+        self.duration = duration
+        self.linger_decay = linger_decay
+
+        self.pending_sources = []  # Area numbers of noise emitted since the last flush
+        self.pending_amounts = []
+        self.fresh = {}  # Area number -> noise made there this turn (not counting lingering noise)
+        self.lingering = {}  # Area number -> noise the area will re-emit next turn
+        self.is_deferred = False
+
+        self.build_matrix()
+
+    def build_matrix(self):
+        """Build the CSR propagation matrix from the connections' noise factors."""
+        # Direct propagation between neighbours. Parallel connections each carry the noise, so their factors add up.
+        factors = [{} for _ in self.areas]
+        for i, area in enumerate(self.areas):
+            for connection in area.connections:
+                j = self.area_numbers[connection.get_other_area(area).id]
+                factors[i][j] = factors[i].get(j, 0.) + connection.noise_factor
+
+        indptr, indices, weights = [0], [], []
+        for source in range(len(self.areas)):
+            # Attenuation along the loudest path of up to self.hops connections
+            attenuation = {source: 1.}
+            frontier = {source: 1.}
+            for hop in range(self.hops):
+                decay = self.hop_decay if hop else 1.
+                reached = {}
+                for i, level in frontier.items():
+                    for j, factor in factors[i].items():
+                        propagated = level * factor * decay
+                        if propagated > max(attenuation.get(j, 0.), reached.get(j, 0.)):
+                            reached[j] = propagated
+                attenuation.update(reached)
+                frontier = reached
+
+            receivers = sorted(attenuation)
+            indices.extend(receivers)
+            weights.extend(attenuation[j] for j in receivers)
+            indptr.append(len(indices))
+
+        self.indptr = np.array(indptr, dtype=np.intp)
+        self.indices = np.array(indices, dtype=np.intp)
+        self.weights = np.array(weights, dtype=float)
+
+    def emit(self, area, amount, fresh=True):
+        """Queue noise made in an area, to be applied on the next flush."""
+        i = self.area_numbers[area.id]
+        self.pending_sources.append(i)
+        self.pending_amounts.append(amount)
+        if fresh:
+            self.fresh[i] = self.fresh.get(i, 0.) + amount
+
+    def emit_lingering(self):
+        """Queue the noise still lingering from previous turns."""
+        for i, amount in self.lingering.items():
+            self.emit(self.areas[i], amount, fresh=False)
+
+    @contextmanager
+    def deferred(self):
+        """Defer flushing while in this context, so that the noise emitted in it can be applied in one batch."""
+        self.is_deferred = True
+        try:
+            yield
+        finally:
+            self.is_deferred = False
+
+    def flush(self, hostiles):
+        """
+        Apply all queued noise: raise the noise level of every area that hears it, and the alarm level of the
+        hostiles in those areas.
+
+        Args:
+            hostiles (list): The hostiles on the map.
+        """
+        if not self.pending_sources:
+            return
+
+        sources, source_inverse = np.unique(np.array(self.pending_sources, dtype=np.intp), return_inverse=True)
+        totals = np.bincount(source_inverse, weights=np.array(self.pending_amounts, dtype=float))
+        self.pending_sources = []
+        self.pending_amounts = []
+
+        # Gather the matrix rows of the sources
+        starts = self.indptr[sources]
+        lengths = self.indptr[sources + 1] - starts
+        entries = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        contributions = self.weights[entries] * np.repeat(totals, lengths)
+
+        receivers, receiver_inverse = np.unique(self.indices[entries], return_inverse=True)
+        received = np.bincount(receiver_inverse, weights=contributions)
+
+        for i, level in zip(receivers.tolist(), received.tolist()):
+            self.areas[i].noise_level += level
+
+        hostiles = [hostile for hostile in hostiles if hostile.area.id in self.area_numbers]
+        if not hostiles:
+            return
+
+        positions = np.fromiter((self.area_numbers[hostile.area.id] for hostile in hostiles), dtype=np.intp,
+                                count=len(hostiles))
+        slots = np.minimum(np.searchsorted(receivers, positions), len(receivers) - 1)
+        deltas = np.where(receivers[slots] == positions, received[slots], 0.)
+
+        for k in np.flatnonzero(deltas).tolist():
+            hostiles[k].update_alarm_level(float(deltas[k]))
+
+    def end_turn(self):
+        """Reset the areas' noise levels, and carry the noise that lingers over to the next turn."""
+        for i in list(self.lingering):
+            area = self.areas[i]
+            area.noise_duration -= 1
+            if area.noise_duration <= 0:
+                area.noise_duration = 0
+                del self.lingering[i]
+            else:
+                self.lingering[i] *= self.linger_decay
+
+        if self.duration > 0:
+            for i, amount in self.fresh.items():
+                self.areas[i].noise_duration = self.duration
+                self.lingering[i] = max(self.lingering.get(i, 0.), amount * self.linger_decay)
+        self.fresh = {}
+
+        for area in self.areas:
+            area.noise_level = area.noise_baseline
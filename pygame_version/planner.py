@@ -0,0 +1,296 @@
+"""
+Monte Carlo tree search over the game's own turn resolution, as a local decision engine.
+
+To decide on an agent's action, the planner forks the game from its current state (see snapshot.py) and plays out
+many hypothetical futures of PLANNER_HORIZON turns, resolved by the GameController exactly as real turns are. The
+deciding agent's actions along each future are chosen by UCB over a tree of its action sequences, the other
+agents' by a rollout policy, and every future is scored by `evaluate`. The most visited first action is chosen.
+
+The tree is open-loop: its nodes are action sequences, not states, as the same actions can lead to different
+states. Simulations replay their sequence from the root state, with fresh randomness every time.
+
+Searches run for a time budget and/or a number of simulations. With workers, independent searches run in parallel
+in forked processes, each on its own copy of the game, and their root statistics are merged. Without workers (or
+where fork is not available), the search runs in the game's process. It holds the state lock for one simulation
+at a time, and puts the game back in its exact current state (random streams included) after each, so other
+threads, e.g. the GUI's, only ever wait for a single simulation.
+
+Every search with workers forks a new pool from the game's process, as the workers must start from the current state.
+Only a fork of a process whose other threads hold no locks is safe, so workers are for headless runs (e.g.
+`headless.py -p mcts -a workers=4`). Never use them from the GUI, whose process runs the pygame, turn, log and
+decision threads: a lock one of them holds at fork time stays held for good in the workers. Hence the default of no
+workers (PLANNER_WORKERS).
+"""
+
+import logging
+import math
+import multiprocessing
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import randomness
+import tracing
+from constants import *
+from entities import Agent, Hostile, Objective
+from profiler import TurnProfiler
+
+logger = logging.getLogger(__name__)
+
+# The planner, game controller and agent of a search in progress, inherited by the forked search workers
+_fork_state = None
+
+
+class Node:
+    """A node of the search tree: statistics of the simulations through one sequence of actions."""
+
+    __slots__ = ('children', 'visits', 'value')
+
+    def __init__(self):
+        self.children = {}  # (action, argument id or None) -> Node
+        self.visits = 0
+        self.value = 0.
+
+    def select(self, options, rng, exploration):
+        """
+        Pick the next action among the available options: an untried one if any, else the one with the best upper
+        confidence bound.
+
+        Returns:
+            tuple: The option and its child node.
+        """
+        untried = [option for option in options if option not in self.children]
+        if untried:
+            option = rng.choice(untried)
+            child = self.children[option] = Node()
+            return option, child
+
+        children = [(option, self.children[option]) for option in options]
+        log_visits = math.log(sum(child.visits for _, child in children))
+        return max(children, key=lambda item: item[1].value / item[1].visits +
+                   exploration * math.sqrt(log_visits / item[1].visits))
+
+
+def list_options(agent):
+    """Return the agent's available actions, as (action, argument id or None) pairs."""
+    options = []
+    for action, arguments in agent.generate_action_arguments().items():
+        if arguments:
+            options.extend((action, argument['id']) for argument in arguments)
+        else:
+            options.append((action, None))
+    return options
+
+
+def option_decision(option):
+    action, argument = option
+    return {'action': action, 'arguments': [argument] if argument is not None else [], 'reasoning': ''}
+
+
+class MCTSPlanner:
+    """Searches for an agent's best action by Monte Carlo tree search over simulated turns."""
+
+    def __init__(self, rollout_policy, horizon=PLANNER_HORIZON, exploration=PLANNER_EXPLORATION,
+                 weights=PLANNER_REWARD_WEIGHTS, workers=PLANNER_WORKERS):
+        """
+        Args:
+            rollout_policy (callable): Returns a new Policy (see policies.py), playing the agents' actions that are
+                not searched over. Called once per search.
+            horizon (int): Turns played out by each simulation.
+            exploration (float): UCB exploration constant.
+            weights (dict): Weights of the terms of the evaluation (see PLANNER_REWARD_WEIGHTS).
+            workers (int): Processes searching in parallel, 0 to search in the calling process. Not to be used
+                from the GUI's process (see the module docstring).
+        """
+        self.rollout_policy = rollout_policy
+        self.horizon = horizon
+        self.exploration = exploration
+        self.weights = dict(weights)
+        self.workers = workers if 'fork' in multiprocessing.get_all_start_methods() else 0
+
+        # Timings of the simulated turns, kept apart from the game's own
+        self.profiler = TurnProfiler()
+
+    def plan(self, gc, agent, time_budget, iterations=None, seed=None):
+        """
+        Search for the agent's best action in the current state of the game.
+
+        Args:
+            gc (GameController): The game, at the point the agent decides.
+            agent (Agent): The deciding agent.
+            time_budget (float): Seconds of search.
+            iterations (int): Number of simulations per search (per worker), if given. Searches end on whichever
+                of the budget and the number of simulations runs out first.
+            seed (int): Seed of the search's randomness.
+
+        Returns:
+            tuple: The chosen (action, argument id or None) option, and the merged root statistics, as
+            {option: (visits, total value)}.
+        """
+        global _fork_state
+
+        seed = randomness.policy.getrandbits(64) if seed is None else seed
+
+        if not self.workers:
+            stats = self.search(gc, agent, time_budget, iterations, seed)
+        else:
+            _fork_state = (self, gc, agent)
+            try:
+                with ProcessPoolExecutor(max_workers=self.workers,
+                                         mp_context=multiprocessing.get_context('fork')) as executor:
+                    futures = [executor.submit(_search_forked, time_budget, iterations, seed + i)
+                               for i in range(self.workers)]
+                    stats = merge_stats([future.result() for future in futures])
+            finally:
+                _fork_state = None
+
+        if not stats:
+            return ('wait', None), stats
+        option = max(stats, key=lambda option: stats[option])
+        return option, stats
+
+    def search(self, gc, agent, time_budget, iterations=None, seed=None):
+        """
+        Run one search in this process. Every simulation runs under the state lock, from the state the search
+        started in, and the game is put back in its current state after it.
+
+        Returns:
+            dict: The root statistics, as {option: (visits, total value)}.
+        """
+        rng = random.Random(seed)
+        policy = self.rollout_policy()
+        team = gc.get_entities(Agent)
+        root = Node()
+
+        deadline = time.perf_counter() + time_budget
+        root_snapshot = gc.snapshot()
+        while time.perf_counter() < deadline and (iterations is None or root.visits < iterations):
+            # The lock is released between simulations, meanwhile other threads see the game as it is
+            with gc.state_lock, self.sandbox(gc):
+                current = gc.snapshot()
+                try:
+                    gc.restore(root_snapshot)
+                    randomness.seed(rng.getrandbits(64))
+                    self.simulate(gc, agent, team, root, policy, rng)
+                finally:
+                    gc.restore(current)
+
+        logger.info(f"Searched {root.visits} simulations for {agent.name} in {time_budget:.2f}s")
+        return {option: (child.visits, child.value) for option, child in root.children.items()}
+
+    def simulate(self, gc, agent, team, root, policy, rng):
+        """Play out one hypothetical future from the current state, and back up its value along the tree."""
+        path = [root]
+        node = root
+        turns = 0
+
+        # Tree phase: the agent's actions are selected down the tree, until a new node is added
+        while turns < self.horizon and node.visits:
+            agents = gc.start_turn()
+            if agent not in agents:
+                break
+            option, node = node.select(list_options(agent), rng, self.exploration)
+            path.append(node)
+            agent2decision = {other: option_decision(option) if other is agent else policy.decide(gc, other)
+                              for other in agents}
+            gc.resolve_turn(agent2decision)
+            turns += 1
+
+        # Rollout phase: everyone follows the rollout policy up to the horizon
+        while turns < self.horizon:
+            agents = gc.start_turn()
+            if not agents:
+                break
+            gc.resolve_turn({other: policy.decide(gc, other) for other in agents})
+            turns += 1
+
+        value = self.evaluate(gc, agent, team)
+        for node in path:
+            node.visits += 1
+            node.value += value
+
+    @contextmanager
+    def sandbox(self, gc):
+        """Keep simulated turns out of the mission log's output, the game's timings and the action trace."""
+        profiler, tracer = gc.profiler, tracing.tracer
+        gc.profiler, tracing.tracer = self.profiler, None
+        try:
+            with gc.mission_log.muted():
+                yield
+        finally:
+            gc.profiler, tracing.tracer = profiler, tracer
+
+    def evaluate(self, gc, agent, team):
+        """
+        Score the outcome of a simulation, for the deciding agent. Higher is better.
+
+        Args:
+            gc (GameController): The game at the end of the simulation.
+            agent (Agent): The deciding agent.
+            team (list): The agents in the field when the search started.
+        """
+        weights = self.weights
+
+        objectives = gc.get_entities(Objective)
+        captured = sum(objective.is_captured for objective in objectives) / len(objectives) if objectives else 1.
+        all_captured = captured == 1.
+
+        # Agents leaving before every objective is captured are of no more use to the mission
+        exfiltrated = sum(member in gc.exfiltrated for member in team) / len(team) if all_captured else 0.
+        lost = sum(member.health <= 0 for member in team) / len(team)
+        health = sum(member.health for member in team if member.health > 0 and
+                     (all_captured or member not in gc.exfiltrated)) / len(team)
+
+        hostiles = gc.get_entities(Hostile)
+        alarm = sum(hostile.alarm_level for hostile in hostiles) / len(hostiles) if hostiles else 0.
+
+        areas = gc.game_map.areas
+        explored = sum(area.get_explored() > 0 for area in areas) / len(areas)
+
+        return (weights['captured'] * captured + weights['exfiltrated'] * exfiltrated + weights['health'] * health
+                - weights['lost'] * lost - weights['alarm'] * alarm
+                + weights['progress'] * self.progress(gc, agent, objectives, all_captured)
+                + weights['explored'] * explored)
+
+    def progress(self, gc, agent, objectives, all_captured):
+        """
+        Return how close the agent is to its next target, between 0 and 1: the nearest uncaptured objective whose
+        location is known, or the nearest extraction point once every objective is captured.
+        """
+        if agent in gc.exfiltrated:
+            return 1. if all_captured else 0.
+        if agent.health <= 0:
+            return 0.
+
+        if all_captured:
+            targets = [area for area in gc.game_map.areas if area.is_extraction_point]
+        else:
+            targets = [objective.area for objective in objectives
+                       if not objective.is_captured and objective.get_explored() > 1]
+
+        distances = [gc.game_map.get_distance(agent.area, target) for target in targets]
+        distances = [distance for distance in distances if distance is not None]
+        return 1. / (1. + min(distances)) if distances else 0.
+
+
+def merge_stats(all_stats):
+    """Sum the root statistics of independent searches."""
+    merged = {}
+    for stats in all_stats:
+        for option, (visits, value) in stats.items():
+            total_visits, total_value = merged.get(option, (0, 0.))
+            merged[option] = (total_visits + visits, total_value + value)
+    return merged
+
+
+def _search_forked(time_budget, iterations, seed):
+    """Run a search in a forked worker, on the worker's own copy of the game."""
+    planner, gc, agent = _fork_state
+
+    # Locks may have been held by other threads of the parent when it forked, and the spill file is shared with it
+    gc.state_lock = threading.RLock()
+    gc.mission_log.spill_file = None
+
+    return planner.search(gc, agent, time_budget, iterations, seed)
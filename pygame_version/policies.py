@@ -0,0 +1,231 @@
+"""
+Local decision policies for GameController's policy mode.
+
+A policy decides on an action for one agent at a time, through `decide(gc, agent)`, and returns a decision
+dictionary in the same format as validated LLM decisions: {'action': ..., 'arguments': [UUID, ...], 'reasoning': ...}.
+"""
+
+import json
+from collections import defaultdict
+
+import randomness
+from entities import *
+from planner import MCTSPlanner
+
+
+def make_decision(action, arguments=(), reasoning=''):
+    return {'action': action, 'arguments': list(arguments), 'reasoning': reasoning}
+
+
+class Policy:
+    """Base class for decision policies."""
+
+    def decide(self, gc, agent):
+        raise NotImplementedError
+
+
+class RandomPolicy(Policy):
+    """Picks a uniformly random action, then a uniformly random argument for it."""
+
+    def __init__(self, rng=randomness.policy):
+        self.rng = rng
+
+    def decide(self, gc, agent):
+        action_arguments = agent.generate_action_arguments()
+        action = self.rng.choice(list(action_arguments))
+        options = action_arguments[action]
+        arguments = [self.rng.choice(options)['id']] if options else []
+        return make_decision(action, arguments, 'Random choice')
+
+
+class ScriptedPolicy(Policy):
+    """
+    Plays a fixed script of commands per agent, e.g. {"Viper": ["hide", "sneak Room 4", "capture Security Server 1"]}.
+
+    Each command is an action name, optionally followed by the name of its argument. Commands that are not
+    available when their turn comes, and turns after the end of an agent's script, fall back to waiting.
+    """
+
+    def __init__(self, script):
+        self.script = {name: list(commands) for name, commands in script.items()}
+        self.positions = defaultdict(int)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r') as f:
+            return cls(json.load(f))
+
+    def decide(self, gc, agent):
+        commands = self.script.get(agent.name, [])
+        position = self.positions[agent.name]
+        if position >= len(commands):
+            return make_decision('wait', reasoning='End of script')
+        self.positions[agent.name] += 1
+
+        action, _, argument_name = commands[position].partition(' ')
+        action_arguments = agent.generate_action_arguments()
+        if action not in action_arguments:
+            return make_decision('wait', reasoning=f'Scripted action {action} not available')
+
+        options = action_arguments[action]
+        if not options:
+            return make_decision(action, reasoning='Scripted')
+
+        matches = [option['id'] for option in options if option['name'] == argument_name] or \
+                  ([options[0]['id']] if not argument_name else [])
+        if not matches:
+            return make_decision('wait', reasoning=f'Scripted argument {argument_name} not available')
+        return make_decision(action, matches[:1], 'Scripted')
+
+
+class HeuristicPolicy(Policy):
+    """
+    A simple rule-based field agent, using only what the agents know about the world:
+
+    capture objectives in reach, exfiltrate once every objective is captured, take out hostiles while hidden,
+    return fire when exposed, hide when possible, and otherwise sneak toward the nearest known objective,
+    unexplored ground or, once done, the nearest extraction point.
+    """
+
+    def __init__(self, rng=randomness.policy):
+        self.rng = rng
+        self.visited = defaultdict(set)
+
+    def decide(self, gc, agent):
+        self.visited[agent.id].add(agent.area)
+        action_arguments = agent.generate_action_arguments()
+
+        objectives = gc.get_entities(Objective)
+        all_captured = all(objective.is_captured for objective in objectives)
+
+        if 'capture' in action_arguments:
+            return make_decision('capture', [action_arguments['capture'][0]['id']], 'Objective in reach')
+        if all_captured and 'exfiltrate' in action_arguments:
+            return make_decision('exfiltrate', reasoning='All objectives captured')
+        if 'take_out' in action_arguments:
+            return make_decision('take_out', [action_arguments['take_out'][0]['id']], 'Hostile unaware')
+        if 'shoot' in action_arguments:
+            return make_decision('shoot', [self.rng.choice(action_arguments['shoot'])['id']], 'Exposed to hostiles')
+        if 'hide' in action_arguments:
+            return make_decision('hide', reasoning='Staying out of sight')
+        if 'sneak' not in action_arguments:
+            return make_decision('wait', reasoning='Nowhere to go')
+
+        options = [gc.world.get_entity_by_id(option['id']) for option in action_arguments['sneak']]
+
+        if all_captured:
+            targets = [area for area in gc.game_map.areas if area.is_extraction_point]
+        else:
+            # Objectives whose location is known, else areas the agent has not been to yet
+            targets = [objective.area for objective in objectives
+                       if not objective.is_captured and objective.get_explored() > 1]
+            if not targets:
+                targets = [area for area in options if area not in self.visited[agent.id]]
+
+        next_area = self.step_toward(gc, options, targets) if targets else self.rng.choice(options)
+        return make_decision('sneak', [next_area.id], 'Moving toward target')
+
+    def step_toward(self, gc, options, targets):
+        """Return the option closest to any of the targets."""
+
+        def distance(area):
+            distances = [gc.game_map.get_distance(area, target) for target in targets]
+            return min([distance for distance in distances if distance is not None] or [float('inf')])
+
+        return min(options, key=distance)
+
+
+class RecordedPolicy(Policy):
+    """
+    Replays recorded raw LLM responses per agent, in order, validating them like live responses.
+
+    Responses that fail validation, and turns after an agent's recording runs out, fall back to waiting.
+    """
+
+    def __init__(self, responses):
+        self.responses = {name: list(replies) for name, replies in responses.items()}
+        self.positions = defaultdict(int)
+
+    @classmethod
+    def from_file(cls, path):
+        """Load a JSON Lines file of {"agent": name, "response": raw response} records."""
+        responses = defaultdict(list)
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    responses[record['agent']].append(record['response'])
+        return cls(responses)
+
+    def decide(self, gc, agent):
+        replies = self.responses.get(agent.name, [])
+        position = self.positions[agent.name]
+        if position >= len(replies):
+            return make_decision('wait', reasoning='End of recording')
+        self.positions[agent.name] += 1
+
+        gc.aliases.refresh(gc.world)
+        try:
+            return agent.parse_decision(replies[position], gc.aliases)
+        except ValueError as e:
+            return make_decision('wait', reasoning=f'Invalid recorded decision: {e}')
+
+
+class MCTSPolicy(Policy):
+    """
+    Plans every action by Monte Carlo tree search over simulated turns (see planner.py), with the heuristic policy
+    playing out the turns beyond the searched actions. Runs locally, with no LLM.
+
+    The per-turn time budget is shared by the agents deciding in the turn.
+    """
+
+    def __init__(self, time_budget=PLANNER_TURN_BUDGET, iterations=None, workers=PLANNER_WORKERS,
+                 horizon=PLANNER_HORIZON, exploration=PLANNER_EXPLORATION):
+        """
+        Args:
+            time_budget (float): Seconds of search per turn.
+            iterations (int): Number of simulations per agent and worker, if given. With a large enough time budget,
+                this makes the decisions of seeded runs reproducible.
+            workers (int): Processes searching in parallel, 0 to search in the game's process. Only safe in
+                headless runs (see planner.py).
+            horizon (int): Turns played out by each simulation.
+            exploration (float): UCB exploration constant.
+        """
+        self.time_budget = time_budget
+        self.iterations = iterations
+        self.planner = MCTSPlanner(HeuristicPolicy, horizon=horizon, exploration=exploration, workers=workers)
+
+    @classmethod
+    def from_args(cls, *args):
+        """Build the policy from NAME=VALUE arguments, e.g. from_args('time_budget=0.5', 'workers=0')."""
+        kwargs = {}
+        for arg in args:
+            name, _, value = arg.partition('=')
+            kwargs[name.strip()] = json.loads(value)
+        return cls(**kwargs)
+
+    def decide(self, gc, agent):
+        n_agents = len([member for member in gc.get_entities(Agent) if member.health > 0])
+        option, stats = self.planner.plan(gc, agent, self.time_budget / max(n_agents, 1), self.iterations)
+
+        action, argument = option
+        visits, value = stats.get(option, (0, 0.))
+        reasoning = f'Most visited in {sum(visits for visits, _ in stats.values())} simulations ' \
+                    f'(mean score {value / max(visits, 1):.2f})'
+        return make_decision(action, [argument] if argument is not None else [], reasoning)
+
+
+POLICIES = {
+    'random': RandomPolicy,
+    'scripted': ScriptedPolicy.from_file,
+    'heuristic': HeuristicPolicy,
+    'recorded': RecordedPolicy.from_file,
+    'mcts': MCTSPolicy.from_args,
+}
+
+
+def make_policy(name, *args, **kwargs):
+    """Build a policy by name, e.g. make_policy('scripted', 'script.json')."""
+    if name not in POLICIES:
+        raise ValueError(f"Unknown policy: {name}. Options: {list(POLICIES)}")
+    return POLICIES[name](*args, **kwargs)
@@ -0,0 +1,122 @@
+import json
+import statistics
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from constants import *
+
+
+class TurnProfiler:
+    """
+    Wall-clock instrumentation of the phases of a turn and of the GUI frame loop.
+
+    Phases are timed with time.perf_counter and recorded under their name, e.g. 'turn/decisions' or 'frame/draw_map'.
+    For every phase the profiler keeps running totals, a histogram over PROFILE_BUCKETS_MS and the last `window`
+    samples, from which the rolling summary is computed.
+
+    Recording is thread-safe, so phases can also be timed from worker threads (e.g. individual LLM requests).
+    """
+
+    def __init__(self, window=PROFILE_WINDOW, buckets_ms=PROFILE_BUCKETS_MS):
+        """
+        Args:
+            window (int): Number of recent samples per phase used for the rolling summary.
+            buckets_ms (list): Upper bounds, in milliseconds, of the histogram buckets. Samples above the last bound
+                fall into an extra overflow bucket.
+        """
+        self.window = window
+        self.buckets_ms = list(buckets_ms)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Discard all recorded samples."""
+        with self.lock:
+            self.started = time.time()
+            self.counts = defaultdict(int)
+            self.totals = defaultdict(float)
+            self.maxima = defaultdict(float)
+            self.histograms = defaultdict(lambda: [0] * (len(self.buckets_ms) + 1))
+            self.recent = defaultdict(lambda: deque(maxlen=self.window))
+
+    @contextmanager
+    def phase(self, name):
+        """Time the body of the context as the given phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        """Record one sample of a phase's duration, in seconds."""
+        ms = seconds * 1000
+        with self.lock:
+            self.counts[name] += 1
+            self.totals[name] += ms
+            self.maxima[name] = max(self.maxima[name], ms)
+            self.histograms[name][bisect_left(self.buckets_ms, ms)] += 1
+            self.recent[name].append(ms)
+
+    def summary(self):
+        """
+        Returns:
+            dict: Maps each phase to its statistics, in milliseconds: sample count, total, and mean, median, 95th
+            percentile and maximum over the recent window.
+        """
+        with self.lock:
+            recent = {name: list(samples) for name, samples in self.recent.items()}
+            counts = dict(self.counts)
+            totals = dict(self.totals)
+
+        summary = {}
+        for name in sorted(recent):
+            samples = sorted(recent[name])
+            summary[name] = {
+                'count': counts[name],
+                'total_ms': totals[name],
+                'mean_ms': statistics.fmean(samples),
+                'p50_ms': samples[len(samples) // 2],
+                'p95_ms': samples[min(len(samples) - 1, int(len(samples) * .95))],
+                'max_ms': samples[-1],
+            }
+        return summary
+
+    def format_summary(self, prefix=''):
+        """
+        Format the rolling summary as text, one line per phase.
+
+        Args:
+            prefix (str): Only include the phases whose name starts with this prefix, e.g. 'turn'.
+
+        Returns:
+            list: Lines of text.
+        """
+        summary = {name: stats for name, stats in self.summary().items() if name.startswith(prefix)}
+        if not summary:
+            return ["No timings recorded yet."]
+
+        return [f"{name}: n={stats['count']} mean={stats['mean_ms']:.2f} p50={stats['p50_ms']:.2f} "
+                f"p95={stats['p95_ms']:.2f} max={stats['max_ms']:.2f} ms" for name, stats in summary.items()]
+
+    def dump(self, path):
+        """Write the summary, lifetime maxima and histograms of every phase to a JSON file."""
+        summary = self.summary()
+        with self.lock:
+            histograms = {name: list(counts) for name, counts in self.histograms.items()}
+            maxima = dict(self.maxima)
+
+        report = {
+            'started': self.started,
+            'ended': time.time(),
+            'buckets_ms': self.buckets_ms,
+            'phases': {
+                name: dict(stats, lifetime_max_ms=maxima[name], histogram=histograms[name])
+                for name, stats in summary.items()
+            },
+        }
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,181 @@
+"""
+Background logging of decision prompts to compressed, rotating segments.
+
+Prompts are queued by the turn and written by a writer thread, so no file I/O happens on the turn's critical path.
+Segments are gzipped JSON Lines files, rotated by size and age, and only the latest few are kept.
+
+Prompts are split into paragraphs, stored as content-addressed chunks: a chunk's text is written once per segment,
+and prompt records only list the hashes of their chunks. The knowledge base, which makes up most of every prompt
+and is shared by all agents, is thus stored once per change instead of once per agent and turn.
+
+Usage, to print the logged prompts:
+    python prompt_log.py logs_internal/decision_prompts [--agent Viper]
+"""
+
+import argparse
+import atexit
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from constants import *
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SEPARATOR = '\n\n'
+
+
+def chunk_hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class PromptLog:
+    """Writes decision prompts to rotating, gzipped segments in a directory, on a background thread."""
+
+    def __init__(self, directory, max_bytes=PROMPT_LOG_SEGMENT_BYTES, max_age=PROMPT_LOG_SEGMENT_SECONDS,
+                 max_segments=PROMPT_LOG_MAX_SEGMENTS, prefix='decision_prompts'):
+        """
+        Args:
+            directory (str): Directory the segments are written to. Created if needed.
+            max_bytes (int): Compressed size after which a segment is rotated (checked approximately, as gzip
+                buffers its output).
+            max_age (float): Seconds after which a segment is rotated.
+            max_segments (int): Number of latest segments kept, older ones are deleted (None to keep all).
+            prefix (str): File name prefix of the segments.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_segments = max_segments
+        self.prefix = prefix
+
+        self.records = queue.Queue()
+        self.segment_number = 0
+        self.raw_file = None
+        self.segment = None
+        self.segment_started = 0
+        self.segment_chunks = set()  # Hashes of the chunks already written to the current segment
+
+        self.thread = threading.Thread(target=self.run, name='prompt-log', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def write(self, turn, agent_name, prompt):
+        """Queue a prompt to be logged. Returns immediately."""
+        self.records.put((time.time(), turn, agent_name, prompt))
+
+    def flush(self):
+        """Block until every prompt queued so far was written."""
+        self.records.join()
+        if self.segment is not None:
+            self.segment.flush()
+
+    def close(self):
+        """Write the pending prompts and close the current segment."""
+        if not self.thread.is_alive():
+            return
+        self.records.put(None)
+        self.thread.join()
+        atexit.unregister(self.close)
+
+    def run(self):
+        while True:
+            record = self.records.get()
+            try:
+                if record is None:
+                    self.close_segment()
+                    return
+                self.write_record(*record)
+            except Exception:
+                logger.exception("Failed to write to the prompt log")
+            finally:
+                self.records.task_done()
+
+    def write_record(self, timestamp, turn, agent_name, prompt):
+        if self.segment is None or self.raw_file.tell() >= self.max_bytes or \
+                timestamp - self.segment_started >= self.max_age:
+            self.open_segment(timestamp)
+
+        lines = []
+        hashes = []
+        for text in prompt.split(CHUNK_SEPARATOR):
+            digest = chunk_hash(text)
+            if digest not in self.segment_chunks:
+                self.segment_chunks.add(digest)
+                lines.append(json.dumps({'chunk': digest, 'text': text}))
+            hashes.append(digest)
+        lines.append(json.dumps({'time': timestamp, 'turn': turn, 'agent': agent_name, 'chunks': hashes}))
+
+        self.segment.write(('\n'.join(lines) + '\n').encode('utf-8'))
+
+    def open_segment(self, timestamp):
+        """Close the current segment, start a new one and delete the segments beyond max_segments."""
+        self.close_segment()
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.segment_number += 1
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(timestamp))
+        path = os.path.join(self.directory, f"{self.prefix}-{stamp}-{os.getpid()}-{self.segment_number:04d}.jsonl.gz")
+        self.raw_file = open(path, 'wb')
+        self.segment = gzip.GzipFile(fileobj=self.raw_file, mode='wb')
+        self.segment_started = timestamp
+        self.segment_chunks = set()
+
+        if self.max_segments is not None:
+            for old_path in list_segments(self.directory, self.prefix)[:-self.max_segments]:
+                os.remove(old_path)
+
+    def close_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.raw_file.close()
+            self.segment = None
+            self.raw_file = None
+
+
+def list_segments(directory, prefix='decision_prompts'):
+    """Return the paths of the segments in a directory, oldest first."""
+    # Segment names start with their creation time
+    return sorted(glob.glob(os.path.join(directory, f"{prefix}-*.jsonl.gz")))
+
+
+def read_prompts(directory, prefix='decision_prompts'):
+    """
+    Read back the logged prompts, oldest first.
+
+    Yields:
+        dict: Records with time, turn, agent and prompt keys.
+    """
+    for path in list_segments(directory, prefix):
+        chunks = {}
+        # A segment still being written may end in a partial record
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    if 'chunk' in record:
+                        chunks[record['chunk']] = record['text']
+                    else:
+                        prompt = CHUNK_SEPARATOR.join(chunks[digest] for digest in record.pop('chunks'))
+                        yield dict(record, prompt=prompt)
+        except (EOFError, json.JSONDecodeError):
+            logger.warning(f"Prompt log segment {path} is truncated")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print logged decision prompts")
+    parser.add_argument('directory', nargs='?', default='logs_internal/decision_prompts',
+                        help='Directory of the prompt log')
+    parser.add_argument('--agent', help='Only print the prompts of this agent')
+    args = parser.parse_args()
+
+    for record in read_prompts(args.directory):
+        if args.agent is None or record['agent'] == args.agent:
+            print(f"Turn {record['turn']}, {record['agent']}:\n--------------------------\n\n {record['prompt']}\n\n"
+                  f"==========================\n")
@@ -7,13 +7,20 @@ from urllib.parse import urlparse
 import logging
 from openai import AzureOpenAI
 
-endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-key = os.getenv("AZURE_OPENAI_API_KEY")
-client = AzureOpenAI(
-    azure_endpoint=endpoint,
-    api_version="2024-02-01",
-    api_key=key
-)
+# Built on first use, so that importing this module needs no endpoint. AZURE_OPENAI_ENDPOINT can also point to a
+# local mock server (see mock_llm.py).
+client = None
+
+
+def get_client():
+    global client
+    if client is None:
+        client = AzureOpenAI(
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            api_version="2024-02-01",
+            api_key=os.getenv("AZURE_OPENAI_API_KEY")
+        )
+    return client
 
 
 def encode_image(image_path):
@@ -54,7 +61,7 @@ def query_chat(prompt: str, media_url=None):
             },
         ]})
 
-    completion = client.chat.completions.create(
+    completion = get_client().chat.completions.create(
         model="gpt-4o",
         messages=messages,
         max_tokens=300,
@@ -0,0 +1,83 @@
+"""
+The game's source of randomness: one seedable service with a named stream per concern.
+
+    placement: mission setup (area modifiers, template guards and their patrol routes, objective placement)
+    checks: the skill checks of actions (perception, stealth, capture...)
+    combat: shot damage and the choice of targets
+    patrols: hostile movement
+    policy: the local decision policies and the planner (see policies.py, planner.py)
+    ui: the GUI's cosmetic choices
+
+Every stream is seeded from the root seed and its name, so streams are statistically independent: drawing more or
+fewer numbers from one (e.g. a policy exploring more) leaves the others untouched. A mission seeded with
+seed(value) replays bit-for-bit, and batch runs seeded with different values get independent streams without
+sharing any state.
+
+Streams are module attributes, reseeded in place, so they can be held on to, e.g. `randomness.combat.gauss(...)`.
+The simulation does not use the global `random` module.
+"""
+
+import hashlib
+import os
+import random
+
+placement = random.Random()
+checks = random.Random()
+combat = random.Random()
+patrols = random.Random()
+policy = random.Random()
+ui = random.Random()
+
+STREAMS = {
+    'placement': placement,
+    'checks': checks,
+    'combat': combat,
+    'patrols': patrols,
+    'policy': policy,
+    'ui': ui,
+}
+
+# Seed all streams are derived from
+root_seed = None
+
+
+def derive_seed(*keys):
+    """Return a 64-bit seed derived from the root seed and the given keys."""
+    data = repr((root_seed,) + keys).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+def seed(value=None):
+    """
+    Reseed every stream from a root seed.
+
+    Args:
+        value (int): The root seed, or None for a fresh one from the OS (readable afterwards as root_seed, to replay
+            the session).
+    """
+    global root_seed
+    root_seed = value if value is not None else int.from_bytes(os.urandom(8), 'little')
+    for name, stream in STREAMS.items():
+        stream.seed(derive_seed(name))
+
+
+def substream(name, *keys):
+    """
+    Return a new generator derived from a stream's seed and the given keys, for random choices that must be stable
+    whatever else was drawn, e.g. the position of an entity's marker in an area.
+    """
+    return random.Random(derive_seed(name, *keys))
+
+
+def getstate():
+    return root_seed, tuple(stream.getstate() for stream in STREAMS.values())
+
+
+def setstate(state):
+    global root_seed
+    root_seed, stream_states = state
+    for stream, stream_state in zip(STREAMS.values(), stream_states):
+        stream.setstate(stream_state)
+
+
+seed()
@@ -0,0 +1,123 @@
+"""
+Game rules: the balance tables used when resolving actions, compiled once into flat lookup tables.
+
+The defaults come from constants.py. A mission config can override any of them under its "rules" key, e.g.
+
+    "rules": {
+        "alarm_increases": {"sneak": {"1.0": 0.05, "0.8": 0.3, "0.0": 0.1}, "investigate": 0.2},
+        "observation_thresholds": {"0": 0, "0.5": 0.3, "1": 0.5},
+        "peek_alarm_penalty": 0.1
+    }
+
+Tables given in the config replace the corresponding entries of the defaults.
+"""
+
+from bisect import bisect_right
+
+from constants import *
+
+
+class ThresholdTable:
+    """
+    Maps a value to the entry of the largest threshold not above it, through a binary search over the sorted
+    thresholds.
+    """
+
+    def __init__(self, threshold_map):
+        """
+        Args:
+            threshold_map (dict): Maps thresholds to values.
+        """
+        self.thresholds = sorted(threshold_map)
+        self.values = [threshold_map[threshold] for threshold in self.thresholds]
+
+    def lookup(self, value):
+        i = bisect_right(self.thresholds, value)
+        if i == 0:
+            raise ValueError(f"Value {value} is not within the threshold range.")
+        return self.values[i - 1]
+
+
+def parse_levels(table):
+    """Convert the keys of a table loaded from JSON, where they are strings, to floats."""
+    return {float(level): value for level, value in table.items()}
+
+
+class RuleSet:
+    """The rules of a mission, held by its World as world.rules."""
+
+    def __init__(self, action_to_skill=None, action_to_counter_skill=None, alarm_increases=None, skill_levels=None,
+                 observation_thresholds=None, peek_alarm_penalty=None):
+        """
+        Every argument defaults to its constant in constants.py.
+
+        Args:
+            action_to_skill (dict): Skill used for each action.
+            action_to_counter_skill (dict): Skill of the target that counters each action.
+            alarm_increases (dict): Alarm increase of each action, either a number or a map from skill level to
+                increase (see ALARM_INCREASES).
+            skill_levels (list): Skill levels the alarm increases are defined for.
+            observation_thresholds (dict): Maps hostile alarm thresholds to their observation skill bonus.
+            peek_alarm_penalty (float): Extra alarm increase when peeking through a door.
+        """
+        self.action_to_skill = dict(ACTION_TO_SKILL if action_to_skill is None else action_to_skill)
+        self.action_to_counter_skill = dict(ACTION_TO_COUNTER_SKILL if action_to_counter_skill is None
+                                            else action_to_counter_skill)
+        self.alarm_increases = dict(ALARM_INCREASES if alarm_increases is None else alarm_increases)
+        self.skill_levels = list(SKILL_LEVELS if skill_levels is None else skill_levels)
+        self.observation_thresholds = ThresholdTable(OBS_THRESHS if observation_thresholds is None
+                                                     else observation_thresholds)
+        self.peek_alarm_penalty = PEEK_ALARM_PENALTY if peek_alarm_penalty is None else peek_alarm_penalty
+
+        # Flat (action, skill level) -> alarm increase table
+        self.alarm_table = {}
+        for action, increases in self.alarm_increases.items():
+            for level in self.skill_levels:
+                if not isinstance(increases, dict):
+                    self.alarm_table[action, level] = increases
+                elif level in increases:
+                    self.alarm_table[action, level] = increases[level]
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build the rules from the "rules" section of a mission config, on top of the defaults.
+
+        Args:
+            config (dict): The "rules" section, possibly empty.
+        """
+        alarm_increases = dict(ALARM_INCREASES)
+        for action, increases in config.get('alarm_increases', {}).items():
+            alarm_increases[action] = parse_levels(increases) if isinstance(increases, dict) else increases
+
+        thresholds = config.get('observation_thresholds')
+
+        return cls(
+            action_to_skill=dict(ACTION_TO_SKILL, **config.get('action_to_skill', {})),
+            action_to_counter_skill=dict(ACTION_TO_COUNTER_SKILL, **config.get('action_to_counter_skill', {})),
+            alarm_increases=alarm_increases,
+            skill_levels=config.get('skill_levels'),
+            observation_thresholds=parse_levels(thresholds) if thresholds is not None else None,
+            peek_alarm_penalty=config.get('peek_alarm_penalty'),
+        )
+
+    def get_alarm_increase(self, action, skill_level):
+        """
+        Return the alarm increase caused by an action.
+
+        Args:
+            action (str): The action being performed.
+            skill_level (float): The agent's level in the action's skill.
+        """
+        try:
+            return self.alarm_table[action, skill_level]
+        except KeyError:
+            if action not in self.alarm_increases:
+                raise ValueError(f"Unknown action: {action}") from None
+            raise ValueError(f"Invalid skill level for {action}: {skill_level}. "
+                             f"Must be one of {sorted(level for a, level in self.alarm_table if a == action)}.") \
+                from None
+
+    def get_observation_bonus(self, alarm_level):
+        """Return a hostile's observation skill bonus at an alarm level."""
+        return self.observation_thresholds.lookup(alarm_level)
@@ -0,0 +1,202 @@
+"""
+Snapshots of the mutable game state, for lookahead, undo and what-if analysis.
+
+A snapshot captures everything a turn can change: which entities are in the world and where, their per-entity
+state (health, hiding, alarm and patrol state, exploration, capture...), connection locks, area noise, the
+controller's turn state, the prompt aliases, the mission log position, the number of Mission Control messages, the
+decisions kept for reuse (see DecisionShortcuts) and the state of the random streams (see randomness.py). The attributes captured for an entity are declared by its class's STATE_FIELDS. Static data
+(descriptions, map layout, initial skills) is shared with the live objects, not copied.
+
+Per-entity state is stored as one flat tuple per entity. Consecutive snapshots share the tuples of entities whose
+state did not change, so keeping a history of snapshots costs memory in proportion to what changed.
+
+Snapshots are immutable: restoring one does not consume it, so the same snapshot can be restored any number of
+times to fork the game from the same point.
+
+What was already shown is not rolled back: lines printed to stdout and messages in the GUI's chat stay, e.g. after
+an undo.
+"""
+
+from collections import defaultdict
+from operator import attrgetter
+
+from bidict import bidict
+
+import randomness
+
+
+class GameSnapshot:
+    """The mutable state of a game at one point. Taken and restored by a Snapshotter."""
+
+    __slots__ = ('members', 'placements', 'indexes', 'exploration_levels', 'entity_states', 'connection_states',
+                 'turn_counter', 'turn_count', 'exfiltrated', 'lingering_noise', 'aliases', 'log_count', 'last_command',
+                 'control_messages', 'reused_decisions', 'rng_state')
+
+    def __init__(self, members, placements, indexes, exploration_levels, entity_states, connection_states,
+                 turn_counter, turn_count, exfiltrated, lingering_noise, aliases, log_count, last_command,
+                 control_messages, reused_decisions, rng_state):
+        self.members = members  # Entities in the world, in registry order
+        self.placements = placements  # The entities in each area of the map, in order
+        self.indexes = indexes  # Copies of the world's registry, class index and area index
+        self.exploration_levels = exploration_levels
+        self.entity_states = entity_states  # Entity -> state tuple, for every member
+        self.connection_states = connection_states  # Lock states of every connection of the map
+        self.turn_counter = turn_counter
+        self.turn_count = turn_count
+        self.exfiltrated = exfiltrated
+        self.lingering_noise = lingering_noise
+        self.aliases = aliases  # Alias table entries and counters
+        self.log_count = log_count
+        self.last_command = last_command
+        self.control_messages = control_messages
+        self.reused_decisions = reused_decisions  # Agent -> (fingerprint, decision, turns repeated) items
+        self.rng_state = rng_state
+
+
+def copy_index(index, depth):
+    """Copy a nested dict index down to the given depth."""
+    if depth == 1:
+        return index.copy()
+    return {key: copy_index(value, depth - 1) for key, value in index.items()}
+
+
+class Snapshotter:
+    """Takes and restores snapshots of a GameController's state."""
+
+    def __init__(self, gc):
+        self.gc = gc
+        self.areas = list(gc.game_map.areas)
+
+        connections = {}
+        for area in self.areas:
+            for connection in area.connections:
+                connections[id(connection)] = connection
+        self.connections = list(connections.values())
+
+        self.getters = {}  # Entity class -> (state fields, getter of their values, position of the skills)
+        self.last = None  # Latest snapshot taken or restored, whose parts the next snapshot shares
+
+    def get_fields(self, class_):
+        if class_ not in self.getters:
+            fields = class_.STATE_FIELDS
+            self.getters[class_] = (fields, attrgetter(*fields), fields.index('skills') if 'skills' in fields else None)
+        return self.getters[class_]
+
+    def get_state(self, entity):
+        fields, getter, skills_index = self.get_fields(type(entity))
+        state = getter(entity)
+        if skills_index is not None:
+            state = state[:skills_index] + (tuple(state[skills_index].items()),) + state[skills_index + 1:]
+        return state
+
+    def take(self):
+        """Return a snapshot of the current state."""
+        gc = self.gc
+        world = gc.world
+        last = self.last
+
+        members = tuple(world.entity_registry.values())
+        placements = tuple(tuple(area.entities) for area in self.areas)
+        connection_states = tuple((connection.is_locked1, connection.is_locked2) for connection in self.connections)
+        aliases = (tuple(gc.aliases.id_to_alias.items()), tuple(gc.aliases.counters.items()))
+
+        entity_states = {}
+        last_states = last.entity_states if last is not None else {}
+        for entity in members:
+            state = self.get_state(entity)
+            previous = last_states.get(entity)
+            entity_states[entity] = previous if previous == state else state
+
+        # Share whatever did not change with the previous snapshot. Entities compare by identity, so comparing
+        # membership and placements is cheap, unlike copying the indexes (keyed by UUIDs, slow to hash).
+        registry = class_index = area_index = None
+        if last is not None:
+            if members == last.members:
+                members = last.members
+                registry, class_index, _ = last.indexes
+            if placements == last.placements:
+                placements = last.placements
+                area_index = last.indexes[2]
+            if connection_states == last.connection_states:
+                connection_states = last.connection_states
+            if aliases == last.aliases:
+                aliases = last.aliases
+
+        if registry is None:
+            registry = world.entity_registry.copy()
+            class_index = copy_index(world.class_index, 2)
+        if area_index is None:
+            area_index = copy_index(world.area_index, 3)
+
+        snapshot = GameSnapshot(
+            members=members,
+            placements=placements,
+            indexes=(registry, class_index, area_index),
+            exploration_levels=world.exploration_levels.copy(),
+            entity_states=entity_states,
+            connection_states=connection_states,
+            turn_counter=gc.turn_counter,
+            turn_count=gc.turn_count,
+            exfiltrated=tuple(gc.exfiltrated),
+            lingering_noise=dict(gc.noise.lingering),
+            aliases=aliases,
+            log_count=len(gc.mission_log),
+            last_command=gc.mission_log.last_command,
+            control_messages=gc.control_messages,
+            reused_decisions=tuple(gc.shortcuts.previous.items()),
+            rng_state=randomness.getstate(),
+        )
+        self.last = snapshot
+        return snapshot
+
+    def restore(self, snapshot):
+        """Put the game back in the state of a snapshot."""
+        gc = self.gc
+        world = gc.world
+
+        # Entity fields
+        for entity, state in snapshot.entity_states.items():
+            fields, _, skills_index = self.get_fields(type(entity))
+            entity.__dict__.update(zip(fields, state))
+            if skills_index is not None:
+                entity.skills = dict(state[skills_index])
+
+        # World membership and indexes. The world's dicts are updated in place, from copies of the snapshot's, as
+        # the snapshot's must stay as they are.
+        registry, class_index, area_index = snapshot.indexes
+        world.entity_registry.clear()
+        world.entity_registry.update(registry)
+        world.class_index.clear()
+        world.class_index.update(copy_index(class_index, 2))
+        world.area_index.clear()
+        world.area_index.update(copy_index(area_index, 3))
+        world.exploration_levels.clear()
+        world.exploration_levels.update(snapshot.exploration_levels)
+
+        for area, entities in zip(self.areas, snapshot.placements):
+            area.entities = list(entities)
+
+        for connection, (is_locked1, is_locked2) in zip(self.connections, snapshot.connection_states):
+            connection.is_locked1 = is_locked1
+            connection.is_locked2 = is_locked2
+
+        # Controller state
+        gc.turn_counter = snapshot.turn_counter
+        gc.turn_count = snapshot.turn_count
+        gc.exfiltrated = list(snapshot.exfiltrated)
+        gc.noise.lingering = dict(snapshot.lingering_noise)
+        gc.noise.fresh = {}
+        gc.noise.pending_sources = []
+        gc.noise.pending_amounts = []
+        id_to_alias, counters = snapshot.aliases
+        gc.aliases.id_to_alias = bidict(id_to_alias)
+        gc.aliases.counters = defaultdict(int, counters)
+        gc.mission_log.truncate(snapshot.log_count)
+        gc.mission_log.last_command = snapshot.last_command
+        gc.control_messages = snapshot.control_messages
+        gc.shortcuts.previous = dict(snapshot.reused_decisions)
+        gc.shortcuts.fingerprints = {}
+        gc.knowledge.invalidate()
+        randomness.setstate(snapshot.rng_state)
+
+        self.last = snapshot
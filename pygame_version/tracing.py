@@ -0,0 +1,156 @@
+"""
+Debug tracing of the simulation.
+
+Debug logging in the simulation's hot paths (action checks, shooting, hostile movement, map construction) is
+guarded by the `debug` switch of this module, so that while it is off no debug message is ever formatted. Turn it
+on with configure_logging(logging.DEBUG), or set_debug(True) if logging is configured elsewhere.
+
+Action checks can also be recorded as structured trace records, to a compact binary file, for later analysis:
+
+    tracing.start_trace('logs_internal/trace.bin')
+    ...
+    tracing.stop_trace()
+    for record in tracing.read_trace('logs_internal/trace.bin'): ...
+
+Importing this module (or the simulation) does not configure logging.
+"""
+
+import logging
+import struct
+import sys
+
+# Global switch for the debug logging of the hot paths. Checked as `tracing.debug` so that changes are seen.
+debug = False
+
+# The active TraceWriter, if any
+tracer = None
+
+TRACE_MAGIC = b'MCTRACE1'
+
+# Record layouts, after a one-byte record type:
+# string: id (uint16), length (uint16), UTF-8 bytes. Defines the string referred to by id in later records.
+# action check: turn (uint32), action, actor, target and skill string ids (uint16), difficulty, modifier,
+#     success probability and roll (float64), result (bool)
+STRING_RECORD = b'S'
+ACTION_RECORD = b'A'
+STRING_HEADER = struct.Struct('<HH')
+ACTION_CHECK = struct.Struct('<IHHHHdddd?')
+
+
+def set_debug(enabled):
+    global debug
+    debug = enabled
+
+
+def configure_logging(level=logging.WARNING, fmt="%(asctime)s [%(levelname)s] %(message)s"):
+    """
+    Configure the root logger for an application entry point, and switch the hot-path debug logging on if the
+    level lets debug messages through.
+
+    Args:
+        level (int or str): Logging level, e.g. logging.DEBUG or 'INFO'.
+        fmt (str): Log record format.
+    """
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    logging.basicConfig(level=level, format=fmt)
+    set_debug(level <= logging.DEBUG)
+
+
+def start_trace(path):
+    """Start recording action checks to a trace file, replacing the active trace if any."""
+    global tracer
+    stop_trace()
+    tracer = TraceWriter(path)
+    return tracer
+
+
+def stop_trace():
+    global tracer
+    if tracer is not None:
+        tracer.close()
+        tracer = None
+
+
+class TraceWriter:
+    """
+    Writes trace records to a binary file.
+
+    Strings (action types, names) are interned: each is written once, and records refer to it by id.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(TRACE_MAGIC)
+        self.string_ids = {}
+        self.turn = 0  # Turn the records belong to, kept up to date by the game controller
+
+    def string_id(self, string):
+        string_id = self.string_ids.get(string)
+        if string_id is None:
+            string_id = self.string_ids[string] = len(self.string_ids)
+            data = string.encode('utf-8')
+            self.file.write(STRING_RECORD + STRING_HEADER.pack(string_id, len(data)) + data)
+        return string_id
+
+    def action_check(self, action, actor, target, skill, difficulty, modifier, probability, roll, result):
+        """Record the outcome of one action check."""
+        self.file.write(ACTION_RECORD + ACTION_CHECK.pack(
+            self.turn, self.string_id(action), self.string_id(actor), self.string_id(target),
+            self.string_id(skill or ''), difficulty, modifier, probability, roll, result))
+
+    def close(self):
+        self.file.close()
+
+
+def read_trace(path):
+    """
+    Read back the action checks recorded in a trace file.
+
+    Yields:
+        dict: Records with turn, action, actor, target, skill, difficulty, modifier, probability, roll and
+        result keys.
+    """
+    strings = {}
+    with open(path, 'rb') as f:
+        if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a trace file")
+        while True:
+            record_type = f.read(1)
+            if not record_type:
+                return
+            if record_type == STRING_RECORD:
+                string_id, length = STRING_HEADER.unpack(f.read(STRING_HEADER.size))
+                strings[string_id] = f.read(length).decode('utf-8')
+            elif record_type == ACTION_RECORD:
+                turn, action, actor, target, skill, difficulty, modifier, probability, roll, result = \
+                    ACTION_CHECK.unpack(f.read(ACTION_CHECK.size))
+                yield {
+                    'turn': turn,
+                    'action': strings[action],
+                    'actor': strings[actor],
+                    'target': strings[target],
+                    'skill': strings[skill],
+                    'difficulty': difficulty,
+                    'modifier': modifier,
+                    'probability': probability,
+                    'roll': roll,
+                    'result': result,
+                }
+            else:
+                raise ValueError(f"Unknown trace record type {record_type!r} in {path}")
+
+
+if __name__ == "__main__":
+    # Print a trace file as CSV
+    import csv
+
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python tracing.py TRACE_FILE")
+
+    writer = None
+    for record in read_trace(sys.argv[1]):
+        if writer is None:
+            writer = csv.DictWriter(sys.stdout, fieldnames=list(record))
+            writer.writeheader()
+        writer.writerow(record)
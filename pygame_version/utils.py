@@ -1,4 +1,5 @@
 import math
+import re
 import uuid
 import hashlib
 import threading
@@ -85,3 +86,39 @@ def encode_uuids_to_integer(*uuids: uuid.UUID) -> int:
     smaller_int = int(hash_object.hexdigest(), 16) % (10 ** 18)  # Reduce size
 
     return smaller_int
+
+
+# Fixed namespace for deterministic entity IDs. Changing it invalidates every cached prompt.
+ENTITY_ID_NAMESPACE = uuid.UUID('6f1c2a8e-3b0d-5e47-9a61-2d8f4c7b1e05')
+
+
+def stable_entity_id(*keys) -> uuid.UUID:
+    """
+    Derive a deterministic UUID from mission config keys.
+
+    Args:
+        *keys: Keys identifying the entity, e.g. the mission name, the entity kind and its config key.
+
+    Returns:
+        uuid.UUID: The same UUID for the same keys in every run.
+    """
+    return uuid.uuid5(ENTITY_ID_NAMESPACE, '/'.join(str(key) for key in keys))
+
+
+def canonicalize_prompt(prompt: str) -> str:
+    """
+    Normalize a prompt so that semantically identical prompts are byte-identical, and hit the prompt cache.
+
+    Line endings are unified, trailing whitespace is stripped from every line, runs of blank lines are
+    collapsed and negative zeros are written as zeros.
+    """
+    prompt = prompt.replace('\r\n', '\n').replace('\r', '\n')
+    prompt = '\n'.join(line.rstrip() for line in prompt.split('\n'))
+    prompt = re.sub(r'\n{3,}', '\n\n', prompt)
+    prompt = re.sub(r'(?<![\w.])-(0(?:\.0+)?)(?![\d.])', r'\1', prompt)
+    return prompt.strip() + '\n'
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens of a prompt text, without a tokenizer."""
+    return math.ceil(len(text) / PROMPT_CHARS_PER_TOKEN)